@@ -0,0 +1,176 @@
+import time
+import asyncio
+from typing import Callable, Dict, List, Optional
+from exchange import BinanceClient
+from price_feed import PriceFeed
+from config import Config, Settings
+from logger import logger
+
+
+class AccountState:
+    def __init__(self, client: BinanceClient, price_feed: Optional[PriceFeed] = None,
+                 settings: Optional[Settings] = None):
+        """
+        本地账户状态 (Local Account State)
+        Seeded once over REST, then kept current from the user-data stream
+        (ACCOUNT_UPDATE -> balance/positions, ORDER_TRADE_UPDATE -> fills reflected in ACCOUNT_UPDATE).
+        A low-frequency REST reconciliation (a scheduled job, see reconcile) corrects any drift.
+        """
+        self.client = client
+        self.price_feed = price_feed
+        self.settings = settings or Config
+        self.exchange = None  # ccxt.pro instance, created on start()
+        
+        self.wallet_balance = 0.0
+        self.positions: Dict[str, Dict[str, float]] = {}  # symbol -> {contracts, entry_price, unrealized_pnl}
+        self.seeded = False
+        self.healthy = False  # False while the stream is down (state may be missing events)
+        self.updated_at = 0.0
+        # Callbacks invoked after every stream update (risk monitor)
+        self.listeners: List[Callable[[], None]] = []
+        self._tasks = []
+
+    @property
+    def is_live(self) -> bool:
+        return self.seeded and self.healthy
+
+    # --- Reads (zero round-trips) ---
+
+    def get_positions(self) -> Dict[str, float]:
+        """{symbol: signed quantity}, same shape as BinanceClient.get_cw_positions"""
+        return {s: p['contracts'] for s, p in self.positions.items() if p['contracts'] != 0}
+
+    def unrealized_pnl(self) -> float:
+        """Marked to the live price book when available, else the last exchange-reported value"""
+        marks = self.price_feed.prices if self.price_feed is not None else {}
+        total = 0.0
+        for symbol, p in self.positions.items():
+            mark = marks.get(symbol)
+            if mark is not None and p['entry_price'] > 0:
+                total += p['contracts'] * (mark - p['entry_price'])
+            else:
+                total += p['unrealized_pnl']
+        return total
+
+    def get_balance(self) -> Dict[str, float]:
+        """Same shape as BinanceClient.get_account_balance"""
+        total_equity = self.wallet_balance + self.unrealized_pnl()
+        # Cross-margin initial margin estimate: notional / leverage
+        marks = self.price_feed.prices if self.price_feed is not None else {}
+        used_margin = sum(abs(p['contracts']) * marks.get(s, p['entry_price'])
+                          for s, p in self.positions.items()) / self.settings.LEVERAGE
+        return {
+            'total_equity': total_equity,
+            'free_margin': max(0.0, total_equity - used_margin),
+        }
+
+    def add_listener(self, callback: Callable[[], None]):
+        self.listeners.append(callback)
+
+    def _notify(self):
+        for callback in self.listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Account listener failed: {e}")
+
+    # --- Seeding & reconciliation ---
+
+    async def _fetch_rest(self):
+        balance, positions = await asyncio.gather(
+            self.client.get_account_balance(),
+            self.client.get_position_details(),
+        )
+        if balance['total_equity'] <= 0 and not positions:
+            # Both calls swallow errors and return empties; never seed from that
+            raise RuntimeError("REST account fetch returned no data")
+        wallet = balance['total_equity'] - sum(p['unrealized_pnl'] for p in positions.values())
+        return wallet, positions
+
+    async def seed(self):
+        """Initial full state over REST"""
+        self.wallet_balance, self.positions = await self._fetch_rest()
+        self.seeded = True
+        self.healthy = True
+        self.updated_at = time.time()
+        logger.info(f"🧾 Account state seeded: wallet {self.wallet_balance:.2f} USDT, {len(self.positions)} positions")
+
+    async def reconcile(self):
+        """
+        对账 (Reconcile) - compare with REST and correct drift
+        """
+        wallet, positions = await self._fetch_rest()
+        drift = []
+        if abs(wallet - self.wallet_balance) > max(0.01, abs(wallet) * 0.001):
+            drift.append(f"wallet {self.wallet_balance:.2f} -> {wallet:.2f}")
+        for symbol in set(positions) | set(self.positions):
+            local = self.positions.get(symbol, {}).get('contracts', 0.0)
+            remote = positions.get(symbol, {}).get('contracts', 0.0)
+            if abs(local - remote) > 1e-9:
+                drift.append(f"{symbol} {local} -> {remote}")
+        if drift:
+            logger.warning(f"⚠️ Account state drift corrected: {', '.join(drift)}")
+        self.wallet_balance = wallet
+        self.positions = positions
+        self.updated_at = time.time()
+
+    # --- Stream ---
+
+    def start(self):
+        if not self._tasks:
+            self.exchange = self.client.create_stream_exchange()
+            self._tasks = [
+                asyncio.create_task(self._stream(self._watch_balance, 'balance')),
+                asyncio.create_task(self._stream(self._watch_positions, 'positions')),
+            ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self.exchange:
+            await self.exchange.close()
+
+    async def _watch_balance(self):
+        balance = await self.exchange.watch_balance()
+        usdt = balance.get('USDT') or {}
+        if usdt.get('total') is not None:
+            self.wallet_balance = float(usdt['total'])
+            self.updated_at = time.time()
+            self._notify()
+
+    async def _watch_positions(self):
+        updates = await self.exchange.watch_positions()
+        for pos in updates:
+            parsed = self.client.parse_position(pos)
+            if parsed['contracts'] == 0:
+                self.positions.pop(pos['symbol'], None)
+            else:
+                self.positions[pos['symbol']] = parsed
+        self.updated_at = time.time()
+        self._notify()
+
+    async def _stream(self, watch, name: str):
+        """Run one watch loop; on error mark unhealthy, back off, reseed, resume"""
+        backoff = 1.0
+        while True:
+            try:
+                await watch()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.healthy = False
+                logger.warning(f"⚠️ User stream ({name}) error: {e}. Reconnecting in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+                try:
+                    # Events may have been missed while disconnected
+                    await self.seed()
+                except Exception as seed_error:
+                    logger.warning(f"⚠️ Account reseed failed: {seed_error}")
@@ -0,0 +1,170 @@
+"""
+多账户 (Multi-Account Execution)
+
+Several sub-accounts in one process. Market data is fetched once: one market-data
+client, scanner, ticker/funding snapshot and price stream per cycle, fanned out to one
+Rebalancer per account. Each account has its own settings profile (weights, leverage,
+risk limits, state files), REST client with its own order-rate budget (the IP weight
+budget is shared), account stream, ledger, journal and risk monitor.
+"""
+import os
+import re
+import json
+from typing import Dict, List, Optional
+from pydantic import TypeAdapter
+from config import Config, Settings
+from exchange import BinanceClient
+from account_state import AccountState
+from price_feed import PriceFeed, DeviationTracker
+from ohlcv_store import OHLCVStore
+from weighting import WeightEngine
+from order_book import DepthCache
+from snapshot import SnapshotBuilder
+from journal import TradeJournal
+from ledger import PositionLedger
+from risk_manager import RiskManager
+from rebalancer import Rebalancer
+from risk_monitor import RiskMonitor
+from logger import logger, account_scope
+
+# Per-account state files; profiles that do not set them get data/<name>/<file>
+ACCOUNT_FILES = ('LEDGER_FILE', 'RISK_STATE_FILE', 'JOURNAL_FILE')
+# Read from BINANCE_<NAME>_<KEY> when the profile does not set them
+ACCOUNT_KEYS = ('API_KEY', 'SECRET_KEY', 'TESTNET_API_KEY', 'TESTNET_SECRET_KEY')
+
+
+def load_profiles(path: Optional[str] = None) -> List[Settings]:
+    """
+    加载账户配置 (Load Account Profiles)
+    The file is a JSON list of {"name": ..., <setting>: value, ...}; anything not set is
+    inherited from the global Config. Without a profiles file the global Config is the
+    only account.
+    """
+    path = path or Config.ACCOUNTS_FILE
+    if not path:
+        return [Config]
+    with open(path, 'r') as f:
+        entries = json.load(f)
+
+    profiles, seen_keys = [], {}
+    for entry in entries:
+        entry = dict(entry)
+        name = str(entry.pop('name', '')).strip()
+        if not name:
+            raise ValueError(f"{path}: every account profile needs a name")
+        unknown = [k for k in entry if k not in Settings.model_fields]
+        if unknown:
+            raise ValueError(f"{path}: unknown settings for account {name}: {', '.join(unknown)}")
+        update: Dict = {k: TypeAdapter(Settings.model_fields[k].annotation).validate_python(v) for k, v in entry.items()}
+
+        env_prefix = f"BINANCE_{re.sub(r'[^A-Z0-9]', '_', name.upper())}_"
+        for key in ACCOUNT_KEYS:
+            if key not in update and os.getenv(env_prefix + key):
+                update[key] = os.getenv(env_prefix + key)
+        for key in ACCOUNT_FILES:
+            if key not in update:
+                default = getattr(Config, key)
+                update[key] = os.path.join(os.path.dirname(default), name, os.path.basename(default))
+        update['ACCOUNT_NAME'] = name
+        profile = Config.model_copy(update=update)
+
+        api_key = profile.TESTNET_API_KEY if profile.IS_TESTNET and profile.TESTNET_API_KEY else profile.API_KEY
+        if api_key and api_key in seen_keys:
+            # Two profiles on one account would fight over the same positions
+            raise ValueError(f"{path}: accounts {seen_keys[api_key]} and {name} use the same API key")
+        seen_keys[api_key] = name
+        if name in [p.ACCOUNT_NAME for p in profiles]:
+            raise ValueError(f"{path}: duplicate account name {name}")
+        profiles.append(profile)
+
+    if not profiles:
+        raise ValueError(f"{path}: no account profiles")
+    logger.info(f"👥 Loaded {len(profiles)} account profiles: {', '.join(p.ACCOUNT_NAME for p in profiles)}")
+    return profiles
+
+
+class Account:
+    def __init__(self, settings: Settings, client: BinanceClient):
+        """
+        交易账户 (One Trading Account) - execution and risk for one settings profile
+        Components needing the markets or the price stream are built in start().
+        """
+        self.settings = settings
+        self.name = settings.ACCOUNT_NAME
+        self.client = client
+        self.account_state = AccountState(client, settings=settings) if settings.USE_USER_STREAM else None
+        self.journal: Optional[TradeJournal] = None
+        self.risk_manager: Optional[RiskManager] = None
+        self.snapshots: Optional[SnapshotBuilder] = None
+        self.rebalancer: Optional[Rebalancer] = None
+        self.risk_monitor: Optional[RiskMonitor] = None
+
+    def scope(self):
+        """Log tag for this account (tasks started inside inherit it)"""
+        return account_scope(self.settings)
+
+    @property
+    def tracker(self) -> Optional[DeviationTracker]:
+        return self.rebalancer.tracker if self.rebalancer is not None else None
+
+    async def seed(self):
+        """Markets (shared index, no download of our own), then the account state over REST"""
+        with self.scope():
+            await self.client.load_markets()
+            if self.account_state is None:
+                return
+            try:
+                await self.account_state.seed()
+            except Exception as e:
+                logger.warning(f"⚠️ Account stream disabled, using REST polling: {e}")
+                self.account_state = None
+
+    async def start(self, price_feed: Optional[PriceFeed] = None, history: Optional[OHLCVStore] = None,
+                    weights: Optional[WeightEngine] = None, depth: Optional[DepthCache] = None):
+        """
+        启动账户组件 (Start Account Components)
+        Account stream, journal, ledger reconciliation, risk manager, rebalancer and risk monitor.
+        history: the shared bar store, read by the risk manager; weights: the shared weight engine;
+        depth: the shared order book cache used by execution.
+        """
+        with self.scope():
+            if self.account_state:
+                self.account_state.price_feed = price_feed
+                self.account_state.start()
+
+            # Fill journal (buffered, flushed in the background)
+            self.journal = TradeJournal(self.settings.JOURNAL_FILE)
+            self.journal.start()
+
+            # Position ledger (entry / peak prices), reconciled with the exchange on startup
+            ledger = PositionLedger(self.settings.LEDGER_FILE)
+            details = self.account_state.positions if self.account_state else await self.client.get_position_details()
+            ledger.sync({s: d['contracts'] for s, d in details.items() if d['contracts'] != 0}, {},
+                        {s: d['entry_price'] for s, d in details.items()})
+            ledger.save()
+
+            self.snapshots = SnapshotBuilder(self.client, price_feed, self.account_state)
+            self.risk_manager = RiskManager(ledger, state_file=self.settings.RISK_STATE_FILE,
+                                            settings=self.settings, history=history)
+            self.rebalancer = Rebalancer(self.client, self.risk_manager, price_feed, self.journal, weights, depth)
+            if price_feed:
+                # Per-position stops checked on every price update; act on them without waiting for the cycle
+                def check_stops(updates):
+                    with self.scope():
+                        if self.risk_manager.on_prices(updates):
+                            self.tracker.rebalance_needed.set()
+                price_feed.add_listener(check_stops)
+
+            # Equity / high-water-mark checks on every price and account update
+            self.risk_monitor = RiskMonitor(self.client, self.risk_manager, self.account_state, price_feed, self.journal)
+            self.risk_monitor.start()
+
+    async def close(self):
+        if self.risk_monitor:
+            await self.risk_monitor.close()
+        if self.risk_manager:
+            self.risk_manager.ledger.save()
+        if self.journal:
+            await self.journal.close()
+        if self.account_state:
+            await self.account_state.close()
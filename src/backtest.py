@@ -0,0 +1,440 @@
+"""
+回测引擎 (Backtest Engine)
+
+Replays locally stored OHLCV and funding history through the live MarketScanner and
+Rebalancer against a simulated BinanceClient. Models taker fees, slippage, funding
+payments and min-notional rejections.
+
+Data layout (one file per raw Binance id, CSV or Parquet):
+    <data_dir>/ohlcv/BTCUSDT.csv      timestamp, open, high, low, close, volume
+    <data_dir>/funding/BTCUSDT.csv    timestamp (or fundingTime), rate (or fundingRate)
+    <data_dir>/markets.json           optional, a MarketIndex cache file for real exchange limits
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from config import Config
+from logger import logger
+from market_index import MarketIndex, SymbolLimits
+from market_scanner import MarketScanner
+from risk_manager import RiskManager
+from rebalancer import Rebalancer
+from snapshot import CycleSnapshot
+from funding import FundingInfo, info_from_rate
+
+DEFAULT_FEE_RATE = 0.0005  # Binance USDT-M taker fee
+DEFAULT_SLIPPAGE_BPS = 2.0
+DEFAULT_SCAN_MINUTES = 60  # Universe re-ranking cadence (rebalancing still runs every SCAN_INTERVAL_MINUTES)
+
+# Limits used when no markets.json is supplied (Binance min notional, no step rounding)
+BACKTEST_LIMITS = SymbolLimits(0.0, 1e12, 5.0, 0.0, 0.0, 0.0)
+
+
+def raw_id_to_symbol(raw_id: str) -> str:
+    """BTCUSDT -> BTC/USDT:USDT (USDT-margined perpetual)"""
+    if raw_id.endswith('USDT'):
+        return f"{raw_id[:-4]}/USDT:USDT"
+    return raw_id
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def _to_ms(values: pd.Series) -> np.ndarray:
+    """Epoch ms from either numeric epochs (s or ms) or date strings"""
+    if pd.api.types.is_numeric_dtype(values):
+        arr = values.to_numpy(dtype=np.int64)
+        return arr * 1000 if arr.size and arr.max() < 10**11 else arr
+    # Fixed unit: pandas 3 parses strings to datetime64[us], older versions to [ns]
+    return pd.to_datetime(values, utc=True).dt.as_unit('ms').astype('int64').to_numpy()
+
+
+@dataclass
+class HistoryData:
+    """Price/funding history aligned on one time grid: arrays are (T bars, N symbols), NaN = no data"""
+    symbols: List[str]
+    timestamps: np.ndarray  # int64 epoch ms, shape (T,)
+    close: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    quote_volume: np.ndarray  # Rolling 24h quote volume
+    funding: np.ndarray  # Funding rate charged at this bar, 0 elsewhere
+    mark: np.ndarray  # Last known close (positions stay valued through data gaps), 0 before listing
+    markets: Dict[str, Dict] = field(default_factory=dict)  # Optional raw ccxt markets
+
+    @property
+    def bar_ms(self) -> int:
+        return int(np.median(np.diff(self.timestamps))) if len(self.timestamps) > 1 else 300_000
+
+
+def load_history(data_dir: str, symbols: Optional[List[str]] = None,
+                 start: Optional[str] = None, end: Optional[str] = None) -> HistoryData:
+    """
+    加载历史数据 (Load History) - OHLCV + funding, pivoted onto a common grid
+    symbols: raw ids (BTCUSDT) to load, default all files found.
+    """
+    ohlcv_dir = os.path.join(data_dir, 'ohlcv')
+    funding_dir = os.path.join(data_dir, 'funding')
+    files = {os.path.splitext(f)[0]: os.path.join(ohlcv_dir, f)
+             for f in sorted(os.listdir(ohlcv_dir)) if f.endswith(('.csv', '.parquet'))}
+    ids = [i for i in (symbols or files.keys()) if i in files]
+    if not ids:
+        raise ValueError(f"No OHLCV files found in {ohlcv_dir}")
+
+    frames = {}
+    for raw_id in ids:
+        df = _read_frame(files[raw_id])
+        ts_col = 'timestamp' if 'timestamp' in df.columns else 'open_time'
+        df.index = _to_ms(df[ts_col])
+        frames[raw_id] = df[['high', 'low', 'close', 'volume']].astype(float)
+
+    grid = np.unique(np.concatenate([f.index.to_numpy() for f in frames.values()]))
+    if start:
+        grid = grid[grid >= _to_ms(pd.Series([start]))[0]]
+    if end:
+        grid = grid[grid <= _to_ms(pd.Series([end]))[0]]
+
+    def pivot(col: str) -> pd.DataFrame:
+        return pd.DataFrame({i: f[col] for i, f in frames.items()}).reindex(grid)
+
+    close = pivot('close')
+    bar_ms = int(np.median(np.diff(grid))) if len(grid) > 1 else 300_000
+    bars_per_day = max(1, int(round(86_400_000 / bar_ms)))
+    quote_volume = (pivot('volume') * close).rolling(bars_per_day, min_periods=1).sum()
+
+    funding = np.zeros(close.shape)
+    for n, raw_id in enumerate(ids):
+        for ext in ('.csv', '.parquet'):
+            path = os.path.join(funding_dir, raw_id + ext)
+            if os.path.exists(path):
+                fdf = _read_frame(path)
+                ts = _to_ms(fdf['fundingTime' if 'fundingTime' in fdf.columns else 'timestamp'])
+                rate = fdf['fundingRate' if 'fundingRate' in fdf.columns else 'rate'].to_numpy(dtype=float)
+                # Charge at the first bar at/after the funding time
+                idx = np.searchsorted(grid, ts)
+                ok = idx < len(grid)
+                np.add.at(funding[:, n], idx[ok], rate[ok])
+                break
+
+    markets = {}
+    markets_file = os.path.join(data_dir, 'markets.json')
+    if os.path.exists(markets_file):
+        with open(markets_file) as f:
+            markets = json.load(f).get('markets', {})
+
+    return HistoryData(
+        symbols=[raw_id_to_symbol(i) for i in ids],
+        timestamps=grid.astype(np.int64),
+        close=close.to_numpy(),
+        high=pivot('high').to_numpy(),
+        low=pivot('low').to_numpy(),
+        quote_volume=quote_volume.to_numpy(),
+        funding=funding,
+        mark=close.ffill().fillna(0.0).to_numpy(),
+        markets=markets,
+    )
+
+
+def _synthetic_market(symbol: str) -> Dict:
+    base = symbol.split('/')[0]
+    lim = BACKTEST_LIMITS
+    return {
+        'id': f"{base}USDT", 'symbol': symbol, 'base': base, 'quote': 'USDT', 'settle': 'USDT',
+        'linear': True, 'swap': True, 'contract': True, 'active': True,
+        'limits': {'amount': {'min': lim.min_amount, 'max': lim.max_amount}, 'cost': {'min': lim.min_cost}},
+        'precision': {'amount': lim.step_size, 'price': lim.price_precision},
+    }
+
+
+class SimulatedClient:
+    def __init__(self, history: HistoryData, initial_equity: float,
+                 fee_rate: float = DEFAULT_FEE_RATE, slippage_bps: float = DEFAULT_SLIPPAGE_BPS):
+        """
+        模拟交易所 (Simulated BinanceClient) - same async surface, fills at the current bar close
+        """
+        self.h = history
+        self.fee_rate = fee_rate
+        self.slippage = slippage_bps / 10_000
+        self.col = {s: n for n, s in enumerate(history.symbols)}
+        self.t = 0
+        self.mark = history.mark
+
+        self.market_index = MarketIndex(cache_file=os.devnull, ttl_hours=1e9)
+        self.market_index.build({s: history.markets.get(s) or _synthetic_market(s) for s in history.symbols})
+        self.supports_batch_orders = True
+
+        # Account
+        self.cash = initial_equity  # Wallet balance incl. realized PnL, fees, funding
+        self.qty = np.zeros(len(history.symbols))
+        self.cost = np.zeros(len(history.symbols))  # Sum of signed entry notional (for entry price)
+        self.fees_paid = 0.0
+        self.funding_paid = 0.0
+        self.turnover = 0.0
+        self.trades = 0
+        self.rejected = 0
+        self._last_funding = np.zeros(len(history.symbols))
+        self._funding_info: Optional[Dict[str, FundingInfo]] = None  # Rebuilt only when a rate changes
+
+    # --- Simulation control ---
+
+    def set_time(self, t: int):
+        """Advance to bar t and settle funding charged on that bar"""
+        self.t = t
+        rates = self.h.funding[t]
+        charged = rates != 0
+        if charged.any():
+            self._last_funding[charged] = rates[charged]
+            self._funding_info = None
+            price = self.mark[t]
+            # Longs pay shorts when the rate is positive
+            payment = float(np.sum(self.qty * price * rates))
+            self.cash -= payment
+            self.funding_paid += payment
+
+    def _price(self, n: int) -> float:
+        return float(self.h.close[self.t, n])
+
+    def equity(self) -> float:
+        price = self.mark[self.t]
+        return self.cash + float(np.sum(self.qty * price - self.cost))
+
+    # --- BinanceClient surface ---
+
+    async def validate_connectivity(self):
+        return True
+
+    async def close(self):
+        pass
+
+    async def load_markets(self):
+        pass
+
+    async def set_leverage(self, symbol: str, leverage: int):
+        pass
+
+    async def get_tickers(self) -> Dict[str, Dict]:
+        t = self.t
+        closes = self.h.close[t].tolist()
+        volumes = self.h.quote_volume[t].tolist()
+        return {symbol: {'symbol': symbol, 'last': last, 'quoteVolume': vol}
+                for symbol, last, vol in zip(self.h.symbols, closes, volumes) if last == last}  # NaN != NaN
+
+    async def get_open_interest(self, symbols: List[str]) -> Dict[str, float]:
+        # No open interest history is stored: the factor stays neutral in backtests
+        return {}
+
+    async def get_market_prices(self, symbols: List[str]) -> Dict[str, float]:
+        prices = {}
+        for s in symbols:
+            n = self.col.get(s)
+            if n is not None and np.isfinite(self.h.close[self.t, n]):
+                prices[s] = self._price(n)
+        return prices
+
+    async def get_account_balance(self) -> Dict[str, float]:
+        equity = self.equity()
+        price = self.mark[self.t]
+        used_margin = float(np.sum(np.abs(self.qty * price))) / Config.LEVERAGE
+        return {'total_equity': equity, 'free_margin': max(0.0, equity - used_margin)}
+
+    async def get_cw_positions(self) -> Dict[str, float]:
+        return {self.h.symbols[n]: float(self.qty[n]) for n in np.flatnonzero(self.qty)}
+
+    async def snapshot(self) -> CycleSnapshot:
+        """
+        The simulated calls complete immediately, so the cycle snapshot is assembled
+        directly instead of through SnapshotBuilder's concurrent gather.
+        """
+        now = self.h.timestamps[self.t] / 1000
+        return CycleSnapshot(
+            tickers=await self.get_tickers(),
+            balance=await self.get_account_balance(),
+            positions=await self.get_cw_positions(),
+            funding=await self.get_funding_info(),
+            fetched_at=dict.fromkeys(('tickers', 'balance', 'positions', 'funding'), now),
+            taken_at=now,
+        )
+
+    async def get_position_details(self) -> Dict[str, Dict[str, float]]:
+        price = self.mark[self.t]
+        return {self.h.symbols[n]: {'contracts': float(self.qty[n]),
+                                    'entry_price': float(self.cost[n] / self.qty[n]),
+                                    'unrealized_pnl': float(self.qty[n] * price[n] - self.cost[n])}
+                for n in np.flatnonzero(self.qty)}
+
+    async def get_funding_rates(self) -> Dict[str, float]:
+        return dict(zip(self.h.symbols, self._last_funding.tolist()))
+
+    async def get_funding_info(self) -> Dict[str, FundingInfo]:
+        # Rates change once per funding period, not every bar
+        if self._funding_info is None:
+            self._funding_info = {s: info_from_rate(r) for s, r in zip(self.h.symbols, self._last_funding.tolist())}
+        return dict(self._funding_info)
+
+    async def get_symbol_limits(self, symbol: str) -> Dict[str, float]:
+        limits = self.market_index.get(symbol) or BACKTEST_LIMITS
+        return limits._asdict()
+
+    async def place_order(self, symbol: str, side: str, amount: float, price: float = None, params: Optional[Dict] = None) -> Optional[Dict]:
+        n = self.col.get(symbol)
+        if n is None or not np.isfinite(self.h.close[self.t, n]) or amount <= 0:
+            self.rejected += 1
+            return None
+        limits = self.market_index.get(symbol) or BACKTEST_LIMITS
+        sign = 1.0 if side == 'buy' else -1.0
+        fill = self._price(n) * (1 + sign * self.slippage)
+        notional = amount * fill
+        reduce_only = bool((params or {}).get('reduceOnly'))
+        if amount < limits.min_amount or (notional < limits.min_cost and not reduce_only):
+            # -4164: Order's notional must be no smaller than min notional
+            self.rejected += 1
+            return None
+
+        # Realize PnL on the reduced part, keep average entry on the rest
+        q0 = self.qty[n]
+        q1 = q0 + sign * amount
+        if q0 != 0 and np.sign(q1) != np.sign(q0) and q1 != 0:
+            # Flip: close old position fully, open the remainder at fill
+            self.cash += q0 * fill - self.cost[n]
+            self.cost[n] = q1 * fill
+        elif abs(q1) < abs(q0):
+            closed = q0 - q1
+            avg = self.cost[n] / q0
+            self.cash += closed * (fill - avg)
+            self.cost[n] = q1 * avg
+        else:
+            self.cost[n] += sign * amount * fill
+        if q1 == 0:
+            self.cost[n] = 0.0
+        self.qty[n] = q1
+
+        fee = notional * self.fee_rate
+        self.cash -= fee
+        self.fees_paid += fee
+        self.turnover += notional
+        self.trades += 1
+        return {'id': str(self.trades), 'symbol': symbol, 'side': side, 'amount': amount,
+                'filled': amount, 'average': fill, 'price': fill, 'cost': notional,
+                'fee': {'cost': fee, 'currency': 'USDT'}, 'timestamp': int(self.h.timestamps[self.t]),
+                'status': 'closed'}
+
+    async def place_orders(self, orders: List[Dict]) -> List[Optional[Dict]]:
+        return [await self.place_order(o['symbol'], o['side'], o['amount'], o.get('price'), o.get('params'))
+                for o in orders]
+
+
+@dataclass
+class BacktestResult:
+    timestamps: np.ndarray
+    equity: np.ndarray
+    initial_equity: float
+    fees: float
+    funding: float
+    turnover: float
+    trades: int
+    rejected: int
+    elapsed: float  # Wall-clock seconds
+    halted_at: Optional[int] = None  # Epoch ms of the bar where the risk halt fired (trading stopped there)
+    halt_reason: str = ''
+
+    @property
+    def total_return(self) -> float:
+        return float(self.equity[-1] / self.initial_equity - 1) if len(self.equity) else 0.0
+
+    @property
+    def max_drawdown(self) -> float:
+        if not len(self.equity):
+            return 0.0
+        peak = np.maximum.accumulate(self.equity)
+        return float(np.max(1 - self.equity / peak))
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'total_return': self.total_return,
+            'max_drawdown': self.max_drawdown,
+            'final_equity': float(self.equity[-1]) if len(self.equity) else self.initial_equity,
+            'turnover': self.turnover / self.initial_equity,  # Traded notional in multiples of initial equity
+            'fees': self.fees,
+            'funding': self.funding,
+            'trades': self.trades,
+            'rejected': self.rejected,
+            'halted': self.halted_at is not None,
+        }
+
+
+class Backtester:
+    def __init__(self, history: HistoryData, initial_equity: Optional[float] = None,
+                 fee_rate: float = DEFAULT_FEE_RATE, slippage_bps: float = DEFAULT_SLIPPAGE_BPS,
+                 rebalance_minutes: Optional[int] = None, scan_minutes: Optional[int] = None,
+                 max_peak_drawdown: Optional[float] = None):
+        """
+        回测器 (Backtester) - drives MarketScanner + Rebalancer over simulated time
+        Rebalancing runs every SCAN_INTERVAL_MINUTES as in main_loop; the universe is re-ranked
+        every scan_minutes (24h-volume ranks barely move bar to bar, and scanning every bar
+        would dominate replay time).
+        max_peak_drawdown: peak-drawdown halt for this run (default MAX_PEAK_DRAWDOWN_PCT, 0 = off).
+        After a halt the book is flattened and the rest of the replay stays flat, as live.
+        """
+        self.history = history
+        self.initial_equity = Config.INITIAL_EQUITY if initial_equity is None else initial_equity
+        self.client = SimulatedClient(history, self.initial_equity, fee_rate, slippage_bps)
+        self.scanner = MarketScanner(self.client)
+        # Position stops run on simulated time (in-memory ledger)
+        clock = lambda: float(history.timestamps[self.client.t]) / 1000
+        settings = Config
+        if max_peak_drawdown is not None:
+            settings = Config.model_copy(update={'MAX_PEAK_DRAWDOWN_PCT': max_peak_drawdown})
+        self.risk_manager = RiskManager(clock=clock, initial_equity=self.initial_equity, settings=settings)
+        self.rebalancer = Rebalancer(self.client, self.risk_manager)
+
+        bar_min = history.bar_ms / 60_000
+        self.rebalance_every = max(1, int(round((rebalance_minutes or Config.SCAN_INTERVAL_MINUTES) / bar_min)))
+        self.scan_every = max(self.rebalance_every,
+                              int(round((scan_minutes or DEFAULT_SCAN_MINUTES) / bar_min)))
+
+    async def run(self) -> BacktestResult:
+        start = time.perf_counter()
+        h = self.history
+        equity = np.empty(len(h.timestamps))
+        coins: List[str] = []
+        halted_at: Optional[int] = None
+
+        # Per-cycle INFO logging dominates replay time; keep warnings off too
+        previous_level = logger.level
+        logger.setLevel(logging.ERROR)
+        try:
+            for t in range(len(h.timestamps)):
+                self.client.set_time(t)
+                if t % self.rebalance_every == 0:
+                    snapshot = await self.client.snapshot()
+                    if t % self.scan_every == 0 or not coins:
+                        coins = await self.scanner.get_top_coins(snapshot=snapshot)
+                    if coins and (halted_at is None or snapshot.positions):
+                        # Once halted, cycles only retry the flatten until the book is flat
+                        await self.rebalancer.rebalance(coins, snapshot, allow_exits=not self.scanner.degraded)
+                    if halted_at is None and self.risk_manager.halted:
+                        halted_at = int(h.timestamps[t])
+                        logger.critical(f"🛑 Backtest halted at {pd.Timestamp(halted_at, unit='ms', tz='UTC')}: "
+                                        f"{self.risk_manager.halt_reason}")
+                        # The flatten retries would log the halt every cycle
+                        logger.setLevel(logging.CRITICAL + 1)
+                equity[t] = self.client.equity()
+        finally:
+            logger.setLevel(previous_level)
+
+        c = self.client
+        return BacktestResult(h.timestamps, equity, self.initial_equity, c.fees_paid, c.funding_paid,
+                              c.turnover, c.trades, c.rejected, time.perf_counter() - start,
+                              halted_at, self.risk_manager.halt_reason)
+
+    def run_sync(self) -> BacktestResult:
+        return asyncio.run(self.run())
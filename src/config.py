@@ -1,4 +1,5 @@
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from typing import List, Optional, Dict
 from pydantic import Field
@@ -19,6 +20,10 @@ class Settings(BaseSettings):
     
     IS_TESTNET: bool = Field(default=True)
     
+    # Accounts (multi-account mode: one process, one market-data feed, several sub-accounts)
+    ACCOUNT_NAME: str = "main" # Tag for this account's logs (set per profile)
+    ACCOUNTS_FILE: Optional[str] = None # JSON list of account profiles; unset = single account from these settings
+    
     # Trading Parameters
     INITIAL_EQUITY: float = 200.0  # USDT (Reference only, logic uses actual)
     
@@ -27,35 +32,128 @@ class Settings(BaseSettings):
     LEVERAGE: int = 5
     EFFECTIVE_LEVERAGE: float = 2.0 # Target total exposure multiplier (e.g. 2.0x of Equity)
     
-    # Weights configuration (Symbol -> Weight 0.0 to 1.0)
-    # Remaining weight is distributed equally among other selected coins
+    # Weights configuration (Symbol -> Weight 0.0 to 1.0); BTC/USDT, BTCUSDT and BTC/USDT:USDT all name the perpetual
+    # Remaining weight is split among the other selected coins by WEIGHTING_METHOD
     COIN_WEIGHTS: Dict[str, float] = {
-        "BTC/USDT": 0.4, # 40% allocation to BTC
-        "ETH/USDT": 0.3, # 30% allocation to ETH
+        "BTC/USDT:USDT": 0.4, # 40% allocation to BTC
+        "ETH/USDT:USDT": 0.3, # 30% allocation to ETH
     }
+    WEIGHTING_METHOD: str = "risk_parity" # equal | inverse_vol | risk_parity (needs USE_OHLCV_STORE, else equal)
+    WEIGHT_MAX_SHARE: float = 0.25 # Max share of the remaining weight one coin gets (inverse_vol / risk_parity)
+    COV_HALFLIFE_BARS: float = 168.0 # EWMA covariance half-life (1 week of 1h bars)
+    COV_MIN_BARS: int = 48 # Coins with less history get the median volatility
     
     # Rebalancing Parameters
     REBALANCE_THRESHOLD_PCT: float = 0.05  # 5% deviation triggers trade
     SCAN_INTERVAL_MINUTES: int = 5
     
+    # Job Scheduler (independent cadences; SCAN_INTERVAL_MINUTES drives the full scan + rebalance)
+    REBALANCE_CHECK_SEC: float = 2.0 # Act on price-stream deviation / stop triggers this often
+    FUNDING_REFRESH_MINUTES: float = 5.0 # Funding cache check (downloads only after a funding time)
+    MARKET_REFRESH_CHECK_MINUTES: float = 15.0 # Market metadata re-download once MARKET_CACHE_TTL_HOURS passed
+    JOB_RETRY_SEC: float = 10.0 # First retry after a failed job, doubling per consecutive failure
+    JOB_MAX_BACKOFF_SEC: float = 300.0
+    
+    # Live Price Stream (WebSocket)
+    USE_PRICE_STREAM: bool = True # Stream mark prices and rebalance as soon as a position deviates
+    PRICE_STREAM_STALE_SEC: float = 10.0 # Fall back to REST prices if no stream update for this long
+    REBALANCE_COOLDOWN_SEC: float = 15.0 # Min gap between stream-triggered rebalances
+    
+    # Account State (User-Data Stream)
+    USE_USER_STREAM: bool = True # Keep balance/positions in memory from ACCOUNT_UPDATE events
+    RECONCILE_INTERVAL_MINUTES: int = 15 # REST reconciliation to correct drift
+    
     # Risk Management
     MAX_DRAWDOWN_PCT: float = 0.30  # Global Account Stop Loss
-    MAX_POS_DRAWDOWN_PCT: float = 0.15 # Single Position Stop Loss (15%)
+    MAX_PEAK_DRAWDOWN_PCT: float = 0.25 # Flatten when equity falls this far below its high-water mark (0 = off)
+    RISK_POLL_SEC: float = 5.0 # Risk monitor REST equity poll when the account stream is down
+    RISK_STATE_FILE: str = "data/risk_state.json" # High-water mark and halt flag (survive restarts)
+    MAX_POS_DRAWDOWN_PCT: float = 0.15 # Single Position Stop Loss (15%, from the best price since entry)
+    POSITION_STOP_COOLDOWN_MINUTES: int = 240 # Stopped symbols are not re-entered for this long
+    LEDGER_FILE: str = "data/ledger.json" # Persistent position ledger (entry / peak prices)
     
+    # Market Scanner (multi-factor ranking of the most traded perps, see scanner_engine.py)
+    SCAN_POOL_SIZE: int = 100 # Most traded perps scored per scan (at least 2x MAX_OPEN_POSITIONS)
+    SCAN_FACTOR_WEIGHTS: Dict[str, float] = {
+        "volume": 1.0, # 24h quote volume
+        "volatility": 0.5, # 24h high-low range (harvested by rebalancing)
+        "spread": 0.5, # Book-ticker spread (penalty)
+        "open_interest": 0.5, # Open interest notional (0 = never fetched)
+        "funding": 0.25, # Funding rate (penalty for longs paying)
+    }
+    SCAN_MAX_SPREAD_BPS: float = 20.0 # Skip coins with a wider book (0 = off)
+    OPEN_INTEREST_TTL_MINUTES: float = 30.0 # Open interest has no bulk endpoint: cached per symbol
+    SECTOR_MAX_SHARE: float = 0.20 # Max share of the selected coins per sector (0 = off)
+    SECTOR_OVERRIDES: Dict[str, str] = {} # Base asset -> sector, over Binance's underlyingSubType (e.g. {"WLD": "AI"})
+    # Stablecoins + illiquid testnet assets (causing -4131/MaxQty errors); exact base-asset match
+    SCAN_BLACKLIST: List[str] = ["USDC", "TUSD", "FDUSD", "USDP", "BTCDOM", "AIA", "MYRO"]
+
+    # OHLCV Store (local bar history, fetched incrementally, see ohlcv_store.py)
+    USE_OHLCV_STORE: bool = True
+    OHLCV_DIR: str = "data/ohlcv"
+    OHLCV_TIMEFRAME: str = "1h"
+    OHLCV_HISTORY_BARS: int = 720 # Backfill for a symbol seen for the first time (30 days of 1h)
+    OHLCV_REFRESH_MINUTES: float = 5.0 # Store check (requests only once a new bar has closed)
+    SCAN_VOLATILITY_BARS: int = 24 # Realized volatility window for the scanner (24h of 1h bars)
+
     # Funding Rate Filters
     CHECK_FUNDING_RATE_APR: bool = True # Switch to enable/disable abnormally high rate check
     MAX_FUNDING_RATE_APR: float = 1.00 # 100% APR limit (considered abnormal)
     AVOID_PAYING_FUNDING_FEES: bool = True # If True, will skip any coin with Positive Funding Rate (Long pays Short)
     
     MAX_MARGIN_UTILIZATION_PCT: float = 0.80 # Max 80% of Equity used as Margin
+    MARGIN_BUFFER_PCT: float = 0.05 # Free margin kept unused when sizing opening orders after reductions
     
     # Minimum Order Value (Binance Futures constraint)
     MIN_ORDER_VALUE: float = 5.1 
 
+    # Order Execution
+    MAX_CONCURRENT_ORDERS: int = 5 # Max in-flight order requests per cycle
+    USE_BATCH_ORDERS: bool = True # Use Binance batchOrders (up to 5 orders per request) when available
+    TAKER_FEE_RATE: float = 0.0005 # Fee estimate when the order response carries none
+    USE_SMART_EXECUTION: bool = True # Estimate impact from the order book; work large orders instead of one market order
+    DEPTH_LIMIT: int = 20 # Order book levels fetched per symbol (weight 2 up to 50)
+    DEPTH_TTL_SEC: float = 2.0 # Order book reuse window
+    EXEC_MAX_IMPACT_BPS: float = 10.0 # Max estimated cost vs mid of a market order; above it the order is worked
+    EXEC_MAX_SLICES: int = 10 # Max TWAP slices per order
+    EXEC_SLICE_INTERVAL_SEC: float = 5.0 # Spacing of TWAP slices (shortened to fit the deadline)
+    EXEC_ORDER_DEADLINE_SEC: float = 60.0 # A worked order's unfilled rest goes out at market after this
+    EXEC_POLL_SEC: float = 2.0 # Status polling of resting post-only orders
+
+    # Trade Journal
+    JOURNAL_FILE: str = "data/journal.db" # SQLite (WAL) fill journal
+    JOURNAL_FLUSH_SEC: float = 1.0 # Buffered fills are written at most this often
+
+    # REST Request Budget (Binance USDT-M limits)
+    API_WEIGHT_LIMIT_1M: int = 2400 # IP request weight per minute
+    ORDER_LIMIT_10S: int = 300 # New orders per 10 seconds per account
+
+    # Metrics (Prometheus text endpoint)
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9108 # 0 = disabled
+
+    # Logging
+    LOG_FORMAT: str = "text" # text | json (one object per line, with cycle correlation id)
+    LOG_SYMBOL_INTERVAL_SEC: float = 0.0 # Emit each per-symbol info line at most once per interval (0 = every time)
+
+    # Market Metadata Cache
+    MARKET_CACHE_FILE: str = "data/market_cache.json"
+    MARKET_CACHE_TTL_HOURS: float = 24.0 # Re-download exchange info after this age
+
+    # Warm Start (trade the last universe right after a restart)
+    WARM_STATE_FILE: str = "data/warm_state.json"
+    WARM_STATE_MAX_AGE_MINUTES: float = 30.0 # Older snapshots are ignored (full scan first)
+
+    # Shared Universe (run_scanner.py --serve publishes, bots on the same host subscribe)
+    UNIVERSE_FILE: str = "data/universe.json"
+    USE_SHARED_UNIVERSE: bool = False # Take scan results, tickers and funding from UNIVERSE_FILE
+    UNIVERSE_MAX_AGE_SEC: float = 180.0 # Older publications are ignored (the bot fetches itself)
+    UNIVERSE_PUBLISH_SEC: float = 60.0 # Scanner service publish interval
+
     # Dynamic Whitelist (fallback)
     DEFAULT_COINS: List[str] = [
-        "BTC/USDT", "ETH/USDT", "SOL/USDT", "BNB/USDT", "DOGE/USDT",
-        "XRP/USDT", "ADA/USDT", "AVAX/USDT", "LINK/USDT", "DOT/USDT"
+        "BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT", "BNB/USDT:USDT", "DOGE/USDT:USDT",
+        "XRP/USDT:USDT", "ADA/USDT:USDT", "AVAX/USDT:USDT", "LINK/USDT:USDT", "DOT/USDT:USDT"
     ]
 
     class Config:
@@ -71,3 +169,21 @@ except Exception as e:
     print(f"❌ Configuration Error: {e}")
     # Fallback/Exit? For now raise so user sees it
     raise e
+
+@contextmanager
+def override(**values):
+    """
+    临时覆盖配置 (Temporarily Override Settings) - e.g. for backtests and parameter sweeps
+    with override(REBALANCE_THRESHOLD_PCT=0.03): ...
+    """
+    unknown = [k for k in values if k not in Settings.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(unknown)}")
+    previous = {k: getattr(Config, k) for k in values}
+    try:
+        for k, v in values.items():
+            setattr(Config, k, v)
+        yield Config
+    finally:
+        for k, v in previous.items():
+            setattr(Config, k, v)
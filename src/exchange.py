@@ -1,73 +1,347 @@
-import ccxt.pro as ccxt  # Use pro if available, otherwise standard ccxt async
-# Fallback if pro not installed/licensed, but usually ccxt includes async in standard package as ccxt.async_support
-# safely import async support
-try:
-    import ccxt.async_support as ccxt
-except ImportError:
-    import ccxt
-
+# REST client. ccxt is imported on first use (see _load_ccxt): the package pulls in every
+# exchange (~0.7s), which backtests and tools never need. The WebSocket client (ccxt.pro)
+# is only imported when a stream is created, see BinanceClient.create_stream_exchange
+import time
+import heapq
 import asyncio
-from typing import Dict, List, Optional
-from config import Config
+import itertools
+import functools
+import contextvars
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List, Optional, Tuple
+from config import Config, Settings
 from logger import logger
+from market_index import MarketIndex, DEFAULT_LIMITS
+from funding import FundingRateStore, FundingInfo
+from metrics import metrics
+
+ccxt = None  # ccxt.async_support, set by _load_ccxt
+
+
+def _load_ccxt():
+    global ccxt
+    if ccxt is None:
+        import ccxt.async_support as ccxt_async
+        ccxt = ccxt_async
+    return ccxt
+
+# Priority lanes (lower value is served first)
+LANE_ORDER = 0    # order placement / cancellation
+LANE_ACCOUNT = 1  # balance, positions, leverage, listen key
+LANE_MARKET = 2   # tickers, funding, metadata
+LANE_NAMES = {LANE_ORDER: 'order', LANE_ACCOUNT: 'account', LANE_MARKET: 'market'}
+
+# Share of the weight budget a lane may not spend, so orders always find headroom
+LANE_RESERVE = {LANE_ORDER: 0.0, LANE_ACCOUNT: 0.1, LANE_MARKET: 0.25}
+
+# (path suffix, lane, weight) - first match wins. Weights from the USDT-M API docs;
+# ticker/premiumIndex drop to 1 when a single symbol is requested.
+ENDPOINT_COSTS = (
+    ('/batchOrders', LANE_ORDER, 5),
+    ('/allOpenOrders', LANE_ORDER, 1),
+    ('/order', LANE_ORDER, 1),
+    ('/leverage', LANE_ACCOUNT, 1),
+    ('/positionRisk', LANE_ACCOUNT, 5),
+    ('/balance', LANE_ACCOUNT, 5),
+    ('/account', LANE_ACCOUNT, 5),
+    ('/listenKey', LANE_ACCOUNT, 1),
+    ('/ticker/24hr', LANE_MARKET, 40),
+    ('/ticker/price', LANE_MARKET, 2),
+    ('/ticker/bookTicker', LANE_MARKET, 5),
+    ('/openInterest', LANE_MARKET, 1),
+    ('/premiumIndex', LANE_MARKET, 10),
+    ('/fundingInfo', LANE_MARKET, 1),
+    ('/exchangeInfo', LANE_MARKET, 1),
+    ('/klines', LANE_MARKET, 5),
+    ('/depth', LANE_MARKET, 2),
+)
+DEFAULT_COST = (LANE_MARKET, 1)
+
+# BinanceClient method currently issuing requests (metrics label)
+_api_method: contextvars.ContextVar = contextvars.ContextVar('api_method', default=None)
+
+
+def api_method(fn):
+    """Label REST requests made inside fn with its name in the API metrics"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = _api_method.set(fn.__name__)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _api_method.reset(token)
+    return wrapper
+
+
+def request_cost(url: str, method: str) -> Tuple[int, int, int]:
+    """URL -> (lane, request weight, order count)"""
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    suffix, (lane, weight) = None, DEFAULT_COST
+    for suffix_, lane_, weight_ in ENDPOINT_COSTS:
+        if parts.path.endswith(suffix_):
+            suffix, lane, weight = suffix_, lane_, weight_
+            break
+    
+    if suffix in ('/ticker/24hr', '/premiumIndex') and 'symbol' in query:
+        weight = 1
+    elif suffix == '/ticker/bookTicker' and 'symbol' in query:
+        weight = 2
+    elif suffix == '/klines':
+        limit = int(query.get('limit', ['500'])[0])
+        weight = 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    elif suffix == '/depth':
+        limit = int(query.get('limit', ['500'])[0])
+        weight = 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+    
+    # Only new orders count against the order-rate limit (a batch counts as up to 5)
+    orders = 0
+    if method == 'POST' and suffix == '/order':
+        orders = 1
+    elif method == 'POST' and suffix == '/batchOrders':
+        orders = 5
+    return lane, weight, orders
+
+
+def _header(headers: Optional[Dict], name: str) -> Optional[str]:
+    """Case-insensitive response header lookup"""
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, period_sec: float):
+        self.capacity = float(capacity)
+        self.rate = capacity / period_sec
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # Retry-After from a 429 / 418
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, floor: float = 0.0) -> float:
+        """Seconds until `cost` can be spent without dropping below `floor`"""
+        missing = cost + floor - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def sync(self, used: float):
+        """Align with the server's count of weight used in the current window"""
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class RequestScheduler:
+    def __init__(self, weight_limit: Optional[int] = None, order_limit: Optional[int] = None,
+                 weight: Optional[TokenBucket] = None):
+        """
+        请求调度器 (Request Scheduler)
+        Admits REST requests against the IP weight budget (per minute) and the account
+        order-count budget (per 10s). Waiting requests are served strictly by lane, so an
+        order never queues behind a full-market ticker download.
+        Accounts in one process pass the same `weight` bucket (the limit is per IP) and
+        keep their own order budget.
+        """
+        self.weight = weight or TokenBucket(weight_limit or Config.API_WEIGHT_LIMIT_1M, 60.0)
+        self.orders = TokenBucket(order_limit or Config.ORDER_LIMIT_10S, 10.0)
+        self._waiting = []  # heap of (lane, seq, wake event)
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def _delay(self, lane: int, weight: float, orders: int) -> float:
+        now = time.monotonic()
+        if now < self.weight.paused_until:
+            return self.weight.paused_until - now
+        self.weight.refill(now)
+        self.orders.refill(now)
+        floor = self.weight.capacity * LANE_RESERVE[lane]
+        return max(self.weight.wait_time(weight, floor), self.orders.wait_time(orders))
+
+    def _wake_head(self):
+        if self._waiting:
+            self._waiting[0][2].set()
+
+    async def acquire(self, lane: int, weight: float, orders: int = 0):
+        """Wait until this request is first in line and its lane has budget, then spend it"""
+        # A request heavier than the lane's whole allowance would never be admitted
+        weight = min(weight, self.weight.capacity * (1 - LANE_RESERVE[lane]))
+        entry = (lane, next(self._seq), asyncio.Event())
+        heapq.heappush(self._waiting, entry)
+        try:
+            while True:
+                delay = None
+                if self._waiting[0] is entry:
+                    delay = self._delay(lane, weight, orders)
+                    if delay <= 0:
+                        break
+                entry[2].clear()
+                try:
+                    await asyncio.wait_for(entry[2].wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Cancelled while queued: leave the line without spending
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            self._wake_head()
+            raise
+        
+        heapq.heappop(self._waiting)
+        self.weight.tokens -= weight
+        self.orders.tokens -= orders
+        self._wake_head()
+
+    def observe(self, headers: Optional[Dict]):
+        """Sync buckets with X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-10S"""
+        used = _header(headers, 'x-mbx-used-weight-1m')
+        if used is not None:
+            self.weight.sync(float(used))
+        order_count = _header(headers, 'x-mbx-order-count-10s')
+        if order_count is not None:
+            self.orders.sync(float(order_count))
+
+    def back_off(self, headers: Optional[Dict]):
+        """429 / 418: stop every lane (of every account sharing the IP budget) until Retry-After has passed"""
+        retry_after = float(_header(headers, 'retry-after') or 60)
+        self.weight.paused_until = max(self.weight.paused_until, time.monotonic() + retry_after)
+        self.weight.tokens = 0.0
+        logger.warning(f"⚠️ Rate limited by exchange, pausing requests for {retry_after:.0f}s")
+        self._wake_head()
+
+    def install(self, exchange):
+        """Route every REST call of a ccxt exchange through this scheduler"""
+        fetch = exchange.fetch
+        
+        async def scheduled_fetch(url, method='GET', headers=None, body=None):
+            lane, weight, orders = request_cost(url, method)
+            endpoint = _api_method.get() or urlsplit(url).path
+            queued_at = time.perf_counter()
+            await self.acquire(lane, weight, orders)
+            sent_at = time.perf_counter()
+            metrics.observe('api_queue_seconds', sent_at - queued_at, lane=LANE_NAMES[lane])
+            try:
+                response = await fetch(url, method, headers, body)
+            except Exception as e:
+                metrics.inc('api_errors_total', endpoint=endpoint, error=type(e).__name__)
+                if isinstance(e, ccxt.DDoSProtection):
+                    # Also covers RateLimitExceeded; headers were stored before the error was raised
+                    self.back_off(exchange.last_response_headers)
+                raise
+            finally:
+                metrics.observe('api_request_seconds', time.perf_counter() - sent_at, endpoint=endpoint)
+            self.observe(exchange.last_response_headers)
+            return response
+        
+        exchange.fetch = scheduled_fetch
+        # The scheduler replaces ccxt's generic per-call throttle
+        exchange.enableRateLimit = False
+
 
 class BinanceClient:
-    def __init__(self):
+    def __init__(self, settings: Optional[Settings] = None, market_data: Optional['BinanceClient'] = None):
         """
         初始化 Binance 交易所客户端 (Initialize Binance Exchange Client) - Async
+        settings: account profile (keys, limits); the global Config by default.
+        market_data: client whose market index, funding cache and IP weight budget this
+        account shares (multi-account mode), so market metadata is downloaded once.
         """
+        self.settings = settings or Config
         # Select Keys based on environment
-        if Config.IS_TESTNET and Config.TESTNET_API_KEY:
-            api_key = Config.TESTNET_API_KEY
-            secret = Config.TESTNET_SECRET_KEY
+        if self.settings.IS_TESTNET and self.settings.TESTNET_API_KEY:
+            api_key = self.settings.TESTNET_API_KEY
+            secret = self.settings.TESTNET_SECRET_KEY
         else:
-            api_key = Config.API_KEY
-            secret = Config.SECRET_KEY
+            api_key = self.settings.API_KEY
+            secret = self.settings.SECRET_KEY
             
         self.config = {
             'apiKey': api_key,
             'secret': secret,
             # 'verbose': True, # DEBUG: Enable verbose output to see raw requests
-            'enableRateLimit': True,
+            'enableRateLimit': False, # Throttled by RequestScheduler instead
             'options': {
                 'defaultType': 'future',  # 默认使用合约 (Futures)
                 'fetchMarkets': ['linear'], # Only fetch USDT Futures to avoid SAPI/Margin calls
             }
         }
         
-        self.exchange = ccxt.binance(self.config)
+        self.exchange = _load_ccxt().binance(self.config)
+        # Weight-aware throttling with order priority (shared with stream clients)
+        self.scheduler = RequestScheduler(
+            self.settings.API_WEIGHT_LIMIT_1M, self.settings.ORDER_LIMIT_10S,
+            weight=market_data.scheduler.weight if market_data is not None else None)
+        self.scheduler.install(self.exchange)
         
-        if Config.IS_TESTNET:
-            # Manual Override for Futures Testnet
-            # According to official docs: https://demo-fapi.binance.com
-            testnet_base = 'https://demo-fapi.binance.com/fapi/v1'
-            testnet_base_v2 = 'https://demo-fapi.binance.com/fapi/v2'
-            testnet_base_v3 = 'https://demo-fapi.binance.com/fapi/v3'
-            
-            self.exchange.urls['api']['fapiPublic'] = testnet_base
-            self.exchange.urls['api']['fapiPrivate'] = testnet_base
-            self.exchange.urls['api']['fapiPublicV2'] = testnet_base_v2
-            self.exchange.urls['api']['fapiPrivateV2'] = testnet_base_v2
-            self.exchange.urls['api']['fapiPublicV3'] = testnet_base_v3
-            self.exchange.urls['api']['fapiPrivateV3'] = testnet_base_v3
-            
-            # General public/private overrides just in case
-            self.exchange.urls['api']['public'] = testnet_base
-            self.exchange.urls['api']['private'] = testnet_base
-            
-            # Map sapi (Spot API) to allow CCXT internals to pass checks
-            self.exchange.urls['api']['sapi'] = 'https://testnet.binance.vision/sapi/v1'
-            
+        if self.settings.IS_TESTNET:
+            self._apply_testnet_urls(self.exchange)
             logger.warning("⚠️ Running in TESTNET mode (URL: demo-fapi.binance.com)")
             
         # Optimization: Disable fetchCurrencies
         self.exchange.has['fetchCurrencies'] = False
+        
+        if market_data is not None:
+            self.market_index = market_data.market_index
+            self.funding_store = market_data.funding_store
+        else:
+            # Pre-indexed market metadata (persisted, refreshed in background)
+            self.market_index = MarketIndex()
+            # Funding rates, cached until the next funding time
+            self.funding_store = FundingRateStore(self.exchange, self.market_index)
+
+    @staticmethod
+    def _apply_testnet_urls(exchange):
+        """Manual Override for Futures Testnet"""
+        # According to official docs: https://demo-fapi.binance.com
+        testnet_base = 'https://demo-fapi.binance.com/fapi/v1'
+        testnet_base_v2 = 'https://demo-fapi.binance.com/fapi/v2'
+        testnet_base_v3 = 'https://demo-fapi.binance.com/fapi/v3'
+        
+        exchange.urls['api']['fapiPublic'] = testnet_base
+        exchange.urls['api']['fapiPrivate'] = testnet_base
+        exchange.urls['api']['fapiPublicV2'] = testnet_base_v2
+        exchange.urls['api']['fapiPrivateV2'] = testnet_base_v2
+        exchange.urls['api']['fapiPublicV3'] = testnet_base_v3
+        exchange.urls['api']['fapiPrivateV3'] = testnet_base_v3
+        
+        # General public/private overrides just in case
+        exchange.urls['api']['public'] = testnet_base
+        exchange.urls['api']['private'] = testnet_base
+        
+        # Map sapi (Spot API) to allow CCXT internals to pass checks
+        exchange.urls['api']['sapi'] = 'https://testnet.binance.vision/sapi/v1'
+        
+        # WebSocket streams (only present on ccxt.pro instances)
+        if isinstance(exchange.urls['api'].get('ws'), dict):
+            exchange.urls['api']['ws']['future'] = 'wss://fstream.binancefuture.com/ws'
+
+    def create_stream_exchange(self):
+        """
+        创建 WebSocket 客户端 (Create ccxt.pro Client)
+        Shares credentials, options and the already loaded markets with the REST client.
+        """
+        import ccxt.pro as ccxtpro
+        
+        ws = ccxtpro.binance(self.config)
+        if self.settings.IS_TESTNET:
+            self._apply_testnet_urls(ws)
+        ws.has['fetchCurrencies'] = False
+        self.scheduler.install(ws)
+        if self.exchange.markets:
+            ws.set_markets(self.exchange.markets)
+        return ws
 
     async def close(self):
         """Cleanup connection"""
+        await self.market_index.close()
         if self.exchange:
             await self.exchange.close()
 
+    @api_method
     async def validate_connectivity(self):
         """
         验证 API 连接 (Validate API Connectivity)
@@ -80,6 +354,7 @@ class BinanceClient:
             logger.error(f"❌ Connection Failed: {e}")
             raise e
 
+    @api_method
     async def get_market_prices(self, symbols: List[str]) -> Dict[str, float]:
         """
         批量获取最新价格 (Batch Fetch Latest Prices)
@@ -93,6 +368,77 @@ class BinanceClient:
             logger.error(f"❌ Error fetching prices: {e}")
             return {}
 
+    @api_method
+    async def get_tickers(self) -> Dict[str, Dict]:
+        """
+        获取全部行情 (Fetch All Tickers)
+        The futures 24h ticker carries no bid/ask: when the scanner ranks or filters on the
+        spread, the all-symbols book ticker is fetched alongside and merged in.
+        """
+        use_books = self.settings.SCAN_FACTOR_WEIGHTS.get('spread') or self.settings.SCAN_MAX_SPREAD_BPS > 0
+        try:
+            tickers, books = await asyncio.gather(
+                self.exchange.fetch_tickers(),
+                self._get_book_tickers() if use_books else asyncio.sleep(0, {}))
+        except Exception as e:
+            logger.error(f"❌ Error fetching tickers: {e}")
+            return {}
+        for symbol, book in books.items():
+            ticker = tickers.get(symbol)
+            if ticker is not None and book.get('bid') and book.get('ask'):
+                ticker['bid'], ticker['ask'] = book['bid'], book['ask']
+        return tickers
+
+    async def _get_book_tickers(self) -> Dict[str, Dict]:
+        """Best bid/ask for every symbol; spreads are optional, so failures only warn"""
+        try:
+            return await self.exchange.fetch_bids_asks()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fetch book tickers, ranking without spreads: {e}")
+            return {}
+
+    @api_method
+    async def get_open_interest(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        获取持仓量 (Get Open Interest) - contracts (base units) per symbol
+        Binance has no all-symbols endpoint (one request each): callers bound and cache the set.
+        Symbols that failed are left out.
+        """
+        async def fetch(symbol: str):
+            try:
+                data = await self.exchange.fetch_open_interest(symbol)
+                return symbol, float(data['openInterestAmount'])
+            except Exception as e:
+                logger.debug(f"Open interest unavailable for {symbol}: {e}")
+                return symbol, None
+
+        results = await asyncio.gather(*(fetch(s) for s in symbols))
+        return {symbol: value for symbol, value in results if value is not None}
+
+    @api_method
+    async def get_ohlcv(self, symbol: str, timeframe: str, since: Optional[int] = None,
+                        limit: Optional[int] = None) -> List[List[float]]:
+        """
+        获取K线 (Fetch Candles) - [[open time ms, open, high, low, close, volume], ...]
+        """
+        try:
+            return await self.exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+        except Exception as e:
+            logger.error(f"❌ Error fetching {timeframe} candles for {symbol}: {e}")
+            return []
+
+    @api_method
+    async def get_order_book(self, symbol: str, limit: int = 20) -> Optional[Dict]:
+        """
+        获取深度 (Fetch L2 Depth) - {'bids': [[price, qty], ...], 'asks': [...]} best first, None on failure
+        """
+        try:
+            return await self.exchange.fetch_order_book(symbol, limit)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fetch order book for {symbol}: {e}", extra={'symbol': symbol})
+            return None
+
+    @api_method
     async def get_account_balance(self) -> Dict[str, float]:
         """
         获取账户余额信息 (Get Account Balance)
@@ -143,15 +489,16 @@ class BinanceClient:
             logger.error(f"❌ Error fetching balance: {e}")
             return {'total_equity': 0.0, 'free_margin': 0.0}
 
+    @api_method
     async def get_cw_positions(self) -> Dict[str, float]:
         """
-        获取当前持仓大小 (Get Current Positions)
+        获取当前持仓大小 (Get Current Positions) - {symbol: signed quantity}, shorts negative
         """
         try:
             positions = await self.exchange.fetch_positions()
             active_positions = {}
             for pos in positions:
-                amt = float(pos['contracts'])
+                amt = self.parse_position(pos)['contracts']
                 if amt != 0:
                     active_positions[pos['symbol']] = amt
             return active_positions
@@ -159,6 +506,36 @@ class BinanceClient:
             logger.error(f"❌ Error fetching positions: {e}")
             return {}
 
+    @staticmethod
+    def parse_position(pos: Dict) -> Dict[str, float]:
+        """Unified ccxt position -> signed size, entry price and unrealized PnL"""
+        contracts = float(pos.get('contracts') or 0.0)
+        if pos.get('side') == 'short':
+            contracts = -abs(contracts)
+        return {
+            'contracts': contracts,
+            'entry_price': float(pos.get('entryPrice') or 0.0),
+            'unrealized_pnl': float(pos.get('unrealizedPnl') or 0.0),
+        }
+
+    @api_method
+    async def get_position_details(self) -> Dict[str, Dict[str, float]]:
+        """
+        获取持仓明细 (Get Position Details) - signed size, entry price, unrealized PnL
+        """
+        try:
+            positions = await self.exchange.fetch_positions()
+            details = {}
+            for pos in positions:
+                parsed = self.parse_position(pos)
+                if parsed['contracts'] != 0:
+                    details[pos['symbol']] = parsed
+            return details
+        except Exception as e:
+            logger.error(f"❌ Error fetching positions: {e}")
+            return {}
+
+    @api_method
     async def set_leverage(self, symbol: str, leverage: int):
         """
         设置杠杆倍数 (Set Leverage)
@@ -168,78 +545,135 @@ class BinanceClient:
         except Exception as e:
             logger.warning(f"⚠️ Failed to set leverage for {symbol}: {e}")
 
-    async def place_order(self, symbol: str, side: str, amount: float, price: float = None) -> Optional[Dict]:
+    @api_method
+    async def place_order(self, symbol: str, side: str, amount: float, price: float = None, params: Optional[Dict] = None,
+                          order_type: str = 'market') -> Optional[Dict]:
         """
         下单 (Place Order)
+        order_type 'limit' rests at `price` (e.g. post-only with timeInForce GTX); market orders ignore it.
         """
         try:
-            type_ = 'market'
-            params = {}
+            params = params or {}
             
-            logger.info(f"🚀 Executing {side.upper()} {symbol}: {amount} units")
+            if order_type == 'market':
+                logger.info(f"🚀 Executing {side.upper()} {symbol}: {amount} units", extra={'symbol': symbol})
+            else:
+                logger.info(f"🚀 Placing {order_type.upper()} {side.upper()} {symbol}: {amount} units @ {price}",
+                            extra={'symbol': symbol})
             
-            order = await self.exchange.create_order(symbol, type_, side, amount, price, params)
+            order = await self.exchange.create_order(symbol, order_type, side, amount, price, params)
             return order
         except Exception as e:
             logger.error(f"❌ Order Failed ({symbol} {side}): {e}")
             return None
 
-    async def get_funding_rates(self) -> Dict[str, float]:
+    @api_method
+    async def get_order(self, symbol: str, order_id: str) -> Optional[Dict]:
         """
-        批量获取资金费率 (Batch Fetch Funding Rates)
+        查询订单 (Fetch Order Status) - None on failure
         """
         try:
-            response = await self.exchange.fapiPublicGetPremiumIndex()
+            return await self.exchange.fetch_order(order_id, symbol)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fetch order {order_id} ({symbol}): {e}")
+            return None
+
+    @api_method
+    async def cancel_order(self, symbol: str, order_id: str) -> Optional[Dict]:
+        """
+        撤单 (Cancel Order) - the final order state, None if it could not be cancelled (e.g. already filled)
+        """
+        try:
+            return await self.exchange.cancel_order(order_id, symbol)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not cancel order {order_id} ({symbol}): {e}")
+            return None
+
+    @property
+    def supports_batch_orders(self) -> bool:
+        """Whether the exchange exposes the multi-order (batchOrders) endpoint"""
+        return bool(self.exchange.has.get('createOrders'))
+
+    @api_method
+    async def place_orders(self, orders: List[Dict]) -> List[Optional[Dict]]:
+        """
+        批量下单 (Place Multiple Orders) - Binance batchOrders, max 5 per request
+        Returns one entry per input order, None where the exchange rejected it.
+        """
+        try:
+            requests = [{
+                'symbol': o['symbol'],
+                'type': 'market',
+                'side': o['side'],
+                'amount': o['amount'],
+                'price': None,
+                'params': o.get('params') or {},
+            } for o in orders]
             
-            if not isinstance(response, list):
-                logger.warning(f"⚠️ get_funding_rates: info response is not a list, got {type(response)}")
-                return {}
-
-            funding_map = {}
-            for item in response:
-                if not isinstance(item, dict):
-                    continue
-                    
-                raw_symbol = item.get('symbol')
-                rate = item.get('lastFundingRate')
-                
-                if raw_symbol and rate is not None:
-                    # Note: resolving to ccxt symbol async is tricky without loading all markets.
-                    # We can use raw symbol if we are careful, or try to map if we loaded markets.
-                    # For optimization, we use loose mapping or pre-loaded cache.
-                    # Here we return raw symbols map, caller needs to handle matching or we map simply.
-                    # NOTE: config.DEFAULT_COINS are usually in CCXT format (BTC/USDT).
-                    # Binance raw is BTCUSDT.
-                    
-                    # Simple conversion attempt
-                    ccxt_symbol = raw_symbol
-                    if raw_symbol.endswith('USDT'):
-                        base = raw_symbol[:-4]
-                        ccxt_symbol = f"{base}/USDT"
-                    
-                    funding_map[ccxt_symbol] = float(rate)
-                    
-            return funding_map
+            logger.info(f"🚀 Executing batch of {len(orders)}: " +
+                        ", ".join(f"{o['side'].upper()} {o['symbol']} {o['amount']}" for o in orders))
+            
+            response = await self.exchange.create_orders(requests)
+            
+            results = []
+            for o, order in zip(orders, response):
+                # Rejected batch members come back as {'code': ..., 'msg': ...} with no order id
+                info = (order or {}).get('info') or {}
+                if not order or order.get('id') is None or 'code' in info:
+                    logger.error(f"❌ Order Failed ({o['symbol']} {o['side']}): {info.get('msg', info)}")
+                    results.append(None)
+                else:
+                    results.append(order)
+            return results
+        except Exception as e:
+            logger.error(f"❌ Batch Order Failed: {e}")
+            return [None] * len(orders)
+
+    @api_method
+    async def get_funding_info(self) -> Dict[str, FundingInfo]:
+        """
+        获取资金费率详情 (Get Funding Info) - rate, predicted rate, APR per unified symbol
+        Served from cache until the next funding time.
+        """
+        try:
+            if not self.market_index.by_id:
+                await self.load_markets()
+            return await self.funding_store.refresh()
         except Exception as e:
             logger.error(f"❌ Error fetching funding rates: {e}")
-            return {}
+            return self.funding_store.rates
+
+    async def get_funding_rates(self) -> Dict[str, float]:
+        """
+        批量获取资金费率 (Batch Fetch Funding Rates) - {unified symbol: rate}
+        """
+        info = await self.get_funding_info()
+        return {symbol: f.rate for symbol, f in info.items()}
+
+    @api_method
+    async def load_markets(self):
+        """
+        加载市场元数据 (Load Market Metadata)
+        Restores from the on-disk index when possible, falls back to a full load_markets.
+        An index shared with the market-data client is only handed to this client's ccxt instance.
+        """
+        await self.market_index.ensure_loaded(self.exchange)
+        self.market_index.attach(self.exchange)
 
     async def get_symbol_limits(self, symbol: str) -> Dict[str, float]:
         """
         获取交易对的限制信息 (Get Symbol Limits)
+        In-memory lookup; only the very first call on a cold start touches the network.
         """
         try:
-            if not self.exchange.markets:
-                await self.exchange.load_markets()
+            if not self.market_index.limits:
+                await self.load_markets()
             
-            market = self.exchange.market(symbol)
-            return {
-                'min_amount': market['limits']['amount']['min'],
-                'max_amount': market['limits']['amount']['max'], # Added Max Amount
-                'min_cost': market['limits']['cost']['min'], # Min Notional
-                'amount_precision': market['precision']['amount'],
-            }
+            limits = self.market_index.get(symbol)
+            if limits is None:
+                raise KeyError(f"unknown symbol {symbol}")
+            return limits._asdict()
         except Exception as e:
             logger.warning(f"⚠️ Could not get limits for {symbol}: {e}")
             # Return safe defaults (conservative)
-            return {'min_amount': 0.001, 'max_amount': 1000000.0, 'min_cost': 5.0, 'amount_precision': 0.001}
+            return DEFAULT_LIMITS._asdict()
@@ -0,0 +1,309 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Optional
+from exchange import BinanceClient
+from journal import TradeJournal, fill_from_order
+from ledger import PositionLedger
+from market_index import DEFAULT_LIMITS
+from order_book import DepthCache, ExecutionPlan, plan_execution, MARKET, POST_ONLY, TWAP
+from config import Config
+from metrics import metrics
+from logger import logger
+
+# Binance Futures accepts at most 5 orders per batchOrders request
+BATCH_ORDER_SIZE = 5
+
+# Orders that must not wait for a better price (reduce risk / leave the book now)
+URGENT_REASONS = ('stop', 'flatten', 'exit')
+
+
+@dataclass
+class OrderRequest:
+    """A single order decided by the Rebalancer, not yet sent"""
+    symbol: str
+    side: str  # 'buy' / 'sell'
+    amount: float
+    price: Optional[float] = None  # Reference price at decision time
+    params: Dict = field(default_factory=dict)
+    reason: str = 'rebalance'  # Journal / metrics label
+
+
+@dataclass
+class OrderResult:
+    """Outcome of a dispatched order"""
+    request: OrderRequest
+    order: Optional[Dict]
+    latency: float  # Seconds from dispatch to exchange response (to the last fill for worked orders)
+    strategy: str = MARKET
+    mid: Optional[float] = None  # Pre-trade mid from the depth book
+
+    @property
+    def ok(self) -> bool:
+        return self.order is not None
+
+    @property
+    def filled(self) -> float:
+        return fill_from_order(self.order, self.request.amount, self.request.price)[0] if self.ok else 0.0
+
+    @property
+    def slippage_bps(self) -> Optional[float]:
+        """Average fill price against the pre-trade mid, in bps (positive = paid)"""
+        if not self.ok or not self.mid:
+            return None
+        price = float(self.order.get('average') or 0.0)
+        if price <= 0:
+            return None
+        sign = 1.0 if self.request.side == 'buy' else -1.0
+        return sign * (price - self.mid) / self.mid * 10_000
+
+
+def _child_filled(order: Optional[Dict]) -> float:
+    """Filled amount reported by the exchange (a resting order may have filled nothing)"""
+    return float((order or {}).get('filled') or 0.0)
+
+
+def merge_fills(children: List[Dict]) -> Optional[Dict]:
+    """The child orders of a worked order as one order: total filled, VWAP, summed fees"""
+    filled = [(c, _child_filled(c)) for c in children]
+    filled = [(c, q) for c, q in filled if q > 0]
+    if not filled:
+        return None
+    total = sum(q for _, q in filled)
+    fees = [(c.get('fee') or {}).get('cost') for c, _ in filled]
+    return {
+        'id': filled[0][0].get('id'),
+        'filled': total,
+        'average': sum(q * float(c.get('average') or c.get('price') or 0.0) for c, q in filled) / total,
+        'fee': {'cost': sum(float(f) for f in fees)} if all(f is not None for f in fees) else None,
+        'timestamp': filled[-1][0].get('timestamp'),
+        'status': 'closed',
+        'children': [c.get('id') for c, _ in filled],
+    }
+
+
+class OrderExecutor:
+    def __init__(self, client: BinanceClient, max_concurrency: Optional[int] = None, use_batch: Optional[bool] = None,
+                 journal: Optional[TradeJournal] = None, ledger: Optional[PositionLedger] = None,
+                 depth: Optional[DepthCache] = None, should_stop: Optional[Callable[[], bool]] = None):
+        """
+        执行引擎 (Execution Engine) - sends a full order list concurrently
+        Accepted orders update the position ledger and the trade journal when attached.
+        depth: order books for impact estimates; without it every order goes out at market.
+        should_stop: checked by worked orders before every child order (e.g. the account halted).
+        """
+        self.client = client
+        self.journal = journal
+        self.ledger = ledger
+        self.depth = depth
+        self.should_stop = should_stop
+        self.max_concurrency = max_concurrency or Config.MAX_CONCURRENT_ORDERS
+        self.use_batch = Config.USE_BATCH_ORDERS if use_batch is None else use_batch
+
+    async def execute(self, orders: List[OrderRequest]) -> List[OrderResult]:
+        """
+        并发下单 (Dispatch Orders Concurrently)
+        Uses batchOrders (5 per request) when supported, otherwise one request per order.
+        Concurrency is bounded by MAX_CONCURRENT_ORDERS in-flight requests.
+        With a depth cache, orders too large for the book are worked instead (post-only or
+        TWAP slices, each finished by EXEC_ORDER_DEADLINE_SEC) alongside the market ones.
+        """
+        if not orders:
+            return []
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        start = time.perf_counter()
+
+        plans = await self._plan(orders)
+        market = [o for o in orders if plans[id(o)].strategy == MARKET]
+        worked = [o for o in orders if plans[id(o)].strategy != MARKET]
+        results = list(await asyncio.gather(
+            self._send_market(market, semaphore),
+            *(self._work(o, plans[id(o)], semaphore) for o in worked)))
+        results = results[0] + results[1:]
+        for r in results[:len(market)]:
+            r.mid = plans[id(r.request)].mid
+
+        total = time.perf_counter() - start
+        self._report(results, total)
+        self._record(results)
+        return results
+
+    async def _plan(self, orders: List[OrderRequest]) -> Dict[int, ExecutionPlan]:
+        """Execution plan per order (keyed by id); all market without depth or for urgent orders"""
+        if self.depth is None:
+            return {id(o): ExecutionPlan(MARKET, 1, None, None) for o in orders}
+        books = await self.depth.get_many(o.symbol for o in orders)
+        plans = {}
+        for o in orders:
+            book = books.get(o.symbol)
+            if o.reason in URGENT_REASONS:
+                plans[id(o)] = ExecutionPlan(MARKET, 1, book.mid if book else None, None)
+                continue
+            plans[id(o)] = plan = plan_execution(book, o.side, o.amount, Config.EXEC_MAX_IMPACT_BPS,
+                                                 Config.EXEC_MAX_SLICES, self._min_amount(o.symbol, book.mid if book else o.price))
+            if plan.strategy != MARKET:
+                how = f"{plan.slices} TWAP slices" if plan.strategy == TWAP else "post-only at the touch"
+                if plan.impact_bps == float('inf'):
+                    why = "larger than the fetched depth"
+                else:
+                    why = f"est. impact {plan.impact_bps:.1f} bps > {Config.EXEC_MAX_IMPACT_BPS:.0f} bps"
+                logger.info(f"🧊 {o.symbol}: {why}, working as {how}", extra={'symbol': o.symbol})
+        self.depth.prune()
+        return plans
+
+    def _min_amount(self, symbol: str, price: Optional[float]) -> float:
+        """Smallest order the exchange accepts (amount and notional minimum)"""
+        limits = self.client.market_index.get(symbol) or DEFAULT_LIMITS
+        min_cost = max(limits.min_cost, Config.MIN_ORDER_VALUE)
+        return max(limits.min_amount, min_cost / price if price else 0.0)
+
+    def _floor_step(self, symbol: str, amount: float) -> float:
+        step = (self.client.market_index.get(symbol) or DEFAULT_LIMITS).step_size
+        return float(int(amount / step + 1e-9) * step) if step > 0 else amount
+
+    async def _send_market(self, orders: List[OrderRequest], semaphore: asyncio.Semaphore) -> List[OrderResult]:
+        if self.use_batch and self.client.supports_batch_orders and len(orders) > 1:
+            chunks = [orders[i:i + BATCH_ORDER_SIZE] for i in range(0, len(orders), BATCH_ORDER_SIZE)]
+            nested = await asyncio.gather(*(self._send_batch(chunk, semaphore) for chunk in chunks))
+            return [r for chunk_results in nested for r in chunk_results]
+        return list(await asyncio.gather(*(self._send_single(o, semaphore) for o in orders)))
+
+    def _stopped(self, request: OrderRequest) -> bool:
+        if self.should_stop is not None and self.should_stop():
+            logger.warning(f"🛑 Trading halted, stopping worked order {request.side.upper()} {request.symbol}",
+                           extra={'symbol': request.symbol})
+            return True
+        return False
+
+    async def _child(self, request: OrderRequest, amount: float, semaphore: asyncio.Semaphore,
+                     price: Optional[float] = None, order_type: str = 'market', params: Optional[Dict] = None) -> Optional[Dict]:
+        async with semaphore:
+            return await self.client.place_order(request.symbol, request.side, amount, price,
+                                                 {**request.params, **(params or {})}, order_type=order_type)
+
+    async def _market_child(self, request: OrderRequest, amount: float, children: List[Dict],
+                            semaphore: asyncio.Semaphore):
+        order = await self._child(request, amount, semaphore)
+        if order is not None:
+            # A market order accepted without fill details filled in full
+            order['filled'] = _child_filled(order) or amount
+            order['average'] = order.get('average') or order.get('price') or request.price
+            children.append(order)
+
+    async def _work(self, request: OrderRequest, plan: ExecutionPlan, semaphore: asyncio.Semaphore) -> OrderResult:
+        """
+        Post-only or TWAP until the deadline; whatever is still unfilled then goes out at market
+        """
+        t0 = time.perf_counter()
+        deadline = t0 + Config.EXEC_ORDER_DEADLINE_SEC
+        children: List[Dict] = []
+        try:
+            if plan.strategy == POST_ONLY:
+                await self._post_only(request, children, deadline, semaphore)
+            elif plan.strategy == TWAP:
+                await self._twap(request, plan.slices, children, deadline, semaphore)
+        except Exception as e:
+            # Fall through to the market remainder; the filled children are kept
+            logger.error(f"❌ Worked order failed ({request.symbol} {request.side}): {e}")
+        if self.should_stop is not None and self.should_stop():
+            # No market remainder after a halt
+            return OrderResult(request, merge_fills(children), time.perf_counter() - t0, plan.strategy, plan.mid)
+        remaining = self._floor_step(request.symbol, request.amount - sum(_child_filled(c) for c in children))
+        # Reduce-only orders are exempt from the notional minimum
+        if request.params.get('reduceOnly'):
+            min_amount = (self.client.market_index.get(request.symbol) or DEFAULT_LIMITS).min_amount
+        else:
+            min_amount = self._min_amount(request.symbol, plan.mid)
+        if remaining > 0 and remaining >= min_amount:
+            await self._market_child(request, remaining, children, semaphore)
+        return OrderResult(request, merge_fills(children), time.perf_counter() - t0, plan.strategy, plan.mid)
+
+    async def _post_only(self, request: OrderRequest, children: List[Dict], deadline: float,
+                         semaphore: asyncio.Semaphore):
+        """Rest at our side's best price (GTX: never takes), poll until filled or the deadline, then cancel"""
+        book = await self.depth.get(request.symbol)
+        if book is None or self._stopped(request):
+            return
+        price = book.best_bid if request.side == 'buy' else book.best_ask
+        order = await self._child(request, request.amount, semaphore, price, 'limit', {'timeInForce': 'GTX'})
+        if order is None:
+            return
+        while order.get('status') not in ('closed', 'canceled', 'expired', 'rejected'):
+            wait = min(Config.EXEC_POLL_SEC, deadline - time.perf_counter())
+            if wait <= 0 or self._stopped(request):
+                # Out of time (or halted): cancel, then take the final filled amount (never less than already seen)
+                final = await self.client.cancel_order(request.symbol, order['id'])
+                if final is None or final.get('filled') is None:
+                    final = await self.client.get_order(request.symbol, order['id'])
+                order = {**order, **(final or {}), 'filled': max(_child_filled(order), _child_filled(final))}
+                break
+            await asyncio.sleep(wait)
+            order = await self.client.get_order(request.symbol, order['id']) or order
+        children.append(order)
+
+    async def _twap(self, request: OrderRequest, slices: int, children: List[Dict], deadline: float,
+                    semaphore: asyncio.Semaphore):
+        """Equal market slices, evenly spaced so the last one goes out before the deadline"""
+        start = time.perf_counter()
+        interval = min(Config.EXEC_SLICE_INTERVAL_SEC, (deadline - start) / slices)
+        size = self._floor_step(request.symbol, request.amount / slices)
+        for k in range(slices - 1):
+            delay = start + k * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._stopped(request):
+                return
+            await self._market_child(request, size, children, semaphore)
+        # The last slice is the remainder, sent by _work
+        delay = start + (slices - 1) * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send_single(self, request: OrderRequest, semaphore: asyncio.Semaphore) -> OrderResult:
+        async with semaphore:
+            t0 = time.perf_counter()
+            order = await self.client.place_order(request.symbol, request.side, request.amount, request.price, request.params)
+            return OrderResult(request, order, time.perf_counter() - t0)
+
+    async def _send_batch(self, chunk: List[OrderRequest], semaphore: asyncio.Semaphore) -> List[OrderResult]:
+        async with semaphore:
+            t0 = time.perf_counter()
+            orders = await self.client.place_orders([
+                {'symbol': r.symbol, 'side': r.side, 'amount': r.amount, 'price': r.price, 'params': r.params}
+                for r in chunk
+            ])
+            latency = time.perf_counter() - t0
+            # Batch members share the latency of the request that carried them
+            return [OrderResult(r, o, latency) for r, o in zip(chunk, orders)]
+
+    def _report(self, results: List[OrderResult], total: float):
+        """Log per-order and total dispatch latency"""
+        for r in results:
+            metrics.observe('order_latency_seconds', r.latency)
+            status = "✅" if r.ok else "❌"
+            slippage = r.slippage_bps
+            detail = ""
+            if r.strategy != MARKET:
+                detail += f", {r.strategy}"
+            if slippage is not None:
+                metrics.observe('slippage_bps', slippage, strategy=r.strategy)
+                detail += f", slippage {slippage:+.1f} bps"
+            logger.info(f"   {status} {r.request.side.upper()} {r.request.symbol} {r.request.amount} "
+                        f"({r.latency * 1000:.0f} ms{detail})", extra={'symbol': r.request.symbol})
+        filled = sum(1 for r in results if r.ok)
+        logger.info(f"⏱️ Dispatched {len(results)} orders ({filled} accepted) in {total * 1000:.0f} ms")
+
+    def _record(self, results: List[OrderResult]):
+        """Apply fills to the ledger (realized PnL) and the journal"""
+        if self.journal is None and self.ledger is None:
+            return
+        for r in results:
+            if not r.ok:
+                continue
+            req = r.request
+            filled, price, fee = fill_from_order(r.order, req.amount, req.price)
+            realized = self.ledger.on_fill(req.symbol, req.side, filled, price) if self.ledger is not None else 0.0
+            if self.journal is not None:
+                self.journal.record(req.symbol, req.side, filled, price, fee, realized,
+                                    r.order.get('id'), req.reason, r.order.get('timestamp'))
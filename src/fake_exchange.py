@@ -0,0 +1,211 @@
+"""
+本地模拟交易所 (Local Fake Exchange)
+
+A stand-in for BinanceClient with configurable per-call latency, rate limiting, error
+injection and universe size. Used by run_benchmark.py to time main-loop cycles without
+touching the network.
+"""
+import os
+import time
+import random
+import asyncio
+from collections import Counter
+from typing import Dict, List, Optional
+from market_index import MarketIndex
+from funding import FundingInfo, info_from_rate
+from logger import logger
+
+
+class FakeBinanceClient:
+    def __init__(self, universe_size: int = 50, latency_ms: float = 50.0, jitter_ms: float = 10.0,
+                 rate_limit_per_sec: Optional[float] = None, error_rate: float = 0.0,
+                 initial_equity: float = 10_000.0, seed: int = 0):
+        """
+        Every public method costs one simulated request: rate-limit wait + latency (+ jitter),
+        and fails with probability error_rate (returning the same fallback value BinanceClient does).
+        """
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limit = rate_limit_per_sec
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = Counter()  # endpoint -> request count
+        self.errors = Counter()
+        self._next_slot = 0.0
+
+        self.symbols = [f"C{i:04d}/USDT:USDT" for i in range(universe_size)]
+        self.market_index = MarketIndex(cache_file=os.devnull, ttl_hours=1e9)
+        self.market_index.build({s: self._market(s) for s in self.symbols})
+        self.supports_batch_orders = True
+
+        self.prices = {s: self.rng.uniform(0.05, 500.0) for s in self.symbols}
+        self.volumes = {s: self.rng.uniform(1e6, 1e9) for s in self.symbols}
+        self.ranges = {s: self.rng.uniform(0.02, 0.2) for s in self.symbols}  # 24h (high - low) / last
+        self.spreads = {s: self.rng.uniform(0.5, 30.0) / 10_000 for s in self.symbols}
+        # Half the universe pays positive funding so the scanner filters get exercised
+        self.funding = {s: self.rng.choice((-1, 1)) * self.rng.uniform(0, 0.0002) for s in self.symbols}
+        self.positions: Dict[str, float] = {}
+        self.cash = initial_equity
+
+    @staticmethod
+    def _market(symbol: str) -> Dict:
+        base = symbol.split('/')[0]
+        return {
+            'id': f"{base}USDT", 'symbol': symbol, 'base': base, 'quote': 'USDT', 'settle': 'USDT',
+            'linear': True, 'swap': True, 'contract': True, 'active': True,
+            'limits': {'amount': {'min': 0.0001, 'max': 1e9}, 'cost': {'min': 5.0}},
+            'precision': {'amount': 0.0001, 'price': 0.0001},
+        }
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.errors.clear()
+
+    async def _request(self, endpoint: str) -> bool:
+        """Simulate one REST round-trip; returns False if an error was injected"""
+        self.calls[endpoint] += 1
+        if self.rate_limit:
+            # Token spacing: each request gets the next free slot
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate_limit
+            if slot > now:
+                await asyncio.sleep(slot - now)
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            logger.error(f"❌ Injected error: {endpoint}")
+            return False
+        return True
+
+    def _tick(self):
+        """Random-walk prices between snapshots"""
+        for s in self.symbols:
+            self.prices[s] *= 1 + self.rng.gauss(0, 0.002)
+
+    # --- BinanceClient surface ---
+
+    async def validate_connectivity(self):
+        return await self._request('fetch_time')
+
+    async def close(self):
+        pass
+
+    async def load_markets(self):
+        await self._request('load_markets')
+
+    async def set_leverage(self, symbol: str, leverage: int):
+        await self._request('set_leverage')
+
+    async def get_tickers(self) -> Dict[str, Dict]:
+        if not await self._request('fetch_tickers'):
+            return {}
+        self._tick()
+        tickers = {}
+        for s in self.symbols:
+            p, r, half = self.prices[s], self.ranges[s], self.spreads[s] / 2
+            tickers[s] = {'symbol': s, 'last': p, 'quoteVolume': self.volumes[s],
+                          'high': p * (1 + r / 2), 'low': p * (1 - r / 2), 'bid': p * (1 - half), 'ask': p * (1 + half)}
+        return tickers
+
+    async def get_open_interest(self, symbols: List[str]) -> Dict[str, float]:
+        """One request per symbol, like the real endpoint"""
+        ok = await asyncio.gather(*(self._request('fetch_open_interest') for _ in symbols))
+        return {s: self.volumes[s] / self.prices[s] / 4 for s, good in zip(symbols, ok) if good}
+
+    async def get_order_book(self, symbol: str, limit: int = 20) -> Optional[Dict]:
+        """Levels one tick of the spread apart, each holding ~1e-4 of the 24h volume"""
+        if not await self._request('fetch_order_book'):
+            return None
+        p, half = self.prices[symbol], self.spreads[symbol] / 2
+        qty = self.volumes[symbol] * 1e-4 / p
+        return {'bids': [[p * (1 - half * (1 + i)), qty] for i in range(limit)],
+                'asks': [[p * (1 + half * (1 + i)), qty] for i in range(limit)]}
+
+    async def get_ohlcv(self, symbol: str, timeframe: str, since: Optional[int] = None,
+                        limit: Optional[int] = None) -> List[List[float]]:
+        """Synthetic closed bars from `since` up to now, ending at the current price"""
+        if not await self._request('fetch_ohlcv'):
+            return []
+        tf_ms = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000}[timeframe[-1]] * int(timeframe[:-1])
+        now_ms = int(time.time() * 1000)
+        first = (since if since is not None else now_ms - 500 * tf_ms) // tf_ms * tf_ms
+        count = max(0, min(limit or 500, (now_ms - first) // tf_ms + 1))
+        rng = random.Random(hash((symbol, first)))
+        price, bars = self.prices[symbol], []
+        for i in range(count):
+            o = price
+            price *= 1 + rng.gauss(0, self.ranges[symbol] / 10)
+            bars.append([first + i * tf_ms, o, max(o, price) * 1.001, min(o, price) * 0.999, price,
+                         self.volumes[symbol] / 24 / price])
+        return bars
+
+    async def get_market_prices(self, symbols: List[str]) -> Dict[str, float]:
+        if not await self._request('fetch_tickers'):
+            return {}
+        return {s: self.prices[s] for s in symbols if s in self.prices}
+
+    def _equity(self) -> float:
+        return self.cash + sum(q * self.prices[s] for s, q in self.positions.items())
+
+    async def get_account_balance(self) -> Dict[str, float]:
+        if not await self._request('fetch_balance'):
+            return {'total_equity': 0.0, 'free_margin': 0.0}
+        equity = self._equity()
+        return {'total_equity': equity, 'free_margin': equity * 0.8}
+
+    async def get_cw_positions(self) -> Dict[str, float]:
+        if not await self._request('fetch_positions'):
+            return {}
+        return {s: q for s, q in self.positions.items() if q != 0}
+
+    async def get_position_details(self) -> Dict[str, Dict[str, float]]:
+        if not await self._request('fetch_positions'):
+            return {}
+        return {s: {'contracts': q, 'entry_price': self.prices[s], 'unrealized_pnl': 0.0}
+                for s, q in self.positions.items() if q != 0}
+
+    async def get_funding_rates(self) -> Dict[str, float]:
+        if not await self._request('premium_index'):
+            return {}
+        return dict(self.funding)
+
+    async def get_funding_info(self) -> Dict[str, FundingInfo]:
+        if not await self._request('premium_index'):
+            return {}
+        return {s: info_from_rate(r) for s, r in self.funding.items()}
+
+    async def get_symbol_limits(self, symbol: str) -> Dict[str, float]:
+        return self.market_index.get(symbol)._asdict()
+
+    def _fill(self, symbol: str, side: str, amount: float, price: Optional[float] = None) -> Dict:
+        signed = amount if side == 'buy' else -amount
+        price = price or self.prices[symbol]
+        self.positions[symbol] = self.positions.get(symbol, 0.0) + signed
+        self.cash -= signed * price
+        return {'id': str(self.total_calls), 'symbol': symbol, 'side': side, 'amount': amount,
+                'filled': amount, 'average': price, 'status': 'closed'}
+
+    async def place_order(self, symbol: str, side: str, amount: float, price: float = None, params: Optional[Dict] = None,
+                          order_type: str = 'market') -> Optional[Dict]:
+        """Limit orders fill at their price right away"""
+        if not await self._request('create_order'):
+            return None
+        return self._fill(symbol, side, amount, price if order_type == 'limit' else None)
+
+    async def get_order(self, symbol: str, order_id: str) -> Optional[Dict]:
+        await self._request('fetch_order')
+        return None
+
+    async def cancel_order(self, symbol: str, order_id: str) -> Optional[Dict]:
+        await self._request('cancel_order')
+        return None
+
+    async def place_orders(self, orders: List[Dict]) -> List[Optional[Dict]]:
+        if not await self._request('batch_orders'):
+            return [None] * len(orders)
+        return [self._fill(o['symbol'], o['side'], o['amount']) for o in orders]
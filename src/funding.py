@@ -0,0 +1,110 @@
+import time
+from typing import Dict, NamedTuple, Optional
+from market_index import MarketIndex
+from logger import logger
+
+DEFAULT_INTERVAL_HOURS = 8.0
+# Binance clamp on (interest - premium) in the funding formula
+INTEREST_CLAMP = 0.0005
+# Re-fetch after this long if the response carried no usable nextFundingTime
+FALLBACK_TTL_SEC = 60.0
+
+
+class FundingInfo(NamedTuple):
+    """Per-symbol funding data"""
+    rate: float  # lastFundingRate from premiumIndex
+    predicted_rate: float  # Premium-index estimate: P + clamp(I - P, -0.05%, 0.05%)
+    apr: float  # rate annualized with the symbol's own funding interval
+    interval_hours: float
+    next_funding_time: int  # Epoch ms
+
+
+def info_from_rate(rate: float, interval_hours: float = DEFAULT_INTERVAL_HOURS) -> FundingInfo:
+    """FundingInfo from a bare rate (simulated exchanges, history replays)"""
+    return FundingInfo(rate, rate, rate * (24 / interval_hours) * 365, interval_hours, 0)
+
+
+class FundingRateStore:
+    def __init__(self, exchange, market_index: MarketIndex):
+        """
+        资金费率缓存 (Funding Rate Store)
+        One premiumIndex download per funding period; raw ids mapped through the market index.
+        """
+        self.exchange = exchange
+        self.market_index = market_index
+        self.rates: Dict[str, FundingInfo] = {}
+        self.expires_at = 0.0  # Epoch seconds
+        self.intervals: Dict[str, float] = {}  # raw id -> hours (only non-default intervals)
+        self._intervals_loaded = False
+
+    @property
+    def is_fresh(self) -> bool:
+        return bool(self.rates) and time.time() < self.expires_at
+
+    def get(self, symbol: str) -> Optional[FundingInfo]:
+        return self.rates.get(symbol)
+
+    async def _load_intervals(self):
+        """fundingInfo lists only symbols whose interval/caps were adjusted (e.g. 4h); others are 8h"""
+        try:
+            response = await self.exchange.fapiPublicGetFundingInfo()
+            self.intervals = {item['symbol']: float(item['fundingIntervalHours'])
+                              for item in response if item.get('fundingIntervalHours')}
+            self._intervals_loaded = True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load funding intervals, assuming {DEFAULT_INTERVAL_HOURS:.0f}h: {e}")
+
+    async def refresh(self, force: bool = False) -> Dict[str, FundingInfo]:
+        """
+        刷新 (Refresh) - no-op until the earliest nextFundingTime has passed
+        """
+        if self.is_fresh and not force:
+            return self.rates
+
+        if not self._intervals_loaded:
+            await self._load_intervals()
+
+        response = await self.exchange.fapiPublicGetPremiumIndex()
+        if not isinstance(response, list):
+            logger.warning(f"⚠️ get_funding_rates: info response is not a list, got {type(response)}")
+            return self.rates
+
+        rates = {}
+        next_times = []
+        for item in response:
+            if not isinstance(item, dict):
+                continue
+            raw_id = item.get('symbol')
+            symbol = self.market_index.symbol_for_id(raw_id) if raw_id else None
+            if symbol is None or item.get('lastFundingRate') in (None, ''):
+                continue
+
+            rate = float(item['lastFundingRate'])
+            interval = self.intervals.get(raw_id, DEFAULT_INTERVAL_HOURS)
+            mark = float(item.get('markPrice') or 0.0)
+            index = float(item.get('indexPrice') or 0.0)
+            interest = float(item.get('interestRate') or 0.0)
+            if index > 0:
+                premium = (mark - index) / index
+                predicted = premium + min(max(interest - premium, -INTEREST_CLAMP), INTEREST_CLAMP)
+            else:
+                predicted = rate
+            next_time = int(item.get('nextFundingTime') or 0)
+
+            rates[symbol] = FundingInfo(
+                rate=rate,
+                predicted_rate=predicted,
+                apr=rate * (24 / interval) * 365,
+                interval_hours=interval,
+                next_funding_time=next_time,
+            )
+            if next_time > 0:
+                next_times.append(next_time)
+
+        now = time.time()
+        upcoming = [t / 1000 for t in next_times if t / 1000 > now]
+        self.expires_at = min(upcoming) if upcoming else now + FALLBACK_TTL_SEC
+        self.rates = rates
+        logger.info(f"💸 Funding rates cached for {len(rates)} symbols until "
+                    f"{time.strftime('%H:%M:%S', time.localtime(self.expires_at))}")
+        return rates
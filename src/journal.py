@@ -0,0 +1,208 @@
+"""
+成交日志 (Trade Journal)
+
+Every fill from the execution path is buffered in memory and flushed in batches to an
+indexed SQLite database (WAL mode), off the event loop. Realized PnL is supplied by the
+position ledger at record time, so reports over months of cycles are plain indexed
+GROUP BY queries.
+"""
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+from config import Config
+from logger import logger, cycle_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,          -- epoch ms
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL NOT NULL,
+    value REAL NOT NULL,          -- amount * price
+    fee REAL NOT NULL,
+    realized_pnl REAL NOT NULL,   -- excludes fees
+    order_id TEXT,
+    reason TEXT,
+    cycle TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_fills_ts ON fills (ts);
+CREATE INDEX IF NOT EXISTS idx_fills_symbol_ts ON fills (symbol, ts);
+"""
+
+FILL_COLUMNS = ('ts', 'symbol', 'side', 'amount', 'price', 'value', 'fee', 'realized_pnl', 'order_id', 'reason', 'cycle')
+
+TimeArg = Union[None, int, float, str, datetime]
+
+
+def fill_from_order(order: Dict, amount: float, price: Optional[float] = None) -> Tuple[float, float, Optional[float]]:
+    """ccxt order response -> (filled amount, fill price, fee), falling back to the requested amount/price"""
+    filled = float(order.get('filled') or 0.0) or amount
+    fill_price = float(order.get('average') or order.get('price') or 0.0) or (price or 0.0)
+    fee = (order.get('fee') or {}).get('cost')
+    return filled, fill_price, None if fee is None else float(fee)
+
+
+def to_ms(t: TimeArg) -> Optional[int]:
+    """Epoch ms / seconds / date string / Timestamp -> epoch ms"""
+    if t is None:
+        return None
+    if isinstance(t, (int, float)):
+        return int(t if t > 1e11 else t * 1000)
+    import pandas as pd
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.timestamp() * 1000)
+
+
+class TradeJournal:
+    def __init__(self, path: Optional[str] = None, flush_interval_sec: Optional[float] = None,
+                 batch_size: int = 500):
+        """
+        初始化成交日志 (Initialize Trade Journal)
+        """
+        self.path = path or Config.JOURNAL_FILE
+        self.flush_interval = Config.JOURNAL_FLUSH_SEC if flush_interval_sec is None else flush_interval_sec
+        self.batch_size = batch_size
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()  # Serializes the writer thread and readers
+
+        self._buffer: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None  # Write running in the worker thread
+
+    def record(self, symbol: str, side: str, amount: float, price: float, fee: Optional[float] = None,
+               realized_pnl: float = 0.0, order_id: Optional[str] = None, reason: str = 'rebalance',
+               ts: TimeArg = None):
+        """
+        记录成交 (Record Fill) - in-memory only until the next flush
+        """
+        value = amount * price
+        if fee is None:
+            fee = value * Config.TAKER_FEE_RATE
+        self._buffer.append((
+            to_ms(ts) if ts is not None else int(time.time() * 1000),
+            symbol, side, amount, price, value, fee, realized_pnl,
+            None if order_id is None else str(order_id), reason, cycle_id.get() or None,
+        ))
+        if len(self._buffer) >= self.batch_size and self._task is None:
+            # No background writer (sync use): bound memory by flushing inline
+            self.flush()
+
+    def _take(self) -> List[tuple]:
+        """Detach the pending rows (always on the caller's thread)"""
+        rows, self._buffer = self._buffer, []
+        return rows
+
+    def _write(self, rows: List[tuple]):
+        """Write fills in one transaction"""
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    f"INSERT INTO fills ({', '.join(FILL_COLUMNS)}) VALUES ({', '.join('?' * len(FILL_COLUMNS))})", rows)
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"❌ Trade journal flush failed ({len(rows)} fills): {e}")
+
+    def flush(self):
+        """Synchronous flush of everything buffered"""
+        self._write(self._take())
+
+    def start(self) -> asyncio.Task:
+        """Background writer: flush every JOURNAL_FLUSH_SEC in a worker thread"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+        return self._task
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffer:
+                # Shielded: cancelling the loop must not abandon a write already in the thread
+                self._writing = asyncio.ensure_future(asyncio.to_thread(self._write, self._take()))
+                await asyncio.shield(self._writing)
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._writing is not None:
+            # Let the in-flight batch commit before the final flush and close
+            await asyncio.gather(self._writing, return_exceptions=True)
+            self._writing = None
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    # --- Queries ---
+
+    def _where(self, start: TimeArg, end: TimeArg, symbol: Optional[str]) -> Tuple[str, list]:
+        clauses, params = [], []
+        if symbol:
+            clauses.append("symbol = ?")
+            params.append(symbol)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_ms(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(to_ms(end))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _query(self, sql: str, params: list) -> 'pd.DataFrame':
+        # pandas is only needed for reports; keep it off the bot's import path
+        import pandas as pd
+        # Unflushed fills are part of the answer
+        self.flush()
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def fills(self, start: TimeArg = None, end: TimeArg = None, symbol: Optional[str] = None) -> 'pd.DataFrame':
+        """Raw fills in [start, end), oldest first"""
+        where, params = self._where(start, end, symbol)
+        return self._query(f"SELECT {', '.join(FILL_COLUMNS)} FROM fills{where} ORDER BY ts", params)
+
+    def summary(self, start: TimeArg = None, end: TimeArg = None, symbol: Optional[str] = None) -> 'pd.DataFrame':
+        """
+        按币种汇总 (Per-Symbol Summary) - realized PnL, turnover, fees, net PnL, trades
+        """
+        where, params = self._where(start, end, symbol)
+        table = self._query(
+            "SELECT symbol, SUM(realized_pnl) AS realized_pnl, SUM(value) AS turnover, SUM(fee) AS fees, "
+            f"COUNT(*) AS trades FROM fills{where} GROUP BY symbol ORDER BY symbol", params)
+        table['net_pnl'] = table['realized_pnl'] - table['fees']
+        return table.set_index('symbol')
+
+    def by_period(self, period: str = '1D', start: TimeArg = None, end: TimeArg = None,
+                  symbol: Optional[str] = None) -> 'pd.DataFrame':
+        """Realized PnL, turnover and fees bucketed by time period (e.g. '1h', '1D', '7D')"""
+        import pandas as pd
+        bucket = int(pd.Timedelta(period).total_seconds() * 1000)
+        where, params = self._where(start, end, symbol)
+        table = self._query(
+            f"SELECT (ts / {bucket}) * {bucket} AS period, SUM(realized_pnl) AS realized_pnl, "
+            f"SUM(value) AS turnover, SUM(fee) AS fees, COUNT(*) AS trades FROM fills{where} "
+            "GROUP BY period ORDER BY period", params)
+        table['period'] = pd.to_datetime(table['period'], unit='ms', utc=True)
+        table['net_pnl'] = table['realized_pnl'] - table['fees']
+        return table.set_index('period')
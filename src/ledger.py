@@ -0,0 +1,178 @@
+"""
+持仓账本 (Position Ledger)
+
+Per-symbol average entry, peak price and unrealized PnL, updated incrementally from
+fills and marked on every price update. Persisted as a small JSON file (atomic write)
+so a restart resumes from the last state instead of replaying order history.
+"""
+import os
+import json
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+from logger import logger
+
+# Quantities below this are treated as flat
+QTY_EPSILON = 1e-12
+
+
+def apply_fill(quantity: float, avg_entry: float, signed_amount: float, price: float) -> Tuple[float, float, float]:
+    """
+    平均成本法 (Average Cost) - returns (new quantity, new avg entry, realized PnL)
+    Reducing a position realizes PnL against the average entry; flipping opens the
+    remainder at the fill price.
+    """
+    new_qty = quantity + signed_amount
+    if quantity == 0 or (quantity > 0) == (signed_amount > 0):
+        # Opening or adding
+        avg = (quantity * avg_entry + signed_amount * price) / new_qty if new_qty else 0.0
+        return new_qty, avg, 0.0
+    closed = min(abs(signed_amount), abs(quantity))
+    realized = closed * (price - avg_entry) * (1 if quantity > 0 else -1)
+    if abs(new_qty) < QTY_EPSILON:
+        return 0.0, 0.0, realized
+    if (new_qty > 0) != (quantity > 0):
+        return new_qty, price, realized
+    return new_qty, avg_entry, realized
+
+
+@dataclass
+class LedgerEntry:
+    quantity: float  # Signed contracts
+    avg_entry: float
+    peak_price: float  # Best mark since opened: highest for longs, lowest for shorts
+    last_price: float
+    opened_at: float
+
+    @property
+    def value(self) -> float:
+        return abs(self.quantity) * self.last_price
+
+    @property
+    def peak_value(self) -> float:
+        return abs(self.quantity) * self.peak_price
+
+    @property
+    def unrealized_pnl(self) -> float:
+        return self.quantity * (self.last_price - self.avg_entry)
+
+    @property
+    def drawdown(self) -> float:
+        """Adverse move from the peak price (0 at or beyond the peak)"""
+        if self.peak_price <= 0:
+            return 0.0
+        if self.quantity > 0:
+            return max(0.0, 1 - self.last_price / self.peak_price)
+        return max(0.0, self.last_price / self.peak_price - 1)
+
+    def mark(self, price: float):
+        self.last_price = price
+        if (price > self.peak_price) if self.quantity > 0 else (price < self.peak_price):
+            self.peak_price = price
+
+
+class PositionLedger:
+    def __init__(self, path: Optional[str] = None, clock=time.time):
+        """
+        初始化持仓账本 (Initialize Position Ledger)
+        path=None keeps the ledger in memory only (backtests).
+        """
+        self.path = path
+        self.clock = clock
+        self.entries: Dict[str, LedgerEntry] = {}
+        self._dirty = False
+        if path:
+            self.load()
+
+    # --- Updates ---
+
+    def on_fill(self, symbol: str, side: str, amount: float, price: float) -> float:
+        """Apply one fill; returns its realized PnL (before fees)"""
+        signed = amount if side == 'buy' else -amount
+        entry = self.entries.get(symbol)
+        old_qty = entry.quantity if entry else 0.0
+        qty, avg, realized = apply_fill(old_qty, entry.avg_entry if entry else 0.0, signed, price)
+
+        if qty == 0:
+            self.entries.pop(symbol, None)
+        elif entry is None or (qty > 0) != (old_qty > 0):
+            # New position (or flipped): peak starts at the entry
+            self.entries[symbol] = LedgerEntry(qty, avg, price, price, self.clock())
+        else:
+            entry.quantity, entry.avg_entry = qty, avg
+            entry.mark(price)
+        self._dirty = True
+        return realized
+
+    def mark(self, symbol: str, price: float) -> Optional[LedgerEntry]:
+        """O(1) price update; returns the entry if the symbol is held"""
+        entry = self.entries.get(symbol)
+        if entry is not None:
+            peak = entry.peak_price
+            entry.mark(price)
+            if entry.peak_price != peak:
+                self._dirty = True
+        return entry
+
+    def sync(self, positions: Dict[str, float], prices: Dict[str, float],
+             entry_prices: Optional[Dict[str, float]] = None):
+        """
+        与交易所对账 (Reconcile With Exchange) - exchange quantities win
+        Unknown positions are adopted at the exchange entry price (or the current price).
+        """
+        entry_prices = entry_prices or {}
+        # An empty view is indistinguishable from a failed fetch; closes arrive via on_fill anyway
+        if positions:
+            for symbol in [s for s in self.entries if s not in positions]:
+                del self.entries[symbol]
+                self._dirty = True
+
+        for symbol, qty in positions.items():
+            if abs(qty) < QTY_EPSILON:
+                continue
+            price = prices.get(symbol)
+            entry = self.entries.get(symbol)
+            if entry is None or (entry.quantity > 0) != (qty > 0):
+                avg = entry_prices.get(symbol) or price
+                if not avg:
+                    continue
+                self.entries[symbol] = LedgerEntry(qty, avg, avg, price or avg, self.clock())
+                self._dirty = True
+            elif entry.quantity != qty:
+                entry.quantity = qty
+                self._dirty = True
+            if price:
+                self.mark(symbol, price)
+
+    def unrealized_pnl(self) -> float:
+        return sum(e.unrealized_pnl for e in self.entries.values())
+
+    # --- Persistence ---
+
+    def load(self) -> bool:
+        try:
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.entries = {s: LedgerEntry(**e) for s, e in data['entries'].items()}
+            logger.info(f"📒 Loaded position ledger: {len(self.entries)} positions")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load position ledger: {e}")
+            return False
+
+    def save(self, force: bool = False):
+        """Atomic write (tmp file + rename); no-op when nothing changed"""
+        if not self.path or not (self._dirty or force):
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'saved_at': time.time(),
+                           'entries': {s: asdict(e) for s, e in self.entries.items()}}, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save position ledger: {e}")
@@ -1,11 +1,125 @@
 import logging
 import sys
-from logging.handlers import RotatingFileHandler
-import os
+import json
+import time
+import atexit
+import queue
+import copy
+import uuid
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from config import Config
 
-def setup_logger(name="AiTrader", log_file="ai_trader.log", level=logging.INFO):
+# Correlation id of the cycle being processed (set by main.run_cycle via new_cycle)
+cycle_id: contextvars.ContextVar = contextvars.ContextVar('cycle_id', default='')
+# Account being worked on (multi-account mode only; tasks started for an account inherit it)
+account_name: contextvars.ContextVar = contextvars.ContextVar('account_name', default='')
+
+
+def new_cycle() -> str:
+    """Start a new correlation id for everything logged by the current task"""
+    cid = uuid.uuid4().hex[:8]
+    cycle_id.set(cid)
+    return cid
+
+
+@contextmanager
+def account_scope(settings):
+    """Tag logs (and tasks started inside) with the account's name; the global Config is untagged"""
+    token = account_name.set('' if settings is Config else settings.ACCOUNT_NAME)
+    try:
+        yield
+    finally:
+        account_name.reset(token)
+
+
+class CycleFilter(logging.Filter):
+    """Stamp records with the cycle id (and account) while still in the emitting task's context"""
+    def filter(self, record):
+        cid = cycle_id.get()
+        account = account_name.get()
+        record.cycle_id = cid
+        record.account = account
+        record.cycle_tag = (f"[{account}] " if account else "") + (f"[{cid}] " if cid else "")
+        return True
+
+
+class SymbolRateLimitFilter(logging.Filter):
+    """
+    Per-symbol lines (logged with extra={'symbol': ...}) are emitted at most once per
+    interval per call site; warnings and errors always pass.
+    """
+    def __init__(self, interval_sec: float):
+        super().__init__()
+        self.interval = interval_sec
+        self.last_emit = {}  # (symbol, pathname, lineno) -> monotonic time
+        self.suppressed = {}
+
+    def filter(self, record):
+        symbol = getattr(record, 'symbol', None)
+        if symbol is None or record.levelno >= logging.WARNING:
+            return True
+        key = (symbol, record.pathname, record.lineno)
+        now = time.monotonic()
+        if now - self.last_emit.get(key, -self.interval) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+        self.last_emit[key] = now
+        skipped = self.suppressed.pop(key, 0)
+        if skipped:
+            record.msg = f"{record.getMessage()} (+{skipped} suppressed)"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, cycle, account, symbol, msg"""
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            'level': record.levelname,
+            'logger': record.name,
+            'cycle': getattr(record, 'cycle_id', ''),
+            'msg': record.getMessage(),
+        }
+        account = getattr(record, 'account', '')
+        if account:
+            entry['account'] = account
+        symbol = getattr(record, 'symbol', None)
+        if symbol is not None:
+            entry['symbol'] = symbol
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare folds the traceback into msg and drops exc_info/exc_text, so the
+    writers' formatters never see it. Format it here, in the emitting thread (exc_info is
+    only valid there), and hand it over as exc_text; msg stays the plain message.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup_logger(name="AiTrader", log_file="ai_trader.log", level=logging.INFO,
+                 json_format=None, symbol_interval_sec=None, background=True):
     """
     Setup a logger that prints to stdout and writes to a file.
+    Records are put on a queue and written by a background thread, so console and
+    file I/O (including rotation) never block the asyncio loop.
+    background=False writes in the caller instead (worker processes, see reset_logger).
     """
     logger = logging.getLogger(name)
     logger.setLevel(level)
@@ -14,26 +128,73 @@ def setup_logger(name="AiTrader", log_file="ai_trader.log", level=logging.INFO):
     if logger.hasHandlers():
         return logger
 
+    if json_format is None:
+        json_format = Config.LOG_FORMAT.lower() == 'json'
+    if symbol_interval_sec is None:
+        symbol_interval_sec = Config.LOG_SYMBOL_INTERVAL_SEC
+
     # Formatter
-    formatter = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt="%(asctime)s [%(levelname)s] %(name)s: %(cycle_tag)s%(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+
+    handlers = []
 
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
 
     # File Handler
     try:
         file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3) # 5MB per file
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except Exception as e:
         print(f"Failed to set up file logging: {e}")
 
+    filters = [CycleFilter()]
+    if symbol_interval_sec > 0:
+        filters.append(SymbolRateLimitFilter(symbol_interval_sec))
+
+    if not background:
+        for f in filters:
+            logger.addFilter(f)
+        for handler in handlers:
+            logger.addHandler(handler)
+        return logger
+
+    # Queue Handler (caller side) -> QueueListener thread (writers)
+    log_queue = queue.SimpleQueue()
+    queue_handler = TracebackQueueHandler(log_queue)
+    for f in filters:
+        queue_handler.addFilter(f)
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued on interpreter exit
+    atexit.register(listener.stop)
+
     return logger
 
+
+def reset_logger(name="AiTrader", **kwargs):
+    """
+    Drop the handlers and filters a forked process inherited and set the logger up again.
+    The parent's listener thread does not exist in the child, so its queue would never be
+    drained; workers pass background=False because they exit without running atexit.
+    """
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    for f in list(logger.filters):
+        logger.removeFilter(f)
+    return setup_logger(name, **kwargs)
+
 # Global logger instance
 logger = setup_logger()
@@ -1,84 +1,247 @@
+import time
 import asyncio
 import signal
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 from config import Config
 from exchange import BinanceClient
 from market_scanner import MarketScanner
-from risk_manager import RiskManager
 from rebalancer import Rebalancer
-from logger import logger
+from snapshot import SnapshotBuilder
+from price_feed import PriceFeed
+from accounts import Account, load_profiles
+from warm_state import WarmState
+from ohlcv_store import OHLCVStore
+from weighting import WeightEngine
+from order_book import DepthCache
+from scheduler import Scheduler
+from universe import SharedMarket, UniverseSubscriber
+from metrics import metrics
+from logger import logger, new_cycle, account_scope
 
 # Graceful shutdown handler
 class GracefulExit:
-    def __init__(self):
+    def __init__(self, on_exit: Optional[Callable[[], None]] = None):
         self.kill_now = False
+        self.on_exit = on_exit
+        self.loop = asyncio.get_running_loop()
         signal.signal(signal.SIGINT, self.exit_gracefully)
         signal.signal(signal.SIGTERM, self.exit_gracefully)
 
     def exit_gracefully(self, *args):
         self.kill_now = True
+        if self.on_exit:
+            # Signal handlers run between bytecodes; hand the wake-up to the event loop
+            self.loop.call_soon_threadsafe(self.on_exit)
+
+async def connect(client: BinanceClient, accounts: Sequence[Account] = ()):
+    """
+    启动连接 (Startup Round-Trips) - markets, connectivity check and account seeds run concurrently
+    Accounts whose stream seed fails fall back to REST polling.
+    """
+    # load_markets goes first: a cached index is handed to ccxt before any other request needs markets
+    results = await asyncio.gather(
+        client.load_markets(),
+        client.validate_connectivity(),
+        *(account.seed() for account in accounts),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+async def run_cycle(snapshots: SnapshotBuilder, scanner: MarketScanner, rebalancer: Rebalancer,
+                    universe: Optional[List[str]] = None) -> Tuple[List[str], bool]:
+    """
+    单次周期 (One Scheduled Cycle): snapshot -> scan -> rebalance, single account
+    """
+    return await run_accounts_cycle(snapshots, scanner, [(snapshots, rebalancer)], universe)
+
+async def run_accounts_cycle(market: Union[SnapshotBuilder, SharedMarket], scanner: MarketScanner,
+                             books: Sequence[Tuple[SnapshotBuilder, Rebalancer]],
+                             universe: Optional[List[str]] = None) -> Tuple[List[str], bool]:
+    """
+    单次周期 (One Scheduled Cycle): snapshot -> scan -> rebalance, for every account
+    Tickers and funding are fetched once (by `market`) and shared; each account adds its own
+    balance and positions concurrently. A given universe (restored warm state) skips the scan.
+    Returns (selected coins, complete). complete is False for a restored universe or a failed
+    scan's fallback list: positions outside such a list are not closed.
+    """
+    new_cycle()
+    with metrics.span('cycle'):
+        # Step A: Snapshot (tickers and funding once; balance and positions per account, all concurrent)
+        with metrics.span('snapshot'):
+            shared = asyncio.ensure_future(market.take_market())
+            
+            async def account_snapshot(builder: SnapshotBuilder, rebalancer: Rebalancer):
+                with account_scope(rebalancer.settings):
+                    return await builder.take(market=shared)
+            snapshots = await asyncio.gather(*(account_snapshot(b, r) for b, r in books))
+        
+        # Step B: Scan (once, shared by every account; already done when published by the scanner service)
+        if universe:
+            coins, complete = list(universe), False
+        elif shared.result().universe:
+            coins, complete = list(shared.result().universe), True
+        else:
+            with metrics.span('scan'):
+                coins = await scanner.get_top_coins(snapshot=shared.result())
+            complete = not scanner.degraded
+        if not coins:
+            logger.warning("⚠️ No coins to trade. Waiting for next cycle.")
+            return coins, complete
+        
+        # Step C: Rebalance every account concurrently (plan / execute spans recorded by the Rebalancer)
+        async def account_rebalance(rebalancer: Rebalancer, snapshot):
+            with account_scope(rebalancer.settings):
+                await rebalancer.rebalance(coins, snapshot, allow_exits=complete)
+        results = await asyncio.gather(*(account_rebalance(r, snap) for (_, r), snap in zip(books, snapshots)),
+                                       return_exceptions=True)
+        failed = [r for r in results if isinstance(r, BaseException)]
+        for (_, rebalancer), result in zip(books, results):
+            if isinstance(result, BaseException) and len(books) > 1:
+                with account_scope(rebalancer.settings):
+                    logger.error(f"❌ Rebalance failed: {result}", exc_info=result)
+        if len(failed) == len(books):
+            raise failed[0]
+    return coins, complete
 
 async def main_loop():
     logger.info("=== 🚀 Starting Quantitative Trading Bot (AsyncIO) ===")
     
     client = None
+    price_feed = None
+    accounts: List[Account] = []
     try:
         # 1. Initialize Components
+        started = time.perf_counter()
+        # Last universe, if recent: the first cycle trades it without waiting for a full scan
+        warm = WarmState.load()
+        await metrics.start_server()
+        profiles = load_profiles()
+        # Market data (and the only account when no profiles file is configured)
         client = BinanceClient()
-        if not await client.validate_connectivity():
-            return
-            
-        scanner = MarketScanner(client)
-        risk_manager = RiskManager()
-        rebalancer = Rebalancer(client, risk_manager)
+        accounts = [Account(p, client if p is Config else BinanceClient(p, market_data=client)) for p in profiles]
         
-        killer = GracefulExit()
+        # Markets (restored from disk when cached), connectivity and account seeds in parallel
+        await connect(client, accounts)
         
-        logger.info(f"✅ Bot initialized. Schedule: Every {Config.SCAN_INTERVAL_MINUTES} minutes.")
-
-        # 2. Main Loop
-        while not killer.kill_now:
-            try:
-                start_time = asyncio.get_event_loop().time()
-                
-                # Step A: Scan
-                # In production, we might want to cache this list or update it less frequently than rebalancing
-                coins = await scanner.get_top_coins()
-                if not coins:
-                    logger.warning("⚠️ No coins to trade. Waiting for next cycle.")
-                else:
-                    # Step B: Rebalance
-                    await rebalancer.rebalance(coins)
-                
-                # Check for exit before sleeping
-                if killer.kill_now:
-                    break
+        # Live price stream (WebSocket), one for all accounts
+        if Config.USE_PRICE_STREAM:
+            price_feed = PriceFeed(client)
+            price_feed.start()
+        
+        # Local bar history (filled and extended incrementally by the 'ohlcv' job)
+        history = OHLCVStore() if Config.USE_OHLCV_STORE else None
+        # Covariance for inverse-vol / risk-parity weights, updated bar by bar from the store
+        weights = WeightEngine(history) if history else None
+        # Order books of the symbols being traded, for impact-aware execution
+        depth = DepthCache(client) if Config.USE_SMART_EXECUTION else None
+        
+        # Per-account streams, journal, ledger, risk and execution
+        for account in accounts:
+            await account.start(price_feed, history, weights, depth)
+        
+        market = SnapshotBuilder(client, price_feed)
+        if Config.USE_SHARED_UNIVERSE:
+            # Scan, tickers and funding from the scanner service (run_scanner.py --serve)
+            market = SharedMarket(market, UniverseSubscriber(), client.market_index)
+        scanner = MarketScanner(client, max(p.MAX_OPEN_POSITIONS for p in profiles), history)
+        books = [(a.snapshots, a.rebalancer) for a in accounts]
+        
+        state = {'coins': [], 'complete': False, 'universe': warm.coins if warm else None}
+        
+        async def cycle():
+            coins, complete = await run_accounts_cycle(market, scanner, books, state['universe'])
+            state['universe'] = None
+            if coins:
+                state['coins'], state['complete'] = coins, complete
+                if complete:
+                    # A fallback list is never restored as the next start's universe
+                    WarmState(coins).save()
+        
+        async def rebalance_check():
+            # Price stream flagged a deviation or a position stop: rebalance that account right away
+            # Halted accounts are only retried by the scheduled cycle (flatten until flat)
+            triggered = [a for a in accounts if a.tracker and a.tracker.rebalance_needed.is_set()
+                         and not a.risk_manager.halted]
+            if state['coins'] and triggered:
+                new_cycle()
+                await rebalance_now(triggered, state['coins'], state['complete'])
+        
+        # 2. Jobs (independent cadences on one deadline queue)
+        scheduler = Scheduler()
+        scheduler.add('cycle', cycle, Config.SCAN_INTERVAL_MINUTES * 60, group='trading')
+        if price_feed:
+            scheduler.add('rebalance_check', rebalance_check, Config.REBALANCE_CHECK_SEC,
+                          Config.REBALANCE_CHECK_SEC, group='trading')
+        markets_every = Config.MARKET_REFRESH_CHECK_MINUTES * 60
+        scheduler.add('markets', lambda: client.market_index.refresh_if_stale(client.exchange),
+                      markets_every, markets_every)
+        if not Config.USE_SHARED_UNIVERSE:
+            # Refresh the funding cache right after each funding time, off the cycle path
+            funding_every = Config.FUNDING_REFRESH_MINUTES * 60
+            scheduler.add('funding', client.get_funding_info, funding_every, funding_every)
+        if history:
+            # Bars of the scan pool and the traded coins; a request only once a new bar has closed
+            ohlcv_every = Config.OHLCV_REFRESH_MINUTES * 60
+            async def update_history():
+                symbols = scanner.pool_symbols + state['coins']
+                await history.update(client, symbols)
+                # Fold new bars into the covariance here rather than on the rebalance path
+                weights.track(symbols)
+            scheduler.add('ohlcv', update_history, ohlcv_every, Config.REBALANCE_CHECK_SEC)
+        for account in accounts:
+            if account.account_state:
+                reconcile_every = account.settings.RECONCILE_INTERVAL_MINUTES * 60
+                scheduler.add(f'reconcile:{account.name}', account.account_state.reconcile,
+                              reconcile_every, reconcile_every)
+        
+        killer = GracefulExit(scheduler.stop)
+        
+        logger.info(f"✅ Bot initialized in {(time.perf_counter() - started) * 1000:.0f} ms "
+                    f"({len(accounts)} account{'s' if len(accounts) > 1 else ''}). "
+                    f"Schedule: scan every {Config.SCAN_INTERVAL_MINUTES} min, "
+                    f"checks every {Config.REBALANCE_CHECK_SEC:g}s.")
+        if warm:
+            logger.info(f"♻️ Warm start: trading the saved universe ({len(warm.coins)} coins, "
+                        f"{warm.age / 60:.1f} min old); full scan next cycle")
 
-                # Sleep until next interval
-                # Calculate elapsed time to maintain precise schedule
-                elapsed = asyncio.get_event_loop().time() - start_time
-                sleep_sec = (Config.SCAN_INTERVAL_MINUTES * 60) - elapsed
-                
-                if sleep_sec > 0:
-                    logger.info(f"💤 Sleeping for {sleep_sec:.1f}s...")
-                    # We sleep in chunks to check for exit signals (or use asyncio.wait)
-                    # Simple chunk sleep:
-                    while sleep_sec > 0 and not killer.kill_now:
-                        step = min(1, sleep_sec)
-                        await asyncio.sleep(step)
-                        sleep_sec -= step
-                        
-            except Exception as e:
-                logger.error(f"❌ Cycle Failed: {e}", exc_info=True)
-                await asyncio.sleep(60) # Retry after 1 min on error
+        await scheduler.run()
 
         logger.info("🛑 Bot stopping gracefully...")
 
     except Exception as e:
         logger.critical(f"❌ Fatal Error: {e}", exc_info=True)
     finally:
+        for account in accounts:
+            await account.close()
+        if price_feed:
+            await price_feed.close()
+        for account in accounts:
+            if account.client is not client:
+                await account.client.close()
         if client:
             await client.close()
             logger.info("🔌 Connection closed.")
+        await metrics.close()
+
+async def rebalance_now(accounts: Sequence[Account], coins: List[str], allow_exits: bool = True):
+    """Deviation trigger: rebalance these accounts ahead of schedule from streamed prices"""
+    async def rebalance(account: Account):
+        with account.scope():
+            logger.info("⚡ Deviation trigger: rebalancing ahead of schedule")
+            try:
+                with metrics.span('snapshot'):
+                    snapshot = await account.snapshots.take(full=False)
+                await account.rebalancer.rebalance(coins, snapshot, allow_exits)
+            except Exception as e:
+                logger.error(f"❌ Triggered rebalance failed: {e}", exc_info=True)
+                raise
+    results = await asyncio.gather(*(rebalance(a) for a in accounts), return_exceptions=True)
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        # Scheduler backoff; the trigger stays set and is retried
+        raise failed[0]
 
 if __name__ == "__main__":
     try:
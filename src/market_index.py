@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import asyncio
+from typing import Dict, List, NamedTuple, Optional
+from config import Config
+from logger import logger
+
+
+class SymbolLimits(NamedTuple):
+    """Compact per-symbol trading constraints"""
+    min_amount: float
+    max_amount: float
+    min_cost: float  # Min Notional
+    step_size: float  # Amount increment
+    amount_precision: float
+    price_precision: float
+
+
+# Safe defaults (conservative) when a symbol is unknown
+DEFAULT_LIMITS = SymbolLimits(0.001, 1000000.0, 5.0, 0.001, 0.001, 0.01)
+
+
+def perp_symbol(name: str) -> str:
+    """BTC/USDT, BTCUSDT or BTC/USDT:USDT -> BTC/USDT:USDT (the USDT-margined perpetual)"""
+    if ':' in name:
+        return name
+    if '/' in name:
+        return f"{name}:{name.split('/')[1]}"
+    if name.endswith('USDT'):
+        return f"{name[:-4]}/USDT:USDT"
+    return name
+
+
+def _num(value, default: float) -> float:
+    return float(value) if value is not None else default
+
+
+class MarketIndex:
+    def __init__(self, cache_file: Optional[str] = None, ttl_hours: Optional[float] = None):
+        """
+        市场元数据索引 (Market Metadata Index)
+        Built once from ccxt markets, persisted to disk with a TTL so restarts skip load_markets.
+        """
+        self.cache_file = cache_file or Config.MARKET_CACHE_FILE
+        self.ttl = (Config.MARKET_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours) * 3600
+        self.limits: Dict[str, SymbolLimits] = {}
+        self.by_id: Dict[str, str] = {}  # Raw id (BTCUSDT) -> unified symbol (BTC/USDT:USDT)
+        self.markets: Dict[str, Dict] = {}  # Raw ccxt market structures (for exchange.set_markets)
+        self.updated_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loading: Optional[asyncio.Task] = None  # In-flight download, shared by concurrent callers
+        self._attached: List = []  # Other ccxt instances (accounts) kept in sync on refresh
+
+    @property
+    def is_fresh(self) -> bool:
+        return bool(self.limits) and (time.time() - self.updated_at) < self.ttl
+
+    def build(self, markets: Dict[str, Dict]):
+        """Pre-index ccxt markets into the compact limits table and id map"""
+        limits = {}
+        by_id = {}
+        for symbol, m in markets.items():
+            lim = m.get('limits') or {}
+            prec = m.get('precision') or {}
+            step = _num(prec.get('amount'), DEFAULT_LIMITS.step_size)
+            limits[symbol] = SymbolLimits(
+                min_amount=_num((lim.get('amount') or {}).get('min'), DEFAULT_LIMITS.min_amount),
+                max_amount=_num((lim.get('amount') or {}).get('max'), DEFAULT_LIMITS.max_amount),
+                min_cost=_num((lim.get('cost') or {}).get('min'), DEFAULT_LIMITS.min_cost),
+                step_size=step,
+                amount_precision=step,
+                price_precision=_num(prec.get('price'), DEFAULT_LIMITS.price_precision),
+            )
+            if m.get('id'):
+                # Prefer the USDT-margined perpetual when several markets share an id
+                if m['id'] not in by_id or m.get('swap'):
+                    by_id[m['id']] = symbol
+        self.markets = markets
+        self.limits = limits
+        self.by_id = by_id
+
+    def get(self, symbol: str) -> Optional[SymbolLimits]:
+        return self.limits.get(symbol)
+
+    def symbol_for_id(self, raw_id: str) -> Optional[str]:
+        return self.by_id.get(raw_id)
+
+    def load_cache(self) -> bool:
+        """
+        从磁盘恢复 (Restore From Disk)
+        Returns True if a cache was loaded (fresh or stale, see is_fresh).
+        """
+        try:
+            if not os.path.exists(self.cache_file):
+                return False
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            self.build(data['markets'])
+            self.updated_at = float(data['saved_at'])
+            logger.info(f"📦 Loaded {len(self.limits)} markets from cache "
+                        f"(age {(time.time() - self.updated_at) / 3600:.1f}h)")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load market cache: {e}")
+            return False
+
+    def reload_cache(self) -> bool:
+        """Pick up a newer cache written by another process (the scanner service)"""
+        if not self.load_cache():
+            return False
+        for exchange in self._attached:
+            exchange.set_markets(self.markets)
+        return True
+
+    def save_cache(self):
+        """Atomic write (tmp file + rename) so readers never see a partial file"""
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            tmp = self.cache_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'saved_at': self.updated_at, 'markets': self.markets}, f, default=str)
+            os.replace(tmp, self.cache_file)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save market cache: {e}")
+
+    async def refresh(self, exchange):
+        """Full load_markets from the exchange, then re-index and persist"""
+        markets = await exchange.load_markets(True)
+        self.build(markets)
+        self.updated_at = time.time()
+        self.save_cache()
+        for other in self._attached:
+            if other is not exchange:
+                other.set_markets(self.markets)
+        logger.info(f"📦 Market index refreshed: {len(self.limits)} markets")
+
+    async def ensure_loaded(self, exchange):
+        """
+        确保已加载 (Ensure Loaded)
+        Fresh cache: hand it to ccxt, no network. Stale cache: use it now, refresh in background.
+        No cache: blocking load_markets (cold start only).
+        """
+        if self.limits:
+            return
+        if self.load_cache():
+            exchange.set_markets(self.markets)
+            if not self.is_fresh:
+                self.start_background_refresh(exchange)
+            return
+        await self.refresh_if_stale(exchange)
+
+    async def refresh_if_stale(self, exchange):
+        """Refresh once the TTL has passed; concurrent callers (accounts, scheduled job) share one download"""
+        if self.is_fresh:
+            return
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.ensure_future(self.refresh(exchange))
+        await self._loading
+
+    def attach(self, exchange):
+        """Hand the index to another ccxt instance (an account client) and keep it updated"""
+        if exchange not in self._attached:
+            self._attached.append(exchange)
+            if self.markets and not exchange.markets:
+                exchange.set_markets(self.markets)
+
+    def start_background_refresh(self, exchange) -> asyncio.Task:
+        """Keep the index fresh off the trading hot path (refresh whenever the TTL expires)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop(exchange))
+        return self._refresh_task
+
+    async def _refresh_loop(self, exchange):
+        while True:
+            try:
+                await self.refresh_if_stale(exchange)
+                wait = max(60.0, self.ttl - (time.time() - self.updated_at))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Market index refresh failed: {e}")
+                wait = 60.0
+            await asyncio.sleep(wait)
+
+    async def close(self):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
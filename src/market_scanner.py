@@ -1,104 +1,126 @@
-from typing import List
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from exchange import BinanceClient
+from snapshot import CycleSnapshot
+from ohlcv_store import OHLCVStore
+from market_index import perp_symbol
+import scanner_engine as engine
 from config import Config
 from logger import logger
 
 class MarketScanner:
-    def __init__(self, client: BinanceClient):
+    def __init__(self, client: BinanceClient, max_coins: Optional[int] = None,
+                 history: Optional[OHLCVStore] = None):
         self.client = client
-        # Blacklist: Stablecoins + Illiquid Testnet Assets (causing -4131/MaxQty errors)
-        self.blacklist = ["USDC/USDT", "TUSD/USDT", "FDUSD/USDT", "USDP/USDT", "BTCDOM/USDT", "AIA/USDT", "MYRO/USDT"]
+        # Universe size; several accounts share one scan sized for the largest of them
+        self.max_coins = max_coins
+        # Local bar history (realized volatility without refetching candles)
+        self.history = history
+        self.pool_symbols: List[str] = []  # Last liquidity pool, kept up to date in the store
+        # The last scan failed and returned DEFAULT_COINS: not a full view of the market
+        self.degraded = False
+        # Eligible perps + sector codes, rebuilt only when the market metadata changes
+        self._universe: Optional[engine.ScanUniverse] = None
+        self._universe_key: Optional[Tuple] = None
+        self._open_interest: Dict[str, Tuple[float, float]] = {}  # symbol -> (contracts, fetched_at)
 
-    async def get_top_coins(self, limit: int = 50) -> List[str]:
+    def universe(self) -> engine.ScanUniverse:
+        """
+        选币范围 (Scan Universe) - precomputed eligibility and sector index
+        """
+        index = self.client.market_index
+        key = (index.updated_at, id(index.markets), tuple(Config.SCAN_BLACKLIST),
+               tuple(sorted(Config.SECTOR_OVERRIDES.items())))
+        if self._universe is None or key != self._universe_key:
+            self._universe = engine.build_universe(index.markets, Config.SCAN_BLACKLIST, Config.SECTOR_OVERRIDES)
+            self._universe_key = key
+            logger.info(f"🗂️ Scan universe: {len(self._universe.symbols)} perps in "
+                        f"{len(self._universe.sector_names)} sectors")
+        return self._universe
+
+    async def _get_open_interest(self, symbols: List[str]) -> Dict[str, float]:
+        """Cached per symbol for OPEN_INTEREST_TTL_MINUTES; only the liquidity pool is ever fetched"""
+        now = time.time()
+        ttl = Config.OPEN_INTEREST_TTL_MINUTES * 60
+        stale = [s for s in symbols if now - self._open_interest.get(s, (0.0, 0.0))[1] > ttl]
+        if stale:
+            fetched = await self.client.get_open_interest(stale)
+            for symbol in stale:
+                # Failures are cached as unknown too, so they are not retried every scan
+                self._open_interest[symbol] = (fetched.get(symbol, float('nan')), now)
+        return {s: self._open_interest[s][0] for s in symbols if s in self._open_interest}
+
+    async def get_top_coins(self, limit: int = 50, snapshot: Optional[CycleSnapshot] = None) -> List[str]:
         """
         获取筛选后的 Top Coin List (Get Filtered Top Coin List) - Async
+        The most traded perps form the pool; each is scored on volume, volatility, spread,
+        open interest and funding, filtered, and the top coins are taken under the sector caps.
+        If a cycle snapshot is given, its tickers and funding rates are reused instead of refetched.
+        On failure returns DEFAULT_COINS and sets `degraded` (callers must not close positions outside it).
         """
         try:
             logger.info("🔍 Scanning Market for Top Assets...")
-            
-            # 1. Fetch Tickers (Vol based)
-            # fetch_tickers returns all, we sort by 'quoteVolume'
-            tickers = await self.client.exchange.fetch_tickers()
-            
+            started = time.perf_counter()
+
+            # 1. Fetch Tickers
+            if snapshot is not None:
+                tickers = snapshot.tickers
+            else:
+                tickers = await self.client.get_tickers()
+
             # Ensure markets are loaded for metadata check
-            if not self.client.exchange.markets:
-                await self.client.exchange.load_markets()
-            
-            markets = self.client.exchange.markets
+            if not self.client.market_index.markets:
+                await self.client.load_markets()
+            universe = self.universe()
+
+            # 2. Liquidity pool: partial selection by 24h volume
+            # The pool grows with MAX_OPEN_POSITIONS so large portfolios are not capped at SCAN_POOL_SIZE
+            max_coins = self.max_coins or Config.MAX_OPEN_POSITIONS
+            pool = engine.liquidity_pool(universe, tickers, max(Config.SCAN_POOL_SIZE, max_coins * 2))
+            self.pool_symbols = [universe.symbols[i] for i in pool]
 
-            # Convert to list and filter for USDT futures (PERPETUAL only)
-            valid_tickers = []
-            for symbol, data in tickers.items():
-                market_info = markets.get(symbol)
-                
-                # Strict Filtering using CCXT Market Metadata
-                # 1. Must exist in markets
-                # 2. Must be linear (USDT-margined)
-                # 3. Must be swap (Perpetual)
-                # 4. Must be active
-                # 5. Quote currency must be USDT
-                
-                if not market_info:
-                    continue
+            # Get Funding Rates for the funding factor and filters
+            if snapshot is not None:
+                funding = snapshot.funding
+            else:
+                funding = await self.client.get_funding_info()
+            open_interest = {}
+            if Config.SCAN_FACTOR_WEIGHTS.get('open_interest'):
+                open_interest = await self._get_open_interest(self.pool_symbols)
 
-                if (market_info.get('linear') is True and 
-                    market_info.get('swap') is True and 
-                    market_info.get('contract') is True and
-                    market_info.get('quote') == 'USDT' and
-                    market_info.get('active', True) is True):  # Default to True if active not set
-                     
-                     if data.get('quoteVolume') is not None:
-                         valid_tickers.append(data)
-            
-            # Sort by 24h Volume (descending)
-            sorted_tickers = sorted(valid_tickers, key=lambda x: x['quoteVolume'], reverse=True)
-            
-            # Take top N candidates (e.g., top 100 to filter down to 20)
-            candidates = sorted_tickers[:100]
-            
-            # 2. Filter Logic
-            final_list = []
-            
-            # Get Funding Rates for check
-            funding_rates = await self.client.get_funding_rates()
-            
-            for ticker in candidates:
-                symbol = ticker['symbol']
-                
-                # Filter 1: Blacklist (Stables)
-                is_stable = any(stable in symbol for stable in self.blacklist)
-                if is_stable:
-                    continue
-                
-                # Filter 2: Funding Rate Checks
-                fr = funding_rates.get(symbol, 0.0)
-                
-                # Check 2a: Avoid Paying Fees (Long pays Short if Rate > 0)
-                if Config.AVOID_PAYING_FUNDING_FEES and fr > 0:
-                    # logger.debug(f"⚠️ Skipping {symbol} due to Positive Funding Rate (Fee Payment): {fr:.6f}")
-                    continue
+            # 3. Score and filter the pool, then take the top coins within the sector caps
+            frame = engine.build_frame(universe, pool, tickers, funding, open_interest)
+            if self.history is not None:
+                # Realized volatility from stored bars once the store covers the pool (else the 24h range)
+                realized = self.history.volatility(frame.symbols, Config.SCAN_VOLATILITY_BARS)
+                if np.isfinite(realized).any():
+                    frame.volatility = realized
+            scores = engine.score(frame, Config.SCAN_FACTOR_WEIGHTS)
+            mask = engine.eligible(
+                frame,
+                avoid_positive_funding=Config.AVOID_PAYING_FUNDING_FEES,
+                max_funding_apr=Config.MAX_FUNDING_RATE_APR if Config.CHECK_FUNDING_RATE_APR else None,
+                max_spread_bps=Config.SCAN_MAX_SPREAD_BPS)
+            chosen = engine.select(scores, mask, frame.sector, max_coins,
+                                   engine.sector_cap(max_coins, Config.SECTOR_MAX_SHARE))
+            final_list = [frame.symbols[i] for i in chosen]
 
-                # Check 2b: Abnormal Rate Check (APR)
-                if Config.CHECK_FUNDING_RATE_APR:
-                    # APR = fr * 3 * 365
-                    apr = fr * 3 * 365
-                    if abs(apr) > Config.MAX_FUNDING_RATE_APR:
-                        # logger.debug(f"⚠️ Skipping {symbol} due to Abnormal Funding Rate: {apr:.2%}")
-                        continue
-                
-                final_list.append(symbol)
-                
-                if len(final_list) >= Config.MAX_OPEN_POSITIONS:
-                    break
-            
+            logger.info(f"📊 Scored {len(frame)} of {len(universe.symbols)} perps, {int(mask.sum())} passed filters "
+                        f"in {(time.perf_counter() - started) * 1000:.0f} ms")
             logger.info("✅ Recommended Assets to Buy (Top Selected):")
             logger.info("---------------------------------------------")
-            for i, coin in enumerate(final_list, 1):
-                logger.info(f"{i}. {coin}")
+            for i, n in enumerate(chosen, 1):
+                coin = frame.symbols[n]
+                sector = universe.sector_name(int(frame.sector[n]))
+                logger.info(f"{i}. {coin} (score {scores[n]:+.2f}{', ' + sector if sector else ''})",
+                            extra={'symbol': coin})
             logger.info("---------------------------------------------")
             logger.info(f"Total: {len(final_list)} coins selected.")
+            self.degraded = False
             return final_list
 
         except Exception as e:
             logger.error(f"❌ Market Scan Failed: {e}")
-            return Config.DEFAULT_COINS  # Fallback
+            self.degraded = True
+            return [perp_symbol(c) for c in Config.DEFAULT_COINS]  # Fallback
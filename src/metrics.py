@@ -0,0 +1,170 @@
+"""
+运行指标 (Runtime Metrics)
+
+In-process counters and histograms exposed in the Prometheus text format on a local
+HTTP endpoint (METRICS_HOST:METRICS_PORT/metrics). No external dependencies; recording
+a sample is a dict lookup and a few additions, cheap enough for the order path.
+"""
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from config import Config
+from logger import logger
+
+PREFIX = 'aitrader_'
+
+# Seconds; covers sub-ms local work up to slow REST calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Basis points against the pre-trade mid; negative = price improvement
+SLIPPAGE_BUCKETS = (-20.0, -10.0, -5.0, -2.0, 0.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+BUCKETS = {'slippage_bps': SLIPPAGE_BUCKETS}
+
+HELP = {
+    'phase_seconds': 'Duration of main loop phases (scan, snapshot, plan, execute, cycle)',
+    'api_request_seconds': 'REST round-trip time per BinanceClient method',
+    'api_queue_seconds': 'Time REST requests waited for rate-limit budget, per priority lane',
+    'api_errors_total': 'Failed REST requests per BinanceClient method and error type',
+    'order_latency_seconds': 'Dispatch-to-response time per order',
+    'orders_total': 'Orders by result (placed, skipped, rejected) and reason',
+    'slippage_bps': 'Average fill price against the pre-trade mid per order, by execution strategy',
+    'jobs_total': 'Scheduled job runs by result (ok, error, skipped while still running)',
+    'job_seconds': 'Duration of scheduled job runs',
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        """
+        指标注册表 (Metrics Registry)
+        """
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram(BUCKETS.get(name, LATENCY_BUCKETS))
+        hist.observe(value)
+
+    @contextmanager
+    def span(self, phase: str):
+        """Time a block (sync or containing awaits) into phase_seconds{phase=...}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('phase_seconds', time.perf_counter() - start, phase=phase)
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (v0.0.4)"""
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}{_format_labels(key)} {value:g}")
+        for name, series in sorted(self.histograms.items()):
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+            for key, hist in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f"{full}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                lines.append(f"{full}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                lines.append(f"{full}_sum{_format_labels(key)} {hist.sum:.6f}")
+                lines.append(f"{full}_count{_format_labels(key)} {hist.count}")
+        return '\n'.join(lines) + '\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain headers; the body of a GET is empty
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/', '/metrics'):
+                status, body = '200 OK', self.render().encode()
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    async def start_server(self, host: Optional[str] = None, port: Optional[int] = None):
+        """
+        启动指标端点 (Start Metrics Endpoint) - no-op when the port is 0
+        A port already in use (e.g. another bot on the host) only disables the endpoint.
+        """
+        host = host or Config.METRICS_HOST
+        port = Config.METRICS_PORT if port is None else port
+        if not port or self._server is not None:
+            return
+        try:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        except OSError as e:
+            logger.warning(f"⚠️ Metrics endpoint disabled, cannot listen on {host}:{port}: {e}. "
+                           f"Give each bot its own METRICS_PORT")
+            return
+        logger.info(f"📈 Metrics endpoint: http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+# Global registry
+metrics = Metrics()
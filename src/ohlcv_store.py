@@ -0,0 +1,199 @@
+"""
+K线存储 (Local OHLCV Store)
+
+Closed bars per symbol in one append-only binary file of fixed-size records:
+    <OHLCV_DIR>/<timeframe>/BTCUSDT.bin   int64 ts (open time, ms), float64 open/high/low/close/volume
+
+update() fetches only the bars after the last stored one (nothing at all until the next
+bar has closed). Reads are memory-mapped: window() returns a view into the file without
+copying, so the scanner and risk analytics read history without touching the exchange.
+A record cut short by a crash is ignored on read and overwritten by the next append.
+"""
+import os
+import time
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from config import Config
+from logger import logger
+
+BAR_DTYPE = np.dtype([('ts', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                      ('close', '<f8'), ('volume', '<f8')])
+EMPTY = np.empty(0, dtype=BAR_DTYPE)
+
+# Binance serves at most 1500 klines per request; 1000 keeps the request weight at 5
+MAX_PAGE = 1000
+
+TIMEFRAME_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000}
+
+
+def timeframe_ms(timeframe: str) -> int:
+    """'1m', '15m', '1h', '4h', '1d' -> bar length in ms (bars aligned to the epoch)"""
+    unit = timeframe[-1:]
+    if unit not in TIMEFRAME_MS or not timeframe[:-1].isdigit():
+        raise ValueError(f"Unsupported OHLCV timeframe: {timeframe}")
+    return int(timeframe[:-1]) * TIMEFRAME_MS[unit]
+
+
+def file_id(symbol: str) -> str:
+    """BTC/USDT:USDT -> BTCUSDT (the raw id, as in the backtest history layout)"""
+    return symbol.split(':')[0].replace('/', '')
+
+
+class OHLCVStore:
+    def __init__(self, root: Optional[str] = None, timeframe: Optional[str] = None,
+                 history_bars: Optional[int] = None, clock=time.time):
+        """
+        K线库 (OHLCV Store)
+        history_bars: how far back a symbol is filled (first seen, or after a long downtime).
+        """
+        self.timeframe = timeframe or Config.OHLCV_TIMEFRAME
+        self.tf_ms = timeframe_ms(self.timeframe)
+        self.root = os.path.join(root or Config.OHLCV_DIR, self.timeframe)
+        self.history_bars = Config.OHLCV_HISTORY_BARS if history_bars is None else history_bars
+        self.clock = clock
+        self._maps: Dict[str, Tuple[int, np.ndarray]] = {}  # symbol -> (rows, memmap)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.root, file_id(symbol) + '.bin')
+
+    def _rows(self, symbol: str) -> int:
+        try:
+            return os.path.getsize(self.path(symbol)) // BAR_DTYPE.itemsize
+        except OSError:
+            return 0
+
+    def bars(self, symbol: str) -> np.ndarray:
+        """Every stored bar of a symbol, memory-mapped read-only (no copy)"""
+        rows = self._rows(symbol)
+        if rows == 0:
+            return EMPTY
+        cached = self._maps.get(symbol)
+        if cached is None or cached[0] != rows:
+            # The file only grows: views handed out earlier stay valid on their old mapping
+            cached = (rows, np.memmap(self.path(symbol), dtype=BAR_DTYPE, mode='r', shape=(rows,)))
+            self._maps[symbol] = cached
+        return cached[1]
+
+    def window(self, symbol: str, bars: Optional[int] = None,
+               start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> np.ndarray:
+        """
+        窗口读取 (Windowed Read) - a view, no copy
+        The last `bars` bars, or those with start_ms <= ts <= end_ms. Fields: window['close'] etc.
+        """
+        data = self.bars(symbol)
+        lo, hi = 0, len(data)
+        if start_ms is not None or end_ms is not None:
+            ts = data['ts']
+            if start_ms is not None:
+                lo = int(np.searchsorted(ts, start_ms, side='left'))
+            if end_ms is not None:
+                hi = int(np.searchsorted(ts, end_ms, side='right'))
+        if bars is not None:
+            lo = max(lo, hi - bars)
+        return data[lo:hi]
+
+    def last_timestamp(self, symbol: str) -> Optional[int]:
+        data = self.bars(symbol)
+        return int(data['ts'][-1]) if len(data) else None
+
+    def last_closed(self) -> int:
+        """Open time of the most recent closed bar"""
+        now_ms = int(self.clock() * 1000)
+        return (now_ms // self.tf_ms) * self.tf_ms - self.tf_ms
+
+    def matrix(self, symbols: List[str], bars: int, field: str = 'close') -> np.ndarray:
+        """
+        对齐矩阵 (Aligned Matrix) - (bars, len(symbols)) of one field on the common bar grid
+        ending at the latest stored bar; NaN where a symbol has no bar. This is the one copying read.
+        """
+        out = np.full((bars, len(symbols)), np.nan)
+        tails = [self.window(s, bars) for s in symbols]
+        ends = [int(w['ts'][-1]) for w in tails if len(w)]
+        if not ends:
+            return out
+        grid = max(ends) - self.tf_ms * np.arange(bars - 1, -1, -1, dtype=np.int64)
+        for n, w in enumerate(tails):
+            if not len(w):
+                continue
+            ts = w['ts']
+            idx = np.minimum(np.searchsorted(ts, grid), len(ts) - 1)
+            hit = ts[idx] == grid
+            out[hit, n] = w[field][idx[hit]]
+        return out
+
+    def log_returns(self, symbols: List[str], bars: int) -> np.ndarray:
+        """(bars, N) close-to-close log returns; NaN across gaps"""
+        close = self.matrix(symbols, bars + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.diff(np.log(close), axis=0)
+
+    def volatility(self, symbols: List[str], bars: int) -> np.ndarray:
+        """Per-bar standard deviation of log returns; NaN with fewer than half the bars"""
+        returns = self.log_returns(symbols, bars)
+        enough = np.isfinite(returns).sum(axis=0) >= max(2, bars // 2)
+        vol = np.full(len(symbols), np.nan)
+        if enough.any():
+            vol[enough] = np.nanstd(returns[:, enough], axis=0)
+        return vol
+
+    def append(self, symbol: str, rows: Iterable) -> int:
+        """Append [ts, open, high, low, close, volume] rows newer than the last stored bar"""
+        last = self.last_timestamp(symbol)
+        records = np.array([tuple(r[:6]) for r in rows], dtype=BAR_DTYPE)
+        if last is not None:
+            records = records[records['ts'] > last]
+        if not len(records):
+            return 0
+        records = records[np.argsort(records['ts'], kind='stable')]
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(symbol)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            # Start after the last whole record (drops the tail of an interrupted write)
+            f.seek(self._rows(symbol) * BAR_DTYPE.itemsize)
+            f.truncate()
+            f.write(records.tobytes())
+        return len(records)
+
+    async def _update_symbol(self, client, symbol: str) -> int:
+        lock = self._locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            end = self.last_closed()
+            last = self.last_timestamp(symbol)
+            since = end - (self.history_bars - 1) * self.tf_ms
+            if last is not None:
+                # After a long downtime only the last history_bars are filled in (the gap stays a gap)
+                since = max(since, last + self.tf_ms)
+            added = 0
+            while since <= end:
+                # Request exactly the missing bars (+1 in case the exchange includes the open one)
+                limit = min(MAX_PAGE, (end - since) // self.tf_ms + 2)
+                rows = await client.get_ohlcv(symbol, self.timeframe, since, limit)
+                rows = [r for r in rows if since <= r[0] <= end]
+                if not rows:
+                    break
+                added += self.append(symbol, rows)
+                since = int(rows[-1][0]) + self.tf_ms
+            return added
+
+    async def update(self, client, symbols: Iterable[str]) -> int:
+        """
+        增量更新 (Incremental Update) - fetch only bars closed since the last stored one
+        Symbols already up to date cost no request. Returns the number of bars added.
+        """
+        end = self.last_closed()
+        stale = [s for s in dict.fromkeys(symbols) if (self.last_timestamp(s) or -1) < end]
+        if not stale:
+            return 0
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._update_symbol(client, s) for s in stale), return_exceptions=True)
+        added = 0
+        for symbol, result in zip(stale, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"⚠️ OHLCV update failed for {symbol}: {result}", extra={'symbol': symbol})
+            else:
+                added += result
+        logger.info(f"🕯️ OHLCV store: +{added} {self.timeframe} bars for {len(stale)} symbols "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return added
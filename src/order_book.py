@@ -0,0 +1,158 @@
+"""
+深度簿与冲击估算 (Depth Book Cache & Impact Estimate)
+
+A local L2 book per symbol being traded, fetched from REST /depth and reused for
+DEPTH_TTL_SEC, so the orders of one cycle (and the slices of a worked order) share a
+snapshot instead of each paying a request. The estimate walks the book the way a market
+order would. Its average fill price against the mid decides how the order is executed:
+    market     the whole amount costs at most EXEC_MAX_IMPACT_BPS
+    post_only  crossing the spread alone costs more: rest at the touch instead
+    twap       the depth is the cost: split into slices that each stay within the limit
+"""
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from config import Config
+from logger import logger
+
+MARKET = 'market'
+POST_ONLY = 'post_only'
+TWAP = 'twap'
+
+
+@dataclass
+class DepthBook:
+    """One L2 snapshot: (k, 2) arrays of [price, qty], best level first"""
+    symbol: str
+    bids: np.ndarray
+    asks: np.ndarray
+    fetched_at: float
+
+    @property
+    def best_bid(self) -> float:
+        return float(self.bids[0, 0])
+
+    @property
+    def best_ask(self) -> float:
+        return float(self.asks[0, 0])
+
+    @property
+    def mid(self) -> float:
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread_bps(self) -> float:
+        return (self.best_ask - self.best_bid) / self.mid * 10_000
+
+
+def parse_book(symbol: str, raw: Dict, fetched_at: float) -> Optional[DepthBook]:
+    """ccxt order book -> DepthBook; None for a one-sided or crossed book"""
+    bids = np.array([lvl[:2] for lvl in raw.get('bids') or []], dtype=float).reshape(-1, 2)
+    asks = np.array([lvl[:2] for lvl in raw.get('asks') or []], dtype=float).reshape(-1, 2)
+    if not len(bids) or not len(asks) or bids[0, 0] <= 0 or asks[0, 0] < bids[0, 0]:
+        return None
+    return DepthBook(symbol, bids, asks, fetched_at)
+
+
+def sweep(levels: np.ndarray, amount: float) -> Tuple[float, float]:
+    """(average price, filled amount) of a market order for `amount` walking `levels`"""
+    qty = levels[:, 1]
+    before = np.cumsum(qty) - qty
+    take = np.clip(amount - before, 0.0, qty)
+    filled = float(take.sum())
+    if filled <= 0:
+        return float('nan'), 0.0
+    return float(take @ levels[:, 0]) / filled, filled
+
+
+def impact_bps(book: DepthBook, side: str, amount: float) -> float:
+    """Estimated cost of a market order against the mid, in bps; inf if it runs past the fetched depth"""
+    avg, filled = sweep(book.asks if side == 'buy' else book.bids, amount)
+    if filled < amount * (1 - 1e-9):
+        return float('inf')
+    sign = 1.0 if side == 'buy' else -1.0
+    return sign * (avg - book.mid) / book.mid * 10_000
+
+
+@dataclass
+class ExecutionPlan:
+    strategy: str  # MARKET / POST_ONLY / TWAP
+    slices: int  # TWAP slice count (1 otherwise)
+    mid: Optional[float]  # Pre-trade mid, the slippage reference
+    impact_bps: Optional[float]  # Estimated cost of one market order for the whole amount
+
+
+def plan_execution(book: Optional[DepthBook], side: str, amount: float, max_impact_bps: float,
+                   max_slices: int, min_slice: float) -> ExecutionPlan:
+    """
+    Cheapest way to execute within max_impact_bps. Without a book: one market order.
+    min_slice: smallest amount the exchange accepts (limits how finely the order can be split).
+    """
+    if book is None:
+        return ExecutionPlan(MARKET, 1, None, None)
+    impact = impact_bps(book, side, amount)
+    if impact <= max_impact_bps:
+        return ExecutionPlan(MARKET, 1, book.mid, impact)
+    if book.spread_bps / 2 > max_impact_bps:
+        # Even a tiny market order pays more than allowed: the spread is the cost
+        return ExecutionPlan(POST_ONLY, 1, book.mid, impact)
+    cap = int(min(max_slices, amount // min_slice if min_slice > 0 else max_slices))
+    if cap < 2:
+        return ExecutionPlan(MARKET, 1, book.mid, impact)
+    # Fewest slices that each stay within the limit (impact grows with size: bisect)
+    lo, hi = 2, cap
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if impact_bps(book, side, amount / mid) <= max_impact_bps:
+            hi = mid
+        else:
+            lo = mid + 1
+    return ExecutionPlan(TWAP, lo, book.mid, impact)
+
+
+class DepthCache:
+    def __init__(self, client, ttl_sec: Optional[float] = None, limit: Optional[int] = None):
+        """
+        深度缓存 (Depth Cache) - shared by every account; only symbols with orders are ever fetched
+        """
+        self.client = client
+        self.ttl = Config.DEPTH_TTL_SEC if ttl_sec is None else ttl_sec
+        self.limit = limit or Config.DEPTH_LIMIT
+        self.books: Dict[str, DepthBook] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[DepthBook]:
+        """Cached book if younger than max_age (default DEPTH_TTL_SEC), else a fresh one; None if unavailable"""
+        max_age = self.ttl if max_age is None else max_age
+        lock = self._locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            # Concurrent callers for one symbol wait for a single fetch
+            book = self.books.get(symbol)
+            if book is not None and time.time() - book.fetched_at <= max_age:
+                return book
+            raw = await self.client.get_order_book(symbol, self.limit)
+            book = parse_book(symbol, raw, time.time()) if raw else None
+            if book is None:
+                self.books.pop(symbol, None)
+                return None
+            self.books[symbol] = book
+            return book
+
+    async def get_many(self, symbols: Iterable[str]) -> Dict[str, Optional[DepthBook]]:
+        symbols = list(dict.fromkeys(symbols))
+        results = await asyncio.gather(*(self.get(s) for s in symbols), return_exceptions=True)
+        books = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"⚠️ Depth unavailable for {symbol}: {result}", extra={'symbol': symbol})
+                result = None
+            books[symbol] = result
+        return books
+
+    def prune(self, max_age_sec: float = 600.0):
+        """Drop books not refreshed recently (symbols no longer traded)"""
+        cutoff = time.time() - max_age_sec
+        for symbol in [s for s, b in self.books.items() if b.fetched_at < cutoff]:
+            del self.books[symbol]
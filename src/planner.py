@@ -0,0 +1,177 @@
+"""
+再平衡规划器 (Rebalance Planner)
+
+Pure, side-effect-free target/diff/threshold/limit computation over NumPy arrays.
+Shared by the live Rebalancer and offline tools (backtest, dry runs, analysis).
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Per-symbol plan status
+OK = 0
+NO_PRICE = 1
+WITHIN_THRESHOLD = 2
+BELOW_MIN_ORDER = 3
+BELOW_MIN_AMOUNT = 4
+BELOW_MIN_NOTIONAL = 5
+
+STATUS_NAMES = {
+    OK: 'ok',
+    NO_PRICE: 'no_price',
+    WITHIN_THRESHOLD: 'within_threshold',
+    BELOW_MIN_ORDER: 'below_min_order',
+    BELOW_MIN_AMOUNT: 'below_min_amount',
+    BELOW_MIN_NOTIONAL: 'below_min_notional',
+}
+
+
+@dataclass
+class OrderPlan:
+    """Column-oriented rebalance plan, one row per symbol"""
+    symbols: List[str]
+    prices: np.ndarray
+    weights: np.ndarray
+    target_value: np.ndarray
+    current_value: np.ndarray
+    diff_value: np.ndarray  # Positive = Sell, Negative = Buy
+    amount: np.ndarray  # Unsigned order quantity (0 where no order)
+    capped: np.ndarray  # bool: amount capped at max_amount
+    status: np.ndarray  # int8 status codes above
+    exit: np.ndarray  # bool: held but not in the target book, closed in full
+    reduce: np.ndarray  # bool: the order only shrinks the position (exits and trims, sent reduce-only)
+
+    @property
+    def trade_mask(self) -> np.ndarray:
+        return self.status == OK
+
+    def orders(self, reduce: Optional[bool] = None) -> List[Tuple[str, str, float, float]]:
+        """(symbol, side, amount, price) for every row that should trade (only reducing / opening ones if given)"""
+        mask = self.trade_mask if reduce is None else self.trade_mask & (self.reduce == reduce)
+        return [(self.symbols[i], 'buy' if self.diff_value[i] < 0 else 'sell',
+                 float(self.amount[i]), float(self.prices[i])) for i in np.flatnonzero(mask)]
+
+    def skipped(self, status: int) -> List[str]:
+        return [self.symbols[i] for i in np.flatnonzero(self.status == status)]
+
+
+def compute_weights(symbols: Sequence[str], explicit: Dict[str, float],
+                    relative: Optional[Callable[[List[str]], Optional[np.ndarray]]] = None) -> np.ndarray:
+    """
+    Explicit weights where configured, remaining weight split among the others:
+    by relative(others) (summing to 1) when given and it returns weights, else equally
+    """
+    w = np.array([explicit.get(s, np.nan) for s in symbols], dtype=float)
+    implicit = np.isnan(w)
+    used = np.nansum(w)
+    n_implicit = int(implicit.sum())
+    if n_implicit:
+        remaining = max(0.0, 1.0 - used)
+        split = relative([s for s, i in zip(symbols, implicit) if i]) if relative is not None else None
+        w[implicit] = remaining * split if split is not None else remaining / n_implicit
+    return w
+
+
+def plan_rebalance(symbols: Sequence[str],
+                   prices: np.ndarray,
+                   quantities: np.ndarray,
+                   weights: np.ndarray,
+                   min_amount: np.ndarray,
+                   max_amount: np.ndarray,
+                   min_cost: np.ndarray,
+                   step_size: np.ndarray,
+                   total_exposure: float,
+                   threshold: float,
+                   min_order_value: float,
+                   exits: Optional[np.ndarray] = None) -> OrderPlan:
+    """
+    计算完整下单计划 (Compute Full Order Plan)
+    prices <= 0 or NaN mean "no price". Amounts are floored to step_size.
+    exits: rows held outside the target book; they close in full (capped at max_amount)
+    without threshold or notional checks, since reduce-only orders are exempt from the minimum.
+    """
+    prices = np.asarray(prices, dtype=float)
+    quantities = np.asarray(quantities, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    min_amount = np.asarray(min_amount, dtype=float)
+    max_amount = np.asarray(max_amount, dtype=float)
+    min_cost = np.asarray(min_cost, dtype=float)
+    step_size = np.asarray(step_size, dtype=float)
+    exits = np.zeros(len(symbols), dtype=bool) if exits is None else np.asarray(exits, dtype=bool)
+
+    has_price = np.isfinite(prices) & (prices > 0)
+    safe_price = np.where(has_price, prices, 1.0)
+
+    target_value = total_exposure * weights
+    current_value = np.where(has_price, quantities * prices, 0.0)
+    diff_value = current_value - target_value
+
+    target_safe = np.where(target_value > 0, target_value, 1.0)  # avoid div by zero
+    diff_pct = diff_value / target_safe
+    abs_diff = np.abs(diff_value)
+
+    # Quantity: cap at max, floor to step
+    raw_amount = abs_diff / safe_price
+    capped = raw_amount > max_amount
+    amount = np.minimum(raw_amount, max_amount)
+    step_safe = np.where(step_size > 0, step_size, 1.0)
+    # Tolerate float error just below a step boundary (e.g. 2.9999999 -> 3 steps)
+    stepped = np.floor(amount / step_safe + 1e-9) * step_safe
+    amount = np.where(step_size > 0, stepped, amount)
+
+    # Status: first failing check wins (same order as the per-symbol loop)
+    status = np.full(len(symbols), OK, dtype=np.int8)
+    checks = (
+        (~has_price, NO_PRICE),
+        (np.abs(diff_pct) < threshold, WITHIN_THRESHOLD),
+        (abs_diff < min_order_value, BELOW_MIN_ORDER),
+        (amount < min_amount, BELOW_MIN_AMOUNT),
+        ((amount * prices < min_cost) | (amount * prices < min_order_value), BELOW_MIN_NOTIONAL),
+    )
+    for mask, code in reversed(checks):
+        status[mask] = code
+
+    # Exits: the whole position, only the exchange's quantity minimum applies
+    held = np.abs(quantities)
+    exit_amount = np.minimum(held, max_amount)
+    amount = np.where(exits, exit_amount, amount)
+    capped = np.where(exits, held > max_amount, capped)
+    status[exits] = np.where(~has_price[exits], NO_PRICE,
+                             np.where((exit_amount[exits] <= 0) | (exit_amount[exits] < min_amount[exits]),
+                                      BELOW_MIN_AMOUNT, OK))
+
+    amount = np.where(status == OK, amount, 0.0)
+    # Sells of a long / buys of a short that stay within the position
+    opposes = np.where(diff_value > 0, quantities > 0, quantities < 0)
+    reduce = (status == OK) & opposes & (amount <= held * (1 + 1e-9))
+
+    return OrderPlan(
+        symbols=list(symbols),
+        prices=prices,
+        weights=weights,
+        target_value=target_value,
+        current_value=current_value,
+        diff_value=diff_value,
+        amount=amount,
+        capped=capped & (status == OK),
+        status=status,
+        exit=exits,
+        reduce=reduce,
+    )
+
+
+def scale_to_budget(amount: np.ndarray, prices: np.ndarray, step_size: np.ndarray, min_amount: np.ndarray,
+                    min_notional: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Shrink order amounts pro rata so their notional fits `budget`; floored to step_size,
+    rows that fall below the exchange minimums become 0
+    """
+    amount = np.asarray(amount, dtype=float)
+    notional = float(np.sum(amount * prices))
+    if notional <= budget:
+        return amount
+    scaled = amount * max(0.0, budget) / notional
+    step_safe = np.where(step_size > 0, step_size, 1.0)
+    scaled = np.where(step_size > 0, np.floor(scaled / step_safe + 1e-9) * step_safe, scaled)
+    too_small = (scaled < min_amount) | (scaled * prices < min_notional) | (scaled <= 0)
+    return np.where(too_small, 0.0, scaled)
@@ -0,0 +1,157 @@
+import time
+import asyncio
+from typing import Callable, Dict, List, Optional
+from exchange import BinanceClient
+from config import Config, Settings
+from logger import logger
+
+
+class DeviationTracker:
+    def __init__(self, feed: 'PriceFeed', settings: Optional[Settings] = None):
+        """
+        偏离跟踪 (Deviation Tracker) - one account's target book on the price stream
+        Sets rebalance_needed as soon as a tracked position drifts past its account's threshold.
+        """
+        self.feed = feed
+        self.settings = settings or Config
+        self.rebalance_needed = asyncio.Event()
+        self.targets: Dict[str, float] = {}  # symbol -> target value (USDT)
+        self.positions: Dict[str, float] = {}  # symbol -> quantity
+        self.unresolved: set = set()  # Still deviating right after a cycle (e.g. below min notional)
+        self.tracked_at = 0.0
+
+    def track(self, targets: Dict[str, float], positions: Dict[str, float]):
+        """
+        跟踪目标仓位 (Track Target Book) - called by Rebalancer after each cycle
+        """
+        self.targets = dict(targets)
+        self.positions = dict(positions)
+        self.tracked_at = time.time()
+        # Deviations the last cycle could not fix would re-trigger forever; leave them to the scheduled cycle
+        self.unresolved = {s for s in self.targets if s in self.feed.prices and self._deviates(s)}
+        self.rebalance_needed.clear()
+
+    def check(self, updates: Dict[str, float], now: float):
+        if (self.targets and not self.rebalance_needed.is_set()
+                and now - self.tracked_at >= self.settings.REBALANCE_COOLDOWN_SEC):
+            for symbol in updates:
+                if symbol in self.targets and symbol not in self.unresolved and self._deviates(symbol):
+                    logger.info(f"⚡ {symbol} deviated past {self.settings.REBALANCE_THRESHOLD_PCT:.1%} threshold")
+                    self.rebalance_needed.set()
+                    break
+
+    def _deviates(self, symbol: str) -> bool:
+        """Same threshold rule as Rebalancer: |value - target| / target >= threshold and above min order"""
+        target_val = self.targets[symbol]
+        diff_value = self.positions.get(symbol, 0.0) * self.feed.prices[symbol] - target_val
+        target_val_safe = target_val if target_val > 0 else 1.0
+        return (abs(diff_value / target_val_safe) >= self.settings.REBALANCE_THRESHOLD_PCT
+                and abs(diff_value) >= self.settings.MIN_ORDER_VALUE)
+
+
+class PriceFeed:
+    def __init__(self, client: BinanceClient):
+        """
+        实时价格簿 (Live Price Book) - mark price stream via ccxt.pro
+        Replaces per-cycle REST price polling and flags deviations as soon as they happen.
+        """
+        self.client = client
+        self.exchange = None  # ccxt.pro instance, created on start()
+        self.prices: Dict[str, float] = {}  # symbol -> mark price
+        self.updated_at: Dict[str, float] = {}  # symbol -> time of last update
+        self.last_message = 0.0
+        
+        # One target book per account sharing this stream
+        self.trackers: List[DeviationTracker] = []
+        
+        # Callbacks invoked with {symbol: price} for every batch of updates
+        self.listeners: List[Callable[[Dict[str, float]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_live(self) -> bool:
+        return (time.time() - self.last_message) < Config.PRICE_STREAM_STALE_SEC
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self.exchange = self.client.create_stream_exchange()
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.exchange:
+            await self.exchange.close()
+
+    def get_prices(self, symbols: Optional[List[str]] = None, max_age: Optional[float] = None) -> Dict[str, float]:
+        """Prices from the book, optionally only those updated within max_age seconds"""
+        if symbols is None:
+            symbols = list(self.prices.keys())
+        now = time.time()
+        result = {}
+        for symbol in symbols:
+            price = self.prices.get(symbol)
+            if price is None:
+                continue
+            if max_age is not None and now - self.updated_at.get(symbol, 0.0) > max_age:
+                continue
+            result[symbol] = price
+        return result
+
+    def tracker_for(self, settings: Optional[Settings] = None) -> DeviationTracker:
+        """The target book of the account with these settings (created on first use)"""
+        settings = settings or Config
+        for tracker in self.trackers:
+            if tracker.settings is settings:
+                return tracker
+        tracker = DeviationTracker(self, settings)
+        self.trackers.append(tracker)
+        return tracker
+
+    def add_listener(self, callback: Callable[[Dict[str, float]], None]):
+        self.listeners.append(callback)
+
+    def on_prices(self, updates: Dict[str, float]):
+        """Apply a batch of price updates to the book and check tracked deviations"""
+        now = time.time()
+        self.last_message = now
+        for symbol, price in updates.items():
+            self.prices[symbol] = price
+            self.updated_at[symbol] = now
+        
+        for tracker in self.trackers:
+            tracker.check(updates, now)
+        
+        for callback in self.listeners:
+            try:
+                callback(updates)
+            except Exception as e:
+                logger.error(f"❌ Price listener failed: {e}")
+
+    async def _run(self):
+        """Stream loop with reconnect backoff"""
+        backoff = 1.0
+        logger.info("📡 Price stream starting (all-market mark prices)")
+        while True:
+            try:
+                # One all-market stream (!markPrice@arr@1s) covers the whole universe without resubscribing
+                tickers = await self.exchange.watch_mark_prices()
+                updates = {}
+                for symbol, t in tickers.items():
+                    price = t.get('markPrice') or t.get('last')
+                    if price:
+                        updates[symbol] = float(price)
+                if updates:
+                    self.on_prices(updates)
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Price stream error: {e}. Reconnecting in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
@@ -1,155 +1,286 @@
 import time
 import asyncio
-from typing import List, Dict
+import numpy as np
+from typing import List, Dict, Optional, Set
 from exchange import BinanceClient
 from risk_manager import RiskManager
-from config import Config
+from executor import OrderExecutor, OrderRequest
+from snapshot import CycleSnapshot, SnapshotBuilder
+from price_feed import PriceFeed
+from journal import TradeJournal
+from risk_monitor import flatten_orders
+from market_index import DEFAULT_LIMITS, perp_symbol
+from weighting import WeightEngine
+from order_book import DepthCache
+from planner import OrderPlan, compute_weights, plan_rebalance, scale_to_budget, BELOW_MIN_AMOUNT, BELOW_MIN_NOTIONAL, NO_PRICE, OK, STATUS_NAMES
+from metrics import metrics
 from logger import logger
 
 class Rebalancer:
-    def __init__(self, client: BinanceClient, risk_manager: RiskManager):
+    def __init__(self, client: BinanceClient, risk_manager: RiskManager, price_feed: Optional[PriceFeed] = None,
+                 journal: Optional[TradeJournal] = None, weights: Optional[WeightEngine] = None,
+                 depth: Optional[DepthCache] = None):
         self.client = client
         self.rm = risk_manager
+        # Strategy settings of this account (weights, leverage, thresholds)
+        self.settings = risk_manager.settings
+        # Order books for impact-aware execution (all market orders without them)
+        self.executor = OrderExecutor(client, journal=journal, ledger=risk_manager.ledger, depth=depth,
+                                      should_stop=lambda: self.rm.halted)
+        self.price_feed = price_feed
+        self.tracker = price_feed.tracker_for(self.settings) if price_feed is not None else None
+        # Covariance-based split of the weight not pinned by COIN_WEIGHTS (equal split without it)
+        self.weights = weights
 
-    async def rebalance(self, target_coins: List[str]):
+    def total_exposure(self, current_equity: float) -> float:
         """
-        核心再平衡逻辑 (Core Rebalance Logic) - Async
+        目标总敞口 (Target Total Exposure)
         """
-        logger.info(f"--- ⚖️ Starting Rebalance Cycle ---")
-        
-        # 1. Get Account Info
-        balance = await self.client.get_account_balance()
-        current_equity = balance['total_equity']
-        logger.info(f"💰 Account Equity: {current_equity:.2f} USDT")
-
-        # 2. Risk Check
-        if self.rm.check_hard_stop(current_equity):
-            logger.critical("🛑 STOPPING BOT DUE TO RISK LIMIT")
-            return
-
-        # 3. Get Data
-        prices = await self.client.get_market_prices(target_coins)
-        positions = await self.client.get_cw_positions() # {symbol: quantity}
-
-        # 4. Limit Target Coins
-        # If scanner returns more than limit, take top N
-        if len(target_coins) > Config.MAX_OPEN_POSITIONS:
-            target_coins = target_coins[:Config.MAX_OPEN_POSITIONS]
-            
-        logger.info(f"🎯 Target Portfolio: {len(target_coins)} Assets")
-        
-        # 5. Calculate Weights & Targets
         # Target based on Effective Leverage
-        target_exposure_lev = current_equity * Config.EFFECTIVE_LEVERAGE
+        target_exposure_lev = current_equity * self.settings.EFFECTIVE_LEVERAGE
         
         # Target based on Max Margin Utilization (Safety Cap)
         # Max Exposure = Equity * MaxMarginPct * AccountLeverage
-        max_exposure_margin = current_equity * Config.MAX_MARGIN_UTILIZATION_PCT * Config.LEVERAGE
+        max_exposure_margin = current_equity * self.settings.MAX_MARGIN_UTILIZATION_PCT * self.settings.LEVERAGE
         
         # Take the smaller of the two to be safe
         total_exposure_target = min(target_exposure_lev, max_exposure_margin)
         
         if total_exposure_target != target_exposure_lev:
             logger.warning(f"⚠️ Target Exposure capped by Max Margin Ratio: {total_exposure_target:.2f} (Requested: {target_exposure_lev:.2f})")
+        return total_exposure_target
+
+    async def plan(self, target_coins: List[str], snapshot: CycleSnapshot, skip: Optional[Set[str]] = None,
+                   allow_exits: bool = True) -> OrderPlan:
+        """
+        生成下单计划 (Build Order Plan) - no orders are sent
+        Covers the whole portfolio: the target coins plus every held position outside them,
+        which is planned as a full exit. skip: held symbols handled elsewhere (stop-outs).
+        allow_exits=False (fallback or restored target list): positions outside it are left alone.
+        """
+        # Limit Target Coins
+        # If scanner returns more than limit, take top N
+        target_coins = list(dict.fromkeys(target_coins))
+        if len(target_coins) > self.settings.MAX_OPEN_POSITIONS:
+            target_coins = target_coins[:self.settings.MAX_OPEN_POSITIONS]
+        
+        positions = snapshot.positions # {symbol: quantity}
+        skip = skip or set()
+        targets = set(target_coins)
+        exits = [s for s, q in positions.items() if q != 0 and s not in targets and s not in skip]
+        if exits and not allow_exits:
+            logger.warning(f"🔒 Target list is not a full scan: keeping {len(exits)} positions outside it this cycle")
+            exits = []
+        symbols = target_coins + exits
+        prices = snapshot.prices(symbols)
         
-        # Determine weights
-        # a. Explicit weights
-        explicit_weights = {}
-        used_weight_sum = 0.0
-        remaining_coins = []
+        # Exchange Limits (in-memory market index, loaded once on a cold start)
+        index = self.client.market_index
+        if not index.limits:
+            await self.client.load_markets()
+        all_limits = [index.get(s) or DEFAULT_LIMITS for s in symbols]
         
-        for coin in target_coins:
-            if coin in Config.COIN_WEIGHTS:
-                w = Config.COIN_WEIGHTS[coin]
-                explicit_weights[coin] = w
-                used_weight_sum += w
+        explicit = {perp_symbol(k): v for k, v in self.settings.COIN_WEIGHTS.items()}
+        relative = None
+        if self.weights is not None:
+            def relative(others: List[str]):
+                return self.weights.relative(others, self.settings.WEIGHTING_METHOD, self.settings.WEIGHT_MAX_SHARE)
+        
+        return plan_rebalance(
+            symbols,
+            prices=np.array([prices.get(s, np.nan) for s in symbols], dtype=float),
+            quantities=np.array([positions.get(s, 0.0) for s in symbols], dtype=float),
+            weights=np.concatenate([compute_weights(target_coins, explicit, relative), np.zeros(len(exits))]),
+            min_amount=np.array([l.min_amount for l in all_limits], dtype=float),
+            max_amount=np.array([l.max_amount for l in all_limits], dtype=float),
+            min_cost=np.array([l.min_cost for l in all_limits], dtype=float),
+            step_size=np.array([l.step_size for l in all_limits], dtype=float),
+            total_exposure=self.total_exposure(snapshot.balance['total_equity']),
+            threshold=self.settings.REBALANCE_THRESHOLD_PCT,
+            min_order_value=self.settings.MIN_ORDER_VALUE,
+            exits=np.arange(len(symbols)) >= len(target_coins),
+        )
+
+    async def confirm_free_margin(self, snapshot: CycleSnapshot) -> float:
+        """
+        确认可用保证金 (Confirm Free Margin) - after the reduce-only phase, straight from the exchange
+        Falls back to the snapshot value if the balance call fails.
+        """
+        balance = await self.client.get_account_balance()
+        if balance['total_equity'] <= 0:
+            logger.warning("⚠️ Balance check failed, using the snapshot free margin")
+            return snapshot.balance['free_margin']
+        return balance['free_margin']
+
+    def fit_to_margin(self, orders: List[OrderRequest], free_margin: float) -> List[OrderRequest]:
+        """
+        Shrink opening orders pro rata so their initial margin fits the free margin
+        (minus MARGIN_BUFFER_PCT); orders pushed below the exchange minimums are dropped.
+        """
+        if not orders:
+            return orders
+        budget = free_margin * self.settings.LEVERAGE * (1 - self.settings.MARGIN_BUFFER_PCT)
+        limits = [self.client.market_index.get(o.symbol) or DEFAULT_LIMITS for o in orders]
+        amount = np.array([o.amount for o in orders], dtype=float)
+        prices = np.array([o.price for o in orders], dtype=float)
+        notional = float(amount @ prices)
+        if notional <= budget:
+            return orders
+        logger.warning(f"⚠️ Opening orders ({notional:.2f} USDT) exceed free margin capacity ({budget:.2f} USDT), scaling down")
+        scaled = scale_to_budget(
+            amount, prices,
+            step_size=np.array([l.step_size for l in limits], dtype=float),
+            min_amount=np.array([l.min_amount for l in limits], dtype=float),
+            min_notional=np.maximum(np.array([l.min_cost for l in limits], dtype=float), self.settings.MIN_ORDER_VALUE),
+            budget=budget)
+        fitted = []
+        for o, a in zip(orders, scaled.tolist()):
+            if a > 0:
+                o.amount = a
+                fitted.append(o)
             else:
-                remaining_coins.append(coin)
+                metrics.inc('orders_total', result='skipped', reason='margin')
+        return fitted
+
+    async def _send(self, orders: List[OrderRequest], expected_positions: Dict[str, float]):
+        """Execute one phase and fold accepted orders into the expected positions"""
+        with metrics.span('execute'):
+            results = await self.executor.execute(orders)
+        for r in results:
+            metrics.inc('orders_total', result='placed' if r.ok else 'rejected', reason=r.request.reason if r.ok else 'exchange')
+            if r.ok and r.request.reason == 'stop':
+                self.rm.mark_stopped(r.request.symbol)
+            if r.ok:
+                signed = r.filled if r.request.side == 'buy' else -r.filled
+                expected_positions[r.request.symbol] = expected_positions.get(r.request.symbol, 0.0) + signed
+
+    async def rebalance(self, target_coins: List[str], snapshot: Optional[CycleSnapshot] = None,
+                        allow_exits: bool = True):
+        """
+        核心再平衡逻辑 (Core Rebalance Logic) - Async
+        Reads account and market data from the cycle snapshot (taken here if not supplied).
+        Two phases: reduce-only orders (stops, exits, trims) go out together first; once the
+        margin they free is confirmed, the opening orders are sized to it and sent together.
+        allow_exits: False when target_coins is a fallback or restored list rather than a full scan.
+        """
+        logger.info(f"--- ⚖️ Starting Rebalance Cycle ---")
         
-        # b. Implicit weights (Equal distribution of remaining)
-        remaining_weight = max(0.0, 1.0 - used_weight_sum)
-        implicit_w = 0.0
-        if remaining_coins:
-             implicit_w = remaining_weight / len(remaining_coins)
-             
-        # Log Allocation Plan
-        logger.info(f"📊 Allocation Plan (Total Exposure: {total_exposure_target:.2f} USDT):")
+        if snapshot is None:
+            snapshot = await SnapshotBuilder(self.client).take()
         
-        # 6. Process Trades
-        for symbol in target_coins:
-            if symbol not in prices:
-                logger.warning(f"⚠️ No price for {symbol}, skipping")
-                continue
-                
-            price = prices[symbol]
-            current_qty = positions.get(symbol, 0.0)
-            current_value = current_qty * price
-            
-            # Determine Target Value
-            weight = explicit_weights.get(symbol, implicit_w)
-            target_val = total_exposure_target * weight
-            
-            logger.info(f"   🔹 {symbol}: Weight {weight*100:.1f}% -> Target {target_val:.2f} USDT (Curr: {current_value:.2f})")
-            
-            diff_value = current_value - target_val # Positive = Sell, Negative = Buy
-            
-            # Risk Check: Max Position Drawdown
-            # (We need entry price to calc drawdown properly, but here we can check if 
-            # current value is significantly lower than what we bought? 
-            # Without entry price history, strict PnL stop loss is hard in this simple loop.
-            # Assuming 'rebalance' fixes it.
-            # BUT user asked for "Max Drawdown Per Coin".
-            # We can request UnRealized PnL from Position Data if available.
-            
-            # Threshold Check
-            target_val_safe = target_val if target_val > 0 else 1.0 # avoid div by zero
-            diff_pct = diff_value / target_val_safe
-            
-            threshold = Config.REBALANCE_THRESHOLD_PCT
-            
-            action = None
-            amount_input = 0.0
-            
-            # Logic:
-            # If diff > 0 (Surplus) -> Sell (value to sell = diff_value)
-            # If diff < 0 (Deficit) -> Buy (value to buy = -diff_value)
-            
-            if abs(diff_pct) < threshold:
-                continue
+        # 1. Get Account Info
+        balance = snapshot.balance
+        current_equity = balance['total_equity']
+        logger.info(f"💰 Account Equity: {current_equity:.2f} USDT")
 
-            # MIN ORDER SIZE CHECK
-            # Check Global Min Order Value (Config)
-            if abs(diff_value) < Config.MIN_ORDER_VALUE:
-                continue
+        # 2. Risk Check
+        if self.rm.check_hard_stop(current_equity):
+            logger.critical("🛑 STOPPING BOT DUE TO RISK LIMIT")
+            if self.tracker is not None:
+                # Stop deviation-triggered rebalances (the scheduled cycle keeps retrying the flatten)
+                self.tracker.track({}, {})
+            if snapshot.positions:
+                # Close everything (reduce-only, concurrent); repeated each cycle until flat
+                orders = flatten_orders(snapshot.positions, snapshot.prices(list(snapshot.positions)))
+                logger.critical(f"🚨 Flattening {len(orders)} positions")
+                results = await self.executor.execute(orders)
+                for r in results:
+                    metrics.inc('orders_total', result='placed' if r.ok else 'rejected', reason='flatten')
+                self.rm.ledger.save()
+            return
 
-            # Check Exchange Limits (Dynamic)
-            limits = await self.client.get_symbol_limits(symbol)
-            if price <= 0:
+        # 2b. Per-position stops (ledger reconciled with the exchange view first)
+        held_prices = snapshot.prices(list(snapshot.positions))
+        self.rm.ledger.sync(snapshot.positions, held_prices)
+        stop_orders: List[OrderRequest] = []
+        for symbol in self.rm.position_stops(held_prices):
+            qty = snapshot.positions.get(symbol, 0.0)
+            if qty == 0:
+                self.rm.mark_stopped(symbol)
                 continue
+            logger.warning(f"🛑 Closing {symbol}: position stop ({self.settings.MAX_POS_DRAWDOWN_PCT:.0%} from peak)")
+            stop_orders.append(OrderRequest(symbol, 'sell' if qty > 0 else 'buy', abs(qty), held_prices.get(symbol),
+                                            {'reduceOnly': True}, reason='stop'))
+        held_values = {s: q * held_prices[s] for s, q in snapshot.positions.items() if s in held_prices and q != 0}
+        daily_vol = self.rm.portfolio_volatility(held_values)
+        if daily_vol is not None and current_equity > 0:
+            logger.info(f"📉 Portfolio volatility: {daily_vol:.2f} USDT/day ({daily_vol / current_equity:.1%} of equity)")
+        stopped = {o.symbol for o in stop_orders}
+        target_coins = [c for c in target_coins if c not in stopped and not self.rm.in_cooldown(c)]
 
-            amount = abs(diff_value) / price
-            
-            # Check Min Quantity
-            if amount < limits['min_amount']:
-                logger.warning(f"⚠️ Skipping {symbol}: Amount {amount:.6f} < Min {limits['min_amount']}")
+        # 3. Plan (weights, targets, threshold and limit checks - vectorized)
+        with metrics.span('plan'):
+            plan = await self.plan(target_coins, snapshot, skip=stopped, allow_exits=allow_exits)
+        logger.info(f"🎯 Target Portfolio: {int((~plan.exit).sum())} Assets")
+        logger.info(f"📊 Allocation Plan (Total Exposure: {plan.target_value.sum():.2f} USDT):")
+        
+        for i, symbol in enumerate(plan.symbols):
+            if plan.status[i] == NO_PRICE:
+                logger.warning(f"⚠️ No price for {symbol}, skipping")
                 continue
-                
-            # Check Max Quantity (Fix for -4005)
-            if amount > limits['max_amount']:
-                logger.warning(f"⚠️ Capping {symbol}: Amount {amount:.6f} -> Max {limits['max_amount']}")
-                amount = limits['max_amount']
-                
-            # Check Min Notional (Cost)
-            actual_value = amount * price
-            if actual_value < limits['min_cost']:
-                logger.warning(f"⚠️ Skipping {symbol}: Value {actual_value:.2f} < Min Notional {limits['min_cost']}")
+            if plan.exit[i]:
+                logger.info(f"   🔻 {symbol}: not in target, closing (Curr: {plan.current_value[i]:.2f})", extra={'symbol': symbol})
+                if plan.status[i] == BELOW_MIN_AMOUNT:
+                    logger.warning(f"⚠️ Skipping {symbol}: Amount below exchange minimum")
                 continue
-
-            # Execute
-            side = 'buy' if diff_value < 0 else 'sell'
-            
+            logger.info(f"   🔹 {symbol}: Weight {plan.weights[i]*100:.1f}% -> Target {plan.target_value[i]:.2f} USDT (Curr: {plan.current_value[i]:.2f})", extra={'symbol': symbol})
+            if plan.status[i] == BELOW_MIN_AMOUNT:
+                logger.warning(f"⚠️ Skipping {symbol}: Amount below exchange minimum")
+            elif plan.status[i] == BELOW_MIN_NOTIONAL:
+                logger.warning(f"⚠️ Skipping {symbol}: Value below Min Notional")
+            elif plan.capped[i]:
+                logger.warning(f"⚠️ Capping {symbol}: Amount -> Max {plan.amount[i]}")
+        
+        for status in np.unique(plan.status):
+            if status != OK:
+                metrics.inc('orders_total', int((plan.status == status).sum()), result='skipped', reason=STATUS_NAMES[int(status)])
+        
+        # 4. Build the order lists: reduce-only (stop-outs, exits, trims) and opening
+        reducing: List[OrderRequest] = list(stop_orders)
+        exits = set(np.array(plan.symbols, dtype=object)[plan.exit].tolist())
+        for symbol, side, amount, price in plan.orders(reduce=True):
+            # Shrinking a position needs no risk check
+            reducing.append(OrderRequest(symbol, side, amount, price, {'reduceOnly': True},
+                                         reason='exit' if symbol in exits else 'rebalance'))
+        opening: List[OrderRequest] = []
+        for symbol, side, amount, price in plan.orders(reduce=False):
             # Risk Validation
             if self.rm.validate_order(symbol, amount, price):
-                await self.client.place_order(symbol, side, amount, price)
+                opening.append(OrderRequest(symbol, side, amount, price))
+            else:
+                metrics.inc('orders_total', result='skipped', reason='risk')
+
+        # 5. Execute (concurrent / batched), reductions first
+        expected_positions = dict(snapshot.positions)
+        if self.rm.halted:
+            # The risk monitor tripped while this cycle was planning
+            logger.critical("🛑 Trading halted, dropping planned orders")
+            return
+        free_margin = balance['free_margin']
+        if reducing:
+            logger.info(f"📤 Sending {len(reducing)} reduce-only orders...")
+            await self._send(reducing, expected_positions)
+            if self.rm.halted:
+                logger.critical("🛑 Trading halted, dropping opening orders")
+                self.rm.ledger.save()
+                return
+            if opening:
+                free_margin = await self.confirm_free_margin(snapshot)
+                logger.info(f"💳 Free margin after reductions: {free_margin:.2f} USDT")
+        opening = self.fit_to_margin(opening, free_margin)
+        if opening:
+            logger.info(f"📤 Sending {len(opening)} opening orders...")
+            await self._send(opening, expected_positions)
+        
+        self.rm.ledger.save()
+        if self.rm.halted:
+            # Halted while orders were being worked: no target book to track
+            logger.critical("🛑 Trading halted during execution")
+            return
+        
+        # 6. Hand the new target book to the price stream for deviation triggers
+        if self.tracker is not None:
+            targets = {s: v for s, v, out in zip(plan.symbols, plan.target_value.tolist(), plan.exit.tolist()) if not out}
+            self.tracker.track(targets, expected_positions)
                 
         logger.info("--- ✅ Rebalance Cycle Complete ---\n")
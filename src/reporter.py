@@ -1,35 +1,31 @@
-import csv
-import os
-import time
+from typing import Optional
+from journal import TradeJournal, TimeArg
+from ledger import PositionLedger
 
 class Reporter:
-    def __init__(self, log_file="data/trades.csv"):
-        self.log_file = log_file
-        # Ensure data dir exists
-        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
-        self._init_csv()
+    def __init__(self, journal: Optional[TradeJournal] = None, ledger: Optional[PositionLedger] = None):
+        # Trades are kept in the SQLite trade journal (data/journal.db)
+        self.journal = journal or TradeJournal()
+        self.ledger = ledger
 
-    def _init_csv(self):
-        """Initialize CSV with headers if not exists"""
-        if not os.path.exists(self.log_file):
-            with open(self.log_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['timestamp', 'symbol', 'side', 'amount', 'price', 'value', 'pnl'])
+    def log_trade(self, symbol, side, amount, price, value=None, pnl=None):
+        """Log trade to the journal (buffered); realized PnL comes from the ledger when attached"""
+        realized = self.ledger.on_fill(symbol, side, amount, price) if self.ledger is not None else (pnl or 0.0)
+        self.journal.record(symbol, side, amount, price, realized_pnl=realized, reason='manual')
+        print(f"📝 Logged trade: {symbol} {side} {amount}")
+        return realized
 
-    def log_trade(self, symbol, side, amount, price, value, pnl=0):
-        """Log trade to CSV"""
-        with open(self.log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                time.strftime("%Y-%m-%d %H:%M:%S"),
-                symbol,
-                side,
-                amount,
-                price,
-                value,
-                pnl
-            ])
-            print(f"📝 Logged trade: {symbol} {side} {amount}")
+    def report(self, start: TimeArg = None, end: TimeArg = None, symbol: Optional[str] = None):
+        """Print per-symbol realized PnL, turnover and fees for [start, end)"""
+        table = self.journal.summary(start, end, symbol)
+        if table.empty:
+            print("📭 No trades in range")
+            return table
+        print(table.to_string(float_format=lambda v: f"{v:,.4f}"))
+        totals = table.sum()
+        print(f"💰 Realized {totals['realized_pnl']:.2f} | Fees {totals['fees']:.2f} | "
+              f"Net {totals['net_pnl']:.2f} | Turnover {totals['turnover']:.2f} USDT ({int(totals['trades'])} trades)")
+        return table
 
     def send_notification(self, message):
         """
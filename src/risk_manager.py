@@ -1,19 +1,168 @@
-from config import Config
+import os
+import json
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from config import Config, Settings
+from ledger import PositionLedger
+from ohlcv_store import OHLCVStore
+from logger import logger
 
 class RiskManager:
-    def __init__(self):
-        self.initial_equity = Config.INITIAL_EQUITY
-        self.stop_loss_equity = self.initial_equity * (1 - Config.MAX_DRAWDOWN_PCT) # e.g. 200 * 0.7 = 140
+    def __init__(self, ledger: Optional[PositionLedger] = None, clock=time.time,
+                 initial_equity: Optional[float] = None, state_file: Optional[str] = None,
+                 settings: Optional[Settings] = None, history: Optional[OHLCVStore] = None):
+        # Risk limits of this account (the global Config unless a profile is given)
+        self.settings = settings or Config
+        self.initial_equity = self.settings.INITIAL_EQUITY if initial_equity is None else initial_equity
+        self.stop_loss_equity = self.initial_equity * (1 - self.settings.MAX_DRAWDOWN_PCT) # e.g. 200 * 0.7 = 140
+        
+        # Equity high-water mark and kill switch (persisted when state_file is set)
+        self.state_file = state_file
+        self.high_water = self.initial_equity
+        self.halted = False
+        self.halt_reason = ''
+        self._saved_at = 0.0
+        if state_file:
+            self._load_state()
+        
+        # Per-position stops (entry / peak prices from the ledger)
+        self.ledger = ledger if ledger is not None else PositionLedger(clock=clock)
+        self.clock = clock
+        self.pending_stops: set = set()  # Triggered on a price update, not yet closed
+        self.stopped_at: Dict[str, float] = {}  # symbol -> time the stop was executed
+        
+        # Local bar history (shared by every account), read without refetching candles
+        self.history = history
+
+    def evaluate_equity(self, current_equity: float) -> Optional[str]:
+        """
+        权益回撤检查 (Equity Drawdown Check) - updates the high-water mark
+        Returns the breach reason, or None. Cheap enough to run on every update.
+        """
+        if current_equity <= 0:
+            # Failed fetches report 0 equity; never act on that
+            return None
+        if current_equity > self.high_water:
+            self.high_water = current_equity
+            if self.clock() - self._saved_at > 60:
+                self._save_state()
+        if current_equity < self.stop_loss_equity:
+            return f"Equity {current_equity:.2f} < Limit {self.stop_loss_equity:.2f}"
+        peak_limit = self.high_water * (1 - self.settings.MAX_PEAK_DRAWDOWN_PCT)
+        if self.settings.MAX_PEAK_DRAWDOWN_PCT > 0 and current_equity < peak_limit:
+            return f"Equity {current_equity:.2f} < {peak_limit:.2f} ({self.settings.MAX_PEAK_DRAWDOWN_PCT:.0%} below peak {self.high_water:.2f})"
+        return None
+
+    def halt(self, reason: str):
+        """Kill switch: no new risk until the state file is removed"""
+        if not self.halted:
+            self.halted = True
+            self.halt_reason = reason
+            self._save_state()
 
     def check_hard_stop(self, current_equity: float) -> bool:
         """
         检查是否触发硬止损 (Check Hard Stop Loss)
-        Returns: True if STOP triggered (Equity too low)
+        Returns: True if STOP triggered (Equity too low, or already halted)
         """
-        if current_equity < self.stop_loss_equity:
-            print(f"🚨 ALERT: Hard Stop Triggered! Equity {current_equity:.2f} < Limit {self.stop_loss_equity:.2f}")
+        if self.halted:
+            return True
+        reason = self.evaluate_equity(current_equity)
+        if reason:
+            logger.critical(f"🚨 ALERT: Hard Stop Triggered! {reason}")
+            self.halt(reason)
             return True
         return False
+
+    def _load_state(self):
+        try:
+            if not os.path.exists(self.state_file):
+                return
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+            self.high_water = max(self.high_water, float(data.get('high_water', 0.0)))
+            self.halted = bool(data.get('halted', False))
+            self.halt_reason = data.get('halt_reason', '')
+            if self.halted:
+                logger.critical(f"🛑 Trading halted ({self.halt_reason}). Remove {self.state_file} to resume.")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load risk state: {e}")
+
+    def _save_state(self):
+        """Atomic write (tmp file + rename)"""
+        self._saved_at = self.clock()
+        if not self.state_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+            tmp = self.state_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'high_water': self.high_water, 'halted': self.halted,
+                           'halt_reason': self.halt_reason, 'saved_at': time.time()}, f)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save risk state: {e}")
+
+    def check_position_stop(self, symbol: str, price: Optional[float] = None) -> bool:
+        """
+        检查单仓止损 (Check Position Stop) - O(1)
+        True if the position is down MAX_POS_DRAWDOWN_PCT from its best price since entry.
+        """
+        entry = self.ledger.mark(symbol, price) if price else self.ledger.entries.get(symbol)
+        return entry is not None and entry.drawdown >= self.settings.MAX_POS_DRAWDOWN_PCT
+
+    def on_prices(self, updates: Dict[str, float]) -> List[str]:
+        """Price listener: mark the ledger and queue positions whose stop triggered; returns new triggers"""
+        entries = self.ledger.entries
+        triggered = []
+        for symbol, price in updates.items():
+            if symbol in entries and self.check_position_stop(symbol, price) and symbol not in self.pending_stops:
+                self.pending_stops.add(symbol)
+                triggered.append(symbol)
+                logger.warning(f"🛑 Position stop triggered: {symbol} down {entries[symbol].drawdown:.1%} from peak")
+        return triggered
+
+    def position_stops(self, prices: Dict[str, float]) -> List[str]:
+        """Held symbols whose stop has triggered at these prices (plus any queued by the price stream)"""
+        triggered = set(self.pending_stops)
+        for symbol in list(self.ledger.entries):
+            if self.check_position_stop(symbol, prices.get(symbol)):
+                triggered.add(symbol)
+        return sorted(triggered)
+
+    def mark_stopped(self, symbol: str):
+        """Start the re-entry cooldown for a closed position"""
+        self.pending_stops.discard(symbol)
+        self.stopped_at[symbol] = self.clock()
+
+    def in_cooldown(self, symbol: str) -> bool:
+        stopped = self.stopped_at.get(symbol)
+        if stopped is None:
+            return False
+        if self.clock() - stopped >= self.settings.POSITION_STOP_COOLDOWN_MINUTES * 60:
+            del self.stopped_at[symbol]
+            return False
+        return True
+    
+    def portfolio_volatility(self, values: Dict[str, float], bars: Optional[int] = None) -> Optional[float]:
+        """
+        组合波动率 (Portfolio Volatility) - 1-day standard deviation of the positions' value (USDT)
+        From stored bars (sample covariance of log returns over `bars`, default OHLCV_HISTORY_BARS),
+        None without enough history.
+        """
+        if self.history is None or not values:
+            return None
+        bars = bars or self.settings.OHLCV_HISTORY_BARS
+        symbols = list(values)
+        returns = self.history.log_returns(symbols, bars)
+        returns = returns[np.isfinite(returns).all(axis=1)]
+        if len(returns) < max(2, bars // 2):
+            return None
+        exposure = np.array([values[s] for s in symbols])
+        cov = np.atleast_2d(np.cov(returns, rowvar=False))
+        bars_per_day = 86_400_000 / self.history.tf_ms
+        return float(np.sqrt(max(0.0, exposure @ cov @ exposure) * bars_per_day))
     
     def validate_order(self, symbol: str, quantity: float, price: float) -> bool:
         """
@@ -24,7 +173,7 @@ class RiskManager:
         
         # Min Value Check (Double check here just in case)
         notional = quantity * price
-        if notional < Config.MIN_ORDER_VALUE:
+        if notional < self.settings.MIN_ORDER_VALUE:
             # print(f"⚠️ Risk Manager: Order value {notional:.2f} too small for {symbol}")
             return False
             
@@ -0,0 +1,136 @@
+"""
+实时风控 (Real-Time Risk Monitor)
+
+A dedicated task that re-evaluates account equity on every price-stream or user-stream
+update (zero round-trips: equity comes from AccountState marked to the live price book)
+and, on a breach, flattens every position at once with reduce-only orders in parallel.
+"""
+import time
+import asyncio
+from typing import Dict, List, Optional
+from exchange import BinanceClient
+from executor import OrderExecutor, OrderRequest
+from risk_manager import RiskManager
+from account_state import AccountState
+from price_feed import PriceFeed
+from journal import TradeJournal
+from metrics import metrics
+from config import Config
+from logger import logger
+
+# Flatten sends everything at once (batches of 5 are still used when supported)
+FLATTEN_CONCURRENCY = 50
+FLATTEN_ATTEMPTS = 3
+
+
+def flatten_orders(positions: Dict[str, float], prices: Dict[str, float]) -> List[OrderRequest]:
+    """Reduce-only market orders that close every position"""
+    return [
+        OrderRequest(symbol, 'sell' if qty > 0 else 'buy', abs(qty), prices.get(symbol),
+                     {'reduceOnly': True}, reason='flatten')
+        for symbol, qty in positions.items() if qty != 0
+    ]
+
+
+class RiskMonitor:
+    def __init__(self, client: BinanceClient, risk_manager: RiskManager,
+                 account_state: Optional[AccountState] = None, price_feed: Optional[PriceFeed] = None,
+                 journal: Optional[TradeJournal] = None):
+        """
+        初始化风控监视器 (Initialize Risk Monitor)
+        """
+        self.client = client
+        self.rm = risk_manager
+        self.account_state = account_state
+        self.price_feed = price_feed
+        self.tracker = price_feed.tracker_for(risk_manager.settings) if price_feed is not None else None
+        self.executor = OrderExecutor(client, max_concurrency=FLATTEN_CONCURRENCY,
+                                      journal=journal, ledger=risk_manager.ledger)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            if self.price_feed is not None:
+                self.price_feed.add_listener(lambda updates: self._wake.set())
+            if self.account_state is not None:
+                self.account_state.add_listener(self._wake.set)
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def _stream_live(self) -> bool:
+        return self.account_state is not None and self.account_state.is_live
+
+    async def _positions(self) -> Dict[str, float]:
+        if self._stream_live:
+            return self.account_state.get_positions()
+        return await self.client.get_cw_positions()
+
+    async def _run(self):
+        while True:
+            try:
+                polled = False
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=Config.RISK_POLL_SEC)
+                except asyncio.TimeoutError:
+                    polled = True
+                self._wake.clear()
+
+                if self.rm.halted:
+                    # Already flattened (or flattening); nothing left to watch
+                    continue
+                if self._stream_live:
+                    equity = self.account_state.get_balance()['total_equity']
+                elif polled:
+                    # No account stream: REST equity on the poll interval only, not per price tick
+                    equity = (await self.client.get_account_balance())['total_equity']
+                else:
+                    continue
+
+                reason = self.rm.evaluate_equity(equity)
+                if reason:
+                    await self.flatten(reason)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Risk monitor error: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def flatten(self, reason: str):
+        """
+        紧急平仓 (Emergency Flatten) - halt, then close every position concurrently
+        Retries whatever is still open (rejections, partial fills) a few times.
+        """
+        self.rm.halt(reason)
+        logger.critical(f"🚨 RISK BREACH: {reason}. Flattening all positions")
+        if self.tracker is not None:
+            # Stop deviation-triggered rebalances
+            self.tracker.track({}, {})
+
+        start = time.perf_counter()
+        for attempt in range(1, FLATTEN_ATTEMPTS + 1):
+            positions = await self._positions()
+            if not positions:
+                break
+            prices = self.price_feed.get_prices(list(positions)) if self.price_feed is not None else {}
+            results = await self.executor.execute(flatten_orders(positions, prices))
+            for r in results:
+                metrics.inc('orders_total', result='placed' if r.ok else 'rejected', reason='flatten')
+            if all(r.ok for r in results):
+                break
+            logger.error(f"❌ Flatten attempt {attempt}: {sum(not r.ok for r in results)} orders failed, retrying")
+            await asyncio.sleep(1)
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('phase_seconds', elapsed, phase='flatten')
+        self.rm.ledger.save()
+        logger.critical(f"🛑 Flatten complete in {elapsed * 1000:.0f} ms. Trading halted.")
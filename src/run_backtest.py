@@ -0,0 +1,41 @@
+import sys
+import os
+import argparse
+
+# Ensure src is in path
+sys.path.append(os.path.dirname(__file__))
+
+import pandas as pd
+from backtest import Backtester, load_history, DEFAULT_FEE_RATE, DEFAULT_SLIPPAGE_BPS
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay local history through MarketScanner + Rebalancer")
+    parser.add_argument('--data', default='data/history', help="History directory (ohlcv/, funding/, markets.json)")
+    parser.add_argument('--symbols', nargs='*', help="Raw ids to load (e.g. BTCUSDT ETHUSDT), default all")
+    parser.add_argument('--start', help="Start date (e.g. 2024-01-01)")
+    parser.add_argument('--end', help="End date")
+    parser.add_argument('--equity', type=float, help="Initial equity (default INITIAL_EQUITY)")
+    parser.add_argument('--fee', type=float, default=DEFAULT_FEE_RATE, help="Taker fee rate")
+    parser.add_argument('--slippage-bps', type=float, default=DEFAULT_SLIPPAGE_BPS)
+    parser.add_argument('--max-peak-drawdown', type=float,
+                        help="Peak-drawdown halt, e.g. 0.25 (default MAX_PEAK_DRAWDOWN_PCT, 0 = off)")
+    args = parser.parse_args()
+
+    print(f"📂 Loading history from {args.data}...")
+    history = load_history(args.data, args.symbols, args.start, args.end)
+    print(f"   {len(history.symbols)} symbols x {len(history.timestamps)} bars")
+
+    result = Backtester(history, args.equity, args.fee, args.slippage_bps,
+                        max_peak_drawdown=args.max_peak_drawdown).run_sync()
+
+    print("\n📊 Backtest Result")
+    print("---------------------------------------------")
+    for key, value in result.summary().items():
+        print(f"{key:>14}: {value:,.4f}" if isinstance(value, float) else f"{key:>14}: {value}")
+    print("---------------------------------------------")
+    if result.halted_at is not None:
+        print(f"🛑 Halted at {pd.Timestamp(result.halted_at, unit='ms', tz='UTC')}: {result.halt_reason}")
+    print(f"Replayed in {result.elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
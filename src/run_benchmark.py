@@ -0,0 +1,197 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+import subprocess
+import tracemalloc
+from statistics import mean, median
+
+# Ensure src is in path
+sys.path.append(os.path.dirname(__file__))
+
+import config
+from logger import logger
+from fake_exchange import FakeBinanceClient
+from snapshot import SnapshotBuilder
+from market_scanner import MarketScanner
+from risk_manager import RiskManager
+from rebalancer import Rebalancer
+from main import connect, run_cycle
+
+SIZES = [10, 50, 200, 500]
+
+# Fresh interpreter: import time of the bot, then the (lazy) ccxt import on client creation
+IMPORT_PROBE = (
+    "import time; t0 = time.perf_counter(); import main; t1 = time.perf_counter(); "
+    "import exchange; exchange._load_ccxt(); t2 = time.perf_counter(); print(t1 - t0, t2 - t1)"
+)
+
+async def bench_main_loop(size: int, cycles: int, latency_ms: float, rate_limit: float, error_rate: float) -> dict:
+    """
+    main_loop 周期基准 (Main-Loop Cycle Benchmark) for a portfolio of `size` symbols
+    """
+    # Universe twice the portfolio: the scanner's funding filters drop about half
+    client = FakeBinanceClient(universe_size=size * 2, latency_ms=latency_ms, jitter_ms=latency_ms * 0.2,
+                               rate_limit_per_sec=rate_limit, error_rate=error_rate)
+    with config.override(MAX_OPEN_POSITIONS=size):
+        snapshots = SnapshotBuilder(client)
+        scanner = MarketScanner(client)
+        rebalancer = Rebalancer(client, RiskManager())
+
+        times = []
+        for _ in range(cycles):
+            t0 = time.perf_counter()
+            await run_cycle(snapshots, scanner, rebalancer)
+            times.append(time.perf_counter() - t0)
+        calls = client.total_calls
+
+        # Memory measured on a separate cycle (tracing slows execution)
+        tracemalloc.start()
+        await run_cycle(snapshots, scanner, rebalancer)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'symbols': size,
+        'cycle_ms_mean': mean(times) * 1000,
+        'cycle_ms_p50': median(times) * 1000,
+        'cycle_ms_max': max(times) * 1000,
+        'api_calls_per_cycle': calls / cycles,
+        'peak_mem_kb': peak / 1024,
+    }
+
+def bench_imports(runs: int) -> dict:
+    """Median import time of main.py and of ccxt, each run in a fresh interpreter"""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout.split()
+        samples.append((float(out[-2]), float(out[-1])))
+    return {
+        'import_main_ms': median(s[0] for s in samples) * 1000,
+        'import_ccxt_ms': median(s[1] for s in samples) * 1000,
+    }
+
+async def bench_cold_start(size: int, latency_ms: float, warm_coins=None) -> dict:
+    """
+    冷启动基准 (Cold-Start Benchmark) - startup round-trips, then time to the first order
+    With warm_coins the first cycle trades the restored universe (no scan).
+    """
+    client = FakeBinanceClient(universe_size=size * 2, latency_ms=latency_ms, jitter_ms=latency_ms * 0.2)
+    first_order = []
+    place_orders = client.place_orders
+    
+    async def timed_place_orders(orders):
+        if not first_order:
+            first_order.append(time.perf_counter())
+        return await place_orders(orders)
+    client.place_orders = timed_place_orders
+    
+    with config.override(MAX_OPEN_POSITIONS=size):
+        t0 = time.perf_counter()
+        await connect(client)
+        t1 = time.perf_counter()
+        coins, _ = await run_cycle(SnapshotBuilder(client), MarketScanner(client), Rebalancer(client, RiskManager()),
+                                warm_coins)
+        t2 = time.perf_counter()
+    
+    return {
+        'symbols': size,
+        'mode': 'warm' if warm_coins else 'cold',
+        'connect_ms': (t1 - t0) * 1000,
+        'first_order_ms': ((first_order[0] if first_order else t2) - t0) * 1000,
+        'first_cycle_ms': (t2 - t0) * 1000,
+        'api_calls': client.total_calls,
+        'coins': coins,
+    }
+
+def compare(results: list, baseline_file: str, tolerance: float) -> list:
+    """Regressions vs a saved baseline: slower mean cycle beyond tolerance, or more API calls"""
+    with open(baseline_file) as f:
+        baseline = {row['symbols']: row for row in json.load(f)}
+    regressions = []
+    for row in results:
+        base = baseline.get(row['symbols'])
+        if not base:
+            continue
+        if row['cycle_ms_mean'] > base['cycle_ms_mean'] * (1 + tolerance):
+            regressions.append(f"{row['symbols']} symbols: cycle {base['cycle_ms_mean']:.1f} -> {row['cycle_ms_mean']:.1f} ms")
+        if row['api_calls_per_cycle'] > base['api_calls_per_cycle']:
+            regressions.append(f"{row['symbols']} symbols: API calls {base['api_calls_per_cycle']:.1f} -> {row['api_calls_per_cycle']:.1f}")
+    return regressions
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark main_loop cycles against a latency-injecting fake exchange")
+    parser.add_argument('--sizes', type=int, nargs='*', default=SIZES, help="Portfolio sizes (MAX_OPEN_POSITIONS)")
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Per-request latency")
+    parser.add_argument('--rate-limit', type=float, default=None, help="Max requests per second")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability a request fails")
+    parser.add_argument('--save', help="Write results as a JSON baseline")
+    parser.add_argument('--compare', help="Baseline JSON to check for regressions (exit 1 on regression)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed cycle-time slowdown vs baseline")
+    parser.add_argument('--verbose', action='store_true', help="Keep bot logging on")
+    parser.add_argument('--cold-start', action='store_true', help="Run the cold-start suite instead of cycle timing")
+    parser.add_argument('--import-runs', type=int, default=3, help="Fresh interpreters for the import timing")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.CRITICAL)
+
+    if args.cold_start:
+        await cold_start_suite(args)
+        return
+
+    results = []
+    for size in args.sizes:
+        results.append(await bench_main_loop(size, args.cycles, args.latency_ms, args.rate_limit, args.error_rate))
+
+    print(f"\n⏱️ main_loop benchmark (latency {args.latency_ms:.0f} ms, {args.cycles} cycles)")
+    print("-" * 84)
+    print(f"{'symbols':>8} {'mean ms':>10} {'p50 ms':>10} {'max ms':>10} {'calls/cycle':>12} {'peak mem KB':>12}")
+    for r in results:
+        print(f"{r['symbols']:>8} {r['cycle_ms_mean']:>10.1f} {r['cycle_ms_p50']:>10.1f} {r['cycle_ms_max']:>10.1f} "
+              f"{r['api_calls_per_cycle']:>12.1f} {r['peak_mem_kb']:>12.0f}")
+    print("-" * 84)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Baseline saved to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print("❌ Performance regressions:")
+            for r in regressions:
+                print(f"   - {r}")
+            sys.exit(1)
+        print("✅ No regressions vs baseline")
+
+async def cold_start_suite(args):
+    imports = bench_imports(args.import_runs)
+    rows = []
+    for size in args.sizes:
+        cold = await bench_cold_start(size, args.latency_ms)
+        warm = await bench_cold_start(size, args.latency_ms, cold['coins'])
+        rows += [cold, warm]
+
+    print(f"\n🧊 Cold-start benchmark (latency {args.latency_ms:.0f} ms)")
+    print("-" * 84)
+    print(f"   import main: {imports['import_main_ms']:.0f} ms | import ccxt (on client creation): {imports['import_ccxt_ms']:.0f} ms")
+    print(f"{'symbols':>8} {'mode':>6} {'connect ms':>11} {'1st order ms':>13} {'1st cycle ms':>13} {'API calls':>10}")
+    for r in rows:
+        print(f"{r['symbols']:>8} {r['mode']:>6} {r['connect_ms']:>11.1f} {r['first_order_ms']:>13.1f} "
+              f"{r['first_cycle_ms']:>13.1f} {r['api_calls']:>10}")
+    print("-" * 84)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'imports': imports, 'runs': [{k: v for k, v in r.items() if k != 'coins'} for r in rows]}, f, indent=2)
+        print(f"📝 Results saved to {args.save}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,55 @@
 import sys
 import os
+import time
 import asyncio
+import argparse
 
 # Ensure src is in path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
 
-from src.exchange import BinanceClient
-from src.market_scanner import MarketScanner
-from src.config import Config
+from exchange import BinanceClient
+from market_scanner import MarketScanner
+from snapshot import SnapshotBuilder
+from universe import publish
+from config import Config
+from logger import logger
+
+async def serve(client: BinanceClient, scanner: MarketScanner, interval: float, path: str):
+    """
+    选币服务 (Universe Publisher) - scan once per interval and publish for local bots
+    Bots with USE_SHARED_UNIVERSE=True read the file instead of fetching tickers and funding.
+    """
+    await client.load_markets()
+    # The market cache file is the per-symbol metadata subscribers load
+    client.market_index.start_background_refresh(client.exchange)
+    snapshots = SnapshotBuilder(client)
+    logger.info(f"📡 Publishing universe to {path} every {interval:.0f}s")
+    while True:
+        started = time.perf_counter()
+        try:
+            market = await snapshots.take_market()
+            coins = await scanner.get_top_coins(snapshot=market)
+            if market.tickers:
+                publish(coins, market, client.market_index.updated_at, path)
+                logger.info(f"📤 Published {len(coins)} coins, {len(market.tickers)} tickers "
+                            f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+            else:
+                # Keep the last good publication; subscribers fall back once it goes stale
+                logger.warning("⚠️ No tickers fetched, skipping publish")
+        except Exception as e:
+            logger.error(f"❌ Publish failed: {e}", exc_info=True)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
 
 async def main():
+    parser = argparse.ArgumentParser(description="Scan the market once, or serve the universe to local bots")
+    parser.add_argument('--serve', action='store_true', help="Keep running and publish to UNIVERSE_FILE")
+    parser.add_argument('--interval', type=float, default=Config.UNIVERSE_PUBLISH_SEC, help="Publish interval (seconds)")
+    parser.add_argument('--out', default=Config.UNIVERSE_FILE, help="Universe file")
+    parser.add_argument('--max-coins', type=int, help="Universe size (default MAX_OPEN_POSITIONS)")
+    args = parser.parse_args()
+
     print("🔍 Initializing Scanner...")
-    
+
     if Config.IS_TESTNET:
         print("\n" + "="*50)
         print("⚠️  WARNING: RUNNING IN TESTNET MODE")
@@ -25,18 +63,22 @@ async def main():
         client = BinanceClient()
         if not await client.validate_connectivity():
             return
-            
-        scanner = MarketScanner(client)
+
+        scanner = MarketScanner(client, args.max_coins)
+        if args.serve:
+            await serve(client, scanner, args.interval, args.out)
+            return
+
         print("📊 executing market scan...")
         top_coins = await scanner.get_top_coins(limit=50)
-        
+
         print("\n✅ Recommended Assets to Buy (Top Selected):")
         print("---------------------------------------------")
         for i, coin in enumerate(top_coins, 1):
             print(f"{i}. {coin}")
         print("---------------------------------------------")
         print(f"Total: {len(top_coins)} coins selected.")
-        
+
     except Exception as e:
         print(f"❌ Scan failed: {e}")
     finally:
@@ -44,4 +86,7 @@ async def main():
             await client.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,62 @@
+import sys
+import os
+import json
+import argparse
+
+# Ensure src is in path
+sys.path.append(os.path.dirname(__file__))
+
+from backtest import load_history, DEFAULT_FEE_RATE, DEFAULT_SLIPPAGE_BPS
+from sweep import run_sweep
+
+def parse_param(spec: str):
+    """NAME=v1,v2,... -> (NAME, [v1, v2, ...]); values parsed as JSON where possible"""
+    name, _, raw = spec.partition('=')
+    values = []
+    for item in raw.split(','):
+        try:
+            values.append(json.loads(item))
+        except json.JSONDecodeError:
+            values.append(item)
+    return name.strip(), values
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep over the backtest engine")
+    parser.add_argument('--data', default='data/history', help="History directory (see run_backtest.py)")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help="Settings field and values, repeatable (e.g. REBALANCE_THRESHOLD_PCT=0.03,0.05)")
+    parser.add_argument('--grid', help="JSON file {NAME: [values]} (for dict values such as COIN_WEIGHTS)")
+    parser.add_argument('--symbols', nargs='*')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--workers', type=int, help="Default: all cores")
+    parser.add_argument('--fee', type=float, default=DEFAULT_FEE_RATE)
+    parser.add_argument('--slippage-bps', type=float, default=DEFAULT_SLIPPAGE_BPS)
+    parser.add_argument('--shared-dir', default='data/sweep_cache', help="Where memory-mapped arrays are written")
+    parser.add_argument('--out', help="Write the summary table to this CSV")
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+    grid.update(dict(parse_param(p) for p in args.param))
+    if not grid:
+        parser.error("no parameters given (use --param or --grid)")
+
+    print(f"📂 Loading history from {args.data}...")
+    history = load_history(args.data, args.symbols, args.start, args.end)
+    print(f"   {len(history.symbols)} symbols x {len(history.timestamps)} bars")
+
+    table = run_sweep(history, grid, args.shared_dir, args.workers, args.fee, args.slippage_bps)
+    table = table.sort_values('total_return', ascending=False)
+
+    print("\n📊 Sweep Result")
+    print(table.to_string(index=False))
+    print(f"\n{len(table)} configurations in {table.attrs['elapsed']:.1f}s")
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"📝 Saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
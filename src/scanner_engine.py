@@ -0,0 +1,237 @@
+"""
+选币引擎 (Scanner Engine)
+
+Pure, side-effect-free candidate scoring over NumPy columns, used by MarketScanner.
+Eligibility (active USDT-margined perpetual, not blacklisted) and sector codes are
+precomputed once per market-metadata version. A scan only gathers the ticker volume
+column, partially selects a liquidity pool, and scores and filters that pool. So its
+cost follows the pool size, not the number of listed perps.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+UNCLASSIFIED = -1  # Sector code of symbols without a sector (never capped)
+
+# Direction of each factor: +1 higher is better, -1 lower is better.
+# Volatility ranks up because rebalancing harvests it; tight books and cheap funding rank up.
+FACTOR_SIGN = {
+    'volume': 1.0,
+    'volatility': 1.0,
+    'spread': -1.0,
+    'open_interest': 1.0,
+    'funding': -1.0,
+}
+# Cross-sectional z-scores are clipped so one outlier cannot dominate the sum
+ZSCORE_CLIP = 3.0
+
+
+def base_asset(symbol: str) -> str:
+    return symbol.split('/')[0]
+
+
+def market_sector(market: Dict, overrides: Dict[str, str]) -> Optional[str]:
+    """Configured override, else Binance's underlyingSubType (e.g. ['AI']), else None"""
+    base = market.get('base') or base_asset(market.get('symbol', ''))
+    if base in overrides:
+        return overrides[base] or None
+    sub = (market.get('info') or {}).get('underlyingSubType')
+    if isinstance(sub, list):
+        sub = sub[0] if sub else None
+    return sub or None
+
+
+def is_tradable(market: Dict) -> bool:
+    """Active USDT-margined linear perpetual"""
+    return (market.get('linear') is True and
+            market.get('swap') is True and
+            market.get('contract') is True and
+            market.get('quote') == 'USDT' and
+            market.get('active', True) is True)  # Default to True if active not set
+
+
+@dataclass
+class ScanUniverse:
+    """Eligible perpetuals and their sector codes, built once per market-metadata version"""
+    symbols: List[str]
+    sector: np.ndarray  # int32 code into sector_names, UNCLASSIFIED if unknown
+    sector_names: List[str]
+
+    def sector_name(self, code: int) -> Optional[str]:
+        return self.sector_names[code] if code != UNCLASSIFIED else None
+
+
+def build_universe(markets: Dict[str, Dict], blacklist: Iterable[str],
+                   overrides: Optional[Dict[str, str]] = None) -> ScanUniverse:
+    """
+    Blacklist entries are base assets ('USDC') or pairs ('USDC/USDT'), matched exactly
+    against the market's base asset.
+    """
+    overrides = overrides or {}
+    banned = {base_asset(b).upper() for b in blacklist}
+    symbols, codes, names, code_of = [], [], [], {}
+    for symbol, m in markets.items():
+        if not is_tradable(m):
+            continue
+        if (m.get('base') or base_asset(symbol)).upper() in banned:
+            continue
+        sector = market_sector(m, overrides)
+        if sector is None:
+            codes.append(UNCLASSIFIED)
+        else:
+            if sector not in code_of:
+                code_of[sector] = len(names)
+                names.append(sector)
+            codes.append(code_of[sector])
+        symbols.append(symbol)
+    return ScanUniverse(symbols, np.array(codes, dtype=np.int32), names)
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest finite values, in descending order (partial selection + small sort)"""
+    idx = np.flatnonzero(np.isfinite(values))
+    if k <= 0:
+        return idx[:0]
+    if len(idx) > k:
+        idx = idx[np.argpartition(-values[idx], k - 1)[:k]]
+    return idx[np.argsort(-values[idx], kind='stable')]
+
+
+def liquidity_pool(universe: ScanUniverse, tickers: Dict[str, Dict], size: int) -> np.ndarray:
+    """Universe positions of the `size` most traded perps (24h quote volume)"""
+    volume = np.array([(tickers.get(s) or {}).get('quoteVolume') for s in universe.symbols], dtype=float)
+    return top_k(volume, size)
+
+
+@dataclass
+class ScanFrame:
+    """Column-oriented candidate set, one row per pool symbol"""
+    symbols: List[str]
+    sector: np.ndarray
+    volume: np.ndarray  # 24h quote volume (USDT)
+    volatility: np.ndarray  # 24h (high - low) / last, NaN if unknown
+    spread_bps: np.ndarray  # (ask - bid) / mid, NaN without a book ticker
+    open_interest: np.ndarray  # Notional (USDT), NaN if unknown
+    funding: np.ndarray  # Last funding rate, 0 if unknown
+    funding_apr: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+
+def build_frame(universe: ScanUniverse, pool: np.ndarray, tickers: Dict[str, Dict],
+                funding: Dict, open_interest: Optional[Dict[str, float]] = None) -> ScanFrame:
+    """
+    funding: symbol -> FundingInfo; open_interest: symbol -> contracts (base units)
+    """
+    open_interest = open_interest or {}
+    symbols = [universe.symbols[i] for i in pool]
+    rows = [tickers.get(s) or {} for s in symbols]
+
+    def column(key: str) -> np.ndarray:
+        return np.array([r.get(key) for r in rows], dtype=float)  # None -> NaN
+
+    last, high, low, bid, ask = (column(k) for k in ('last', 'high', 'low', 'bid', 'ask'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility = np.where(last > 0, (high - low) / last, np.nan)
+        mid = (bid + ask) / 2
+        spread_bps = np.where((bid > 0) & (ask >= bid), (ask - bid) / mid * 10_000, np.nan)
+    info = [funding.get(s) for s in symbols]
+    return ScanFrame(
+        symbols=symbols,
+        sector=universe.sector[pool],
+        volume=column('quoteVolume'),
+        volatility=volatility,
+        spread_bps=spread_bps,
+        open_interest=np.array([open_interest.get(s, np.nan) for s in symbols], dtype=float) * last,
+        funding=np.array([f.rate if f else 0.0 for f in info], dtype=float),
+        funding_apr=np.array([f.apr if f else 0.0 for f in info], dtype=float),
+    )
+
+
+def zscore(x: np.ndarray) -> np.ndarray:
+    """Clipped cross-sectional z-score; unknown values and constant columns score 0 (neutral)"""
+    z = np.zeros(len(x))
+    ok = np.isfinite(x)
+    if ok.sum() > 1:
+        std = x[ok].std()
+        if std > 0:
+            z[ok] = np.clip((x[ok] - x[ok].mean()) / std, -ZSCORE_CLIP, ZSCORE_CLIP)
+    return z
+
+
+def factor_columns(frame: ScanFrame) -> Dict[str, np.ndarray]:
+    """Raw factor values (heavy-tailed sizes on a log scale)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'volume': np.log(frame.volume),
+            'volatility': frame.volatility,
+            'spread': frame.spread_bps,
+            'open_interest': np.log(frame.open_interest),
+            'funding': frame.funding,
+        }
+
+
+def score(frame: ScanFrame, weights: Dict[str, float]) -> np.ndarray:
+    """Weighted sum of signed factor z-scores"""
+    unknown = [k for k in weights if k not in FACTOR_SIGN]
+    if unknown:
+        raise ValueError(f"Unknown scan factors: {', '.join(unknown)}")
+    columns = factor_columns(frame)
+    total = np.zeros(len(frame))
+    for name, weight in weights.items():
+        if weight:
+            total += weight * FACTOR_SIGN[name] * zscore(columns[name])
+    return total
+
+
+def eligible(frame: ScanFrame, avoid_positive_funding: bool, max_funding_apr: Optional[float],
+             max_spread_bps: float) -> np.ndarray:
+    """
+    Boolean mask of candidates passing the hard filters
+    max_funding_apr: abnormal-rate limit on |APR| (None = off); max_spread_bps: 0 = off
+    """
+    mask = np.isfinite(frame.volume)
+    if avoid_positive_funding:
+        # Longs pay shorts when the rate is positive
+        mask &= frame.funding <= 0
+    if max_funding_apr is not None:
+        mask &= np.abs(frame.funding_apr) <= max_funding_apr
+    if max_spread_bps > 0:
+        # Unknown spreads pass; a known wide book is illiquid
+        mask &= ~(frame.spread_bps > max_spread_bps)
+    return mask
+
+
+def sector_cap(k: int, max_share: float) -> Optional[int]:
+    """Max coins per sector among k selected (None = no cap)"""
+    if max_share <= 0:
+        return None
+    return max(1, int(k * max_share + 1e-9))
+
+
+def select(scores: np.ndarray, mask: np.ndarray, sector: np.ndarray, k: int,
+           cap: Optional[int] = None) -> np.ndarray:
+    """
+    Top-k rows by score among `mask`, at most `cap` per classified sector, best first.
+    Partial selection first; only when it breaches a cap is the (pool-sized) ranking walked.
+    """
+    values = np.where(mask, scores, np.nan)
+    best = top_k(values, k)
+    if cap is None:
+        return best
+    classified = sector[best][sector[best] != UNCLASSIFIED]
+    if len(classified) == 0 or np.bincount(classified).max() <= cap:
+        return best
+
+    chosen, counts = [], {}
+    for i in top_k(values, len(values)):
+        code = int(sector[i])
+        if code != UNCLASSIFIED:
+            if counts.get(code, 0) >= cap:
+                continue
+            counts[code] = counts.get(code, 0) + 1
+        chosen.append(i)
+        if len(chosen) >= k:
+            break
+    return np.array(chosen, dtype=np.intp)
@@ -0,0 +1,140 @@
+"""
+任务调度器 (Deadline Scheduler)
+
+Periodic jobs with independent cadences (market scan, rebalance checks, metadata and
+funding refresh, reconciliation) kept in one priority queue of deadlines. The loop
+sleeps until the earliest deadline (or a stop/trigger), never in fixed chunks. A job
+still running at its next deadline is skipped, jobs in the same group never run
+together, and a failing job backs off exponentially without delaying the others.
+"""
+import time
+import heapq
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+from metrics import metrics
+from config import Config
+from logger import logger
+
+# A job blocked by another job of its group is retried this soon (or when that job ends)
+GROUP_RETRY_SEC = 1.0
+
+
+@dataclass
+class Job:
+    name: str
+    fn: Callable[[], Awaitable]
+    interval: float  # Seconds between starts
+    group: Optional[str] = None  # Jobs sharing a group never run concurrently
+    failures: int = 0  # Consecutive
+    generation: int = 0  # Bumped on every reschedule; older heap entries are stale
+    blocked: bool = False  # Waiting for another job of its group to finish
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class Scheduler:
+    def __init__(self, clock=time.monotonic, retry_sec: Optional[float] = None,
+                 max_backoff_sec: Optional[float] = None):
+        """
+        初始化调度器 (Initialize Scheduler)
+        """
+        self.clock = clock
+        self.retry_sec = Config.JOB_RETRY_SEC if retry_sec is None else retry_sec
+        self.max_backoff = Config.JOB_MAX_BACKOFF_SEC if max_backoff_sec is None else max_backoff_sec
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List = []  # (deadline, seq, generation, job)
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._stopping = False
+
+    def add(self, name: str, fn: Callable[[], Awaitable], interval: float, delay: float = 0.0,
+            group: Optional[str] = None) -> Job:
+        """Run fn every `interval` seconds, first after `delay`"""
+        job = self.jobs[name] = Job(name, fn, interval, group)
+        self._schedule(job, self.clock() + delay)
+        return job
+
+    def _schedule(self, job: Job, deadline: float):
+        job.generation += 1
+        heapq.heappush(self._heap, (deadline, next(self._seq), job.generation, job))
+        self._wake.set()
+
+    def trigger(self, name: str):
+        """Run a job now instead of at its next deadline"""
+        self._schedule(self.jobs[name], self.clock())
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def backoff(self, failures: int) -> float:
+        return min(self.max_backoff, self.retry_sec * 2 ** (failures - 1))
+
+    async def run(self):
+        """Dispatch jobs until stop(); then wait for the ones still running"""
+        while not self._stopping:
+            # Drop entries superseded by a reschedule
+            while self._heap and self._heap[0][2] != self._heap[0][3].generation:
+                heapq.heappop(self._heap)
+            delay = self._heap[0][0] - self.clock() if self._heap else None
+            if delay is None or delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            deadline, _, _, job = heapq.heappop(self._heap)
+            now = self.clock()
+            if job.running:
+                # Previous run still busy: skip this slot instead of stacking another
+                metrics.inc('jobs_total', job=job.name, result='skipped')
+                logger.info(f"⏭️ Job {job.name} still running, skipping this run")
+                self._schedule(job, self._next_deadline(job, deadline, now))
+                continue
+            if job.group and any(j.running for j in self.jobs.values() if j.group == job.group):
+                job.blocked = True
+                self._schedule(job, now + GROUP_RETRY_SEC)
+                continue
+
+            # Fixed rate from the deadline (not from completion), so cadences do not drift
+            self._schedule(job, self._next_deadline(job, deadline, now))
+            job.task = asyncio.create_task(self._run_job(job))
+
+        running = [j.task for j in self.jobs.values() if j.running]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    @staticmethod
+    def _next_deadline(job: Job, deadline: float, now: float) -> float:
+        nxt = deadline + job.interval
+        # Fell behind (long run, suspended host): resume the cadence from now, no catch-up burst
+        return nxt if nxt > now else now + job.interval
+
+    async def _run_job(self, job: Job):
+        started = time.perf_counter()
+        try:
+            await job.fn()
+            job.failures = 0
+            metrics.inc('jobs_total', job=job.name, result='ok')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            delay = self.backoff(job.failures)
+            metrics.inc('jobs_total', job=job.name, result='error')
+            logger.error(f"❌ Job {job.name} failed ({job.failures} in a row): {e}. Retrying in {delay:.0f}s",
+                         exc_info=True)
+            self._schedule(job, self.clock() + delay)
+        finally:
+            metrics.observe('job_seconds', time.perf_counter() - started, job=job.name)
+            for other in self.jobs.values():
+                if other.blocked and other.group == job.group:
+                    other.blocked = False
+                    self._schedule(other, self.clock())
@@ -0,0 +1,113 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Dict, List, Optional
+from exchange import BinanceClient
+from price_feed import PriceFeed
+from account_state import AccountState
+from funding import FundingInfo
+from logger import logger
+
+
+@dataclass
+class CycleSnapshot:
+    """
+    一次周期的一致性快照 (Consistent Per-Cycle Market/Account Snapshot)
+    Every piece carries the wall-clock time it was received, see `fetched_at`.
+    """
+    tickers: Dict[str, Dict] = field(default_factory=dict)
+    balance: Dict[str, float] = field(default_factory=lambda: {'total_equity': 0.0, 'free_margin': 0.0})
+    positions: Dict[str, float] = field(default_factory=dict)
+    funding: Dict[str, FundingInfo] = field(default_factory=dict)
+    fetched_at: Dict[str, float] = field(default_factory=dict)
+    taken_at: float = 0.0
+    universe: List[str] = field(default_factory=list)  # Ranked coins, when published by the scanner service
+
+    def prices(self, symbols: Optional[List[str]] = None) -> Dict[str, float]:
+        """Last prices from the ticker snapshot (all symbols if none given)"""
+        if symbols is None:
+            symbols = list(self.tickers.keys())
+        prices = {}
+        for symbol in symbols:
+            data = self.tickers.get(symbol)
+            if data and data.get('last') is not None:
+                prices[symbol] = float(data['last'])
+        return prices
+
+    @property
+    def funding_rates(self) -> Dict[str, float]:
+        return {symbol: f.rate for symbol, f in self.funding.items()}
+
+    def age(self, piece: str) -> float:
+        """Seconds since a piece (e.g. 'tickers') was received"""
+        return time.time() - self.fetched_at.get(piece, 0.0)
+
+
+async def _timed(snapshot: CycleSnapshot, piece: str, coro):
+    """Await one piece and stamp its receive time"""
+    value = await coro
+    snapshot.fetched_at[piece] = time.time()
+    return value
+
+
+class SnapshotBuilder:
+    def __init__(self, client: BinanceClient, price_feed: Optional[PriceFeed] = None,
+                 account_state: Optional[AccountState] = None):
+        """
+        快照构建器 (Snapshot Builder) - one concurrent fetch per cycle shared by Scanner and Rebalancer
+        """
+        self.client = client
+        self.price_feed = price_feed
+        self.account_state = account_state
+
+    async def _get_balance(self) -> Dict[str, float]:
+        if self.account_state is not None and self.account_state.is_live:
+            return self.account_state.get_balance()
+        return await self.client.get_account_balance()
+
+    async def _get_positions(self) -> Dict[str, float]:
+        if self.account_state is not None and self.account_state.is_live:
+            return self.account_state.get_positions()
+        return await self.client.get_cw_positions()
+
+    async def take_market(self, full: bool = True) -> CycleSnapshot:
+        """
+        行情部分 (Market Pieces Only) - tickers and funding, no account data
+        In multi-account mode this is fetched once per cycle and shared by every account.
+        full=False takes prices from the live price stream when it is up.
+        """
+        snapshot = CycleSnapshot()
+        if not full and self.price_feed is not None and self.price_feed.is_live:
+            snapshot.tickers = {s: {'symbol': s, 'last': p} for s, p in self.price_feed.get_prices().items()}
+            snapshot.fetched_at['tickers'] = self.price_feed.last_message
+        else:
+            snapshot.tickers, snapshot.funding = await asyncio.gather(
+                _timed(snapshot, 'tickers', self.client.get_tickers()),
+                _timed(snapshot, 'funding', self.client.get_funding_info()),
+            )
+        snapshot.taken_at = time.time()
+        return snapshot
+
+    async def take(self, full: bool = True, market: Optional[Awaitable[CycleSnapshot]] = None) -> CycleSnapshot:
+        """
+        并发获取快照 (Fetch All Pieces Concurrently)
+        Cycle latency is that of the slowest call instead of the sum.
+        full=False (rebalance-only cycles) takes prices from the live price stream when it is up,
+        skipping the full ticker and funding downloads. Balance and positions come from the
+        streamed account state when it is live.
+        market: shared market pieces (a task other accounts await too) instead of fetching them here.
+        """
+        snapshot = CycleSnapshot()
+        start = time.perf_counter()
+        market, snapshot.balance, snapshot.positions = await asyncio.gather(
+            market if market is not None else self.take_market(full),
+            _timed(snapshot, 'balance', self._get_balance()),
+            _timed(snapshot, 'positions', self._get_positions()),
+        )
+        snapshot.tickers, snapshot.funding, snapshot.universe = market.tickers, market.funding, market.universe
+        snapshot.fetched_at.update(market.fetched_at)
+        snapshot.taken_at = time.time()
+
+        logger.info(f"📸 Snapshot: {len(snapshot.tickers)} tickers, {len(snapshot.positions)} positions, "
+                    f"{len(snapshot.funding)} funding rates in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return snapshot
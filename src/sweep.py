@@ -0,0 +1,93 @@
+"""
+参数扫描 (Parameter Sweep)
+
+Runs one backtest per Settings variant across a process pool. Price history is written
+once as .npy files and memory-mapped read-only by every worker, so the OS page cache
+holds a single copy no matter how many workers run.
+"""
+import os
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import config
+from logger import reset_logger
+from backtest import Backtester, HistoryData, DEFAULT_FEE_RATE, DEFAULT_SLIPPAGE_BPS
+
+ARRAY_FIELDS = ('timestamps', 'close', 'high', 'low', 'quote_volume', 'funding', 'mark')
+
+# Per-worker state, set once by _init_worker
+_history: Optional[HistoryData] = None
+_run_kwargs: Dict[str, Any] = {}
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """{'A': [1, 2], 'B': [x]} -> [{'A': 1, 'B': x}, {'A': 2, 'B': x}]"""
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def share_history(history: HistoryData, directory: str) -> str:
+    """Write history arrays as .npy files (once) for memory-mapped reads by workers"""
+    os.makedirs(directory, exist_ok=True)
+    for name in ARRAY_FIELDS:
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(history, name)))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'symbols': history.symbols, 'markets': history.markets}, f)
+    return directory
+
+
+def open_shared_history(directory: str) -> HistoryData:
+    """Zero-copy view of a shared history directory (read-only memory maps)"""
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in ARRAY_FIELDS}
+    return HistoryData(symbols=meta['symbols'], markets=meta['markets'], **arrays)
+
+
+def _init_worker(directory: str, run_kwargs: Dict[str, Any]):
+    global _history, _run_kwargs
+    # Forked from the parent: replace its queue-based logging with direct writes
+    reset_logger(background=False)
+    _history = open_shared_history(directory)
+    _run_kwargs = run_kwargs
+
+
+def _run_variant(variant: Dict[str, Any]) -> Dict[str, Any]:
+    with config.override(**variant):
+        result = Backtester(_history, **_run_kwargs).run_sync()
+    row = dict(variant)
+    row.update(result.summary())
+    row['elapsed'] = result.elapsed
+    return row
+
+
+def run_sweep(history: HistoryData, grid: Dict[str, List[Any]], shared_dir: str,
+              workers: Optional[int] = None, fee_rate: float = DEFAULT_FEE_RATE,
+              slippage_bps: float = DEFAULT_SLIPPAGE_BPS) -> pd.DataFrame:
+    """
+    并行扫描 (Parallel Sweep)
+    Returns one row per configuration: the overridden settings plus return, drawdown,
+    turnover, fees and funding.
+    """
+    variants = expand_grid(grid)
+    for v in variants:
+        # Fail fast on typos before spawning workers
+        with config.override(**v):
+            pass
+
+    share_history(history, shared_dir)
+    workers = workers or os.cpu_count() or 1
+    run_kwargs = {'fee_rate': fee_rate, 'slippage_bps': slippage_bps}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, len(variants)),
+                             initializer=_init_worker, initargs=(shared_dir, run_kwargs)) as pool:
+        rows = list(pool.map(_run_variant, variants))
+
+    table = pd.DataFrame(rows)
+    table.attrs['elapsed'] = time.perf_counter() - start
+    return table
@@ -0,0 +1,121 @@
+"""
+共享选币 (Shared Universe)
+
+`run_scanner.py --serve` computes the ranked universe, tickers and funding once per
+interval and publishes them to UNIVERSE_FILE (JSON, atomic replace, so readers never see
+a partial file). Per-symbol metadata is shared through the market cache the service
+keeps fresh. Bots on the same host subscribe instead of downloading every market's
+ticker themselves; a missing or stale publication falls back to fetching.
+"""
+import os
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from snapshot import CycleSnapshot, SnapshotBuilder
+from market_index import MarketIndex
+from funding import FundingInfo
+from config import Config
+from logger import logger
+
+# Ticker fields consumers use (scanner volume/volatility/spread columns, snapshot prices); the rest is not published
+TICKER_FIELDS = ('symbol', 'last', 'quoteVolume', 'high', 'low', 'bid', 'ask')
+
+
+@dataclass
+class PublishedUniverse:
+    coins: List[str]
+    tickers: Dict[str, Dict] = field(default_factory=dict)
+    funding: Dict[str, FundingInfo] = field(default_factory=dict)
+    published_at: float = 0.0
+    markets_at: float = 0.0  # Market cache version (MarketIndex.updated_at) when published
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.published_at
+
+    def to_snapshot(self) -> CycleSnapshot:
+        """Market pieces for SnapshotBuilder.take(market=...)"""
+        snapshot = CycleSnapshot(tickers=self.tickers, funding=self.funding, universe=list(self.coins))
+        snapshot.fetched_at['tickers'] = snapshot.fetched_at['funding'] = self.published_at
+        snapshot.taken_at = self.published_at
+        return snapshot
+
+
+def publish(coins: List[str], snapshot: CycleSnapshot, markets_at: float = 0.0, path: Optional[str] = None):
+    """Atomic write (tmp file + rename)"""
+    path = path or Config.UNIVERSE_FILE
+    data = {
+        'coins': coins,
+        'tickers': {s: {k: t.get(k) for k in TICKER_FIELDS} for s, t in snapshot.tickers.items()},
+        'funding': {s: list(f) for s, f in snapshot.funding.items()},
+        'published_at': time.time(),
+        'markets_at': markets_at,
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+class UniverseSubscriber:
+    def __init__(self, path: Optional[str] = None, max_age_sec: Optional[float] = None):
+        """
+        订阅共享选币 (Universe Subscriber) - re-parses the file only when it was replaced
+        """
+        self.path = path or Config.UNIVERSE_FILE
+        self.max_age = Config.UNIVERSE_MAX_AGE_SEC if max_age_sec is None else max_age_sec
+        self.current: Optional[PublishedUniverse] = None
+        self._mtime = 0.0
+
+    def read(self) -> Optional[PublishedUniverse]:
+        """The latest publication, or None if missing, unreadable or older than max_age"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                data['funding'] = {s: FundingInfo(*f) for s, f in data['funding'].items()}
+                self.current = PublishedUniverse(**data)
+                self._mtime = mtime
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read shared universe: {e}")
+                return None
+        if self.current is None or self.current.age > self.max_age:
+            return None
+        return self.current
+
+
+class SharedMarket:
+    def __init__(self, builder: SnapshotBuilder, subscriber: UniverseSubscriber,
+                 market_index: Optional[MarketIndex] = None):
+        """
+        共享行情 (Shared Market Data) - drop-in for SnapshotBuilder.take_market
+        Serves the published universe while fresh, else fetches through `builder`.
+        """
+        self.builder = builder
+        self.subscriber = subscriber
+        self.market_index = market_index
+        self._using_shared = False
+
+    async def take_market(self, full: bool = True) -> CycleSnapshot:
+        # Stream-priced (full=False) snapshots are local already
+        published = self.subscriber.read() if full else None
+        if published is None:
+            if full and self._using_shared:
+                logger.warning("⚠️ Shared universe missing or stale, fetching market data directly")
+                self._using_shared = False
+            return await self.builder.take_market(full)
+
+        if not self._using_shared:
+            logger.info(f"📡 Using shared universe from {self.subscriber.path}")
+        self._using_shared = True
+        index = self.market_index
+        if index is not None and published.markets_at > index.updated_at:
+            # The service refreshed the market cache: pick it up instead of downloading
+            index.reload_cache()
+        return published.to_snapshot()
@@ -0,0 +1,54 @@
+"""
+热启动快照 (Warm-State Snapshot)
+
+The last selected universe, saved after every cycle. On a restart within
+WARM_STATE_MAX_AGE_MINUTES the first cycle trades this universe straight away instead
+of waiting for a full market scan. Markets come from the MarketIndex cache and
+positions from the PositionLedger, both persisted separately.
+"""
+import os
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+from config import Config
+from logger import logger
+
+
+@dataclass
+class WarmState:
+    coins: List[str]
+    saved_at: float = field(default_factory=time.time)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.saved_at
+
+    def save(self, path: Optional[str] = None):
+        """Atomic write (tmp file + rename)"""
+        path = path or Config.WARM_STATE_FILE
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(asdict(self), f)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save warm state: {e}")
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, max_age_sec: Optional[float] = None) -> Optional['WarmState']:
+        """The saved state, or None if missing, unreadable or older than max_age_sec"""
+        path = path or Config.WARM_STATE_FILE
+        max_age_sec = Config.WARM_STATE_MAX_AGE_MINUTES * 60 if max_age_sec is None else max_age_sec
+        try:
+            if not os.path.exists(path):
+                return None
+            with open(path, 'r') as f:
+                state = cls(**json.load(f))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load warm state: {e}")
+            return None
+        if not state.coins or state.age > max_age_sec:
+            return None
+        return state